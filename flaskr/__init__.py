@@ -1,7 +1,7 @@
 import os
 from flask import Flask
-from flask_migrate import Migrate
-from flaskr import auth, user, patient, diagnosis, main
+from jinja2 import FileSystemBytecodeCache
+from flaskr import auth, user, patient, diagnosis, main, api, assets, benchmark, export, fragment_cache, instrumentation, measurements, metrics, profiling, reports, routing, screening, search, seed, summary, activity, importer, worklist
 from .models import db
 from dotenv import load_dotenv
 
@@ -9,22 +9,20 @@ from dotenv import load_dotenv
 # flask --app flaskr run --debug
 
 
-print("Loading environment variables...")
-load_dotenv()
-
-migrate = Migrate()
-
 def create_app(test_config=None):
-
-    print("Creating Flask app...")
+    # The flask command loads .env itself; servers such as gunicorn do not.
+    if os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        load_dotenv()
 
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("SQLALCHEMY_DATABASE_URI")
     app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    routing.init_app(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    if os.environ.get("FLASK_RUN_FROM_CLI") == "true":
+        init_migrations(app)
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -39,18 +37,48 @@ def create_app(test_config=None):
     except OSError:
         pass
 
-    print("Registering blueprints...")
+    # Compiled templates are kept on disk, so new workers skip compiling them.
+    if os.getenv("JINJA_BYTECODE_CACHE", "1").lower() in ('1', 'true', 'yes'):
+        cache_dir = os.path.join(app.instance_path, 'jinja-cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
 
     app.register_blueprint(auth.bp)
     app.register_blueprint(user.bp)
     app.register_blueprint(patient.bp)
     app.register_blueprint(diagnosis.bp)
     app.register_blueprint(main.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(export.bp)
+    app.register_blueprint(reports.bp)
+    app.register_blueprint(worklist.bp)
+    app.register_blueprint(profiling.bp)
 
     app.add_url_rule('/', endpoint='index')
 
-    print("Flask app created.")
+    profiling.init_app(app)
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    search.init_app(app)
+    summary.init_app(app)
+    activity.init_app(app)
+    importer.init_app(app)
+    measurements.init_app(app)
+    reports.init_app(app)
+    screening.init_app(app)
+    export.init_app(app)
+    assets.init_app(app)
+    fragment_cache.init_app(app)
+    seed.init_app(app)
+    benchmark.init_app(app)
 
     return app
 
-app = create_app()
\ No newline at end of file
+
+def init_migrations(app):
+    """Set up Flask-Migrate for the 'flask db' commands. It imports alembic,
+    which takes longer than the rest of the app, so create_app only does
+    this under the flask command; scripts that migrate call it themselves."""
+    from flask_migrate import Migrate
+
+    Migrate(app, db)
@@ -0,0 +1,120 @@
+import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from .models import ANC, LDR, PNC, AuthorActivity, db
+
+# Records created per author, record type and day. The add/delete views in
+# diagnosis.py keep it current, so user.profile and the admin activity
+# report read a handful of rollup rows instead of counting the records.
+
+RECORD_MODELS = {'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+PERIODS = ('day', 'week', 'month')
+
+
+def record_added(record):
+    db.session.flush()
+    _add(record.author_id, record.__tablename__, _day(record), 1)
+
+
+def record_removed(record):
+    _add(record.author_id, record.__tablename__, _day(record), -1)
+
+
+def records_added(kind, counts):
+    """Bulk record_added; counts maps (author_id, day) to the number of new records."""
+    for (author_id, day), count in counts.items():
+        _add(author_id, kind, day, count)
+
+
+def _day(record):
+    created = record.created
+    if isinstance(created, datetime.datetime):
+        return created.date()
+    return datetime.date.today()
+
+
+def _add(author_id, kind, day, delta):
+    key = (AuthorActivity.author_id == author_id, AuthorActivity.kind == kind, AuthorActivity.day == day)
+    update = (
+        db.update(AuthorActivity)
+        .where(*key)
+        .values(count=case((AuthorActivity.count + delta > 0, AuthorActivity.count + delta), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(update).rowcount or delta < 0:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(AuthorActivity).values(author_id=author_id, kind=kind, day=day, count=delta))
+    except IntegrityError:
+        # Another request inserted the row first.
+        db.session.execute(update)
+
+
+def totals(author_id):
+    rows = (
+        db.session.query(AuthorActivity.kind, func.sum(AuthorActivity.count))
+        .filter(AuthorActivity.author_id == author_id)
+        .group_by(AuthorActivity.kind)
+    )
+    counts = dict.fromkeys(RECORD_MODELS, 0)
+    counts.update({kind: int(count or 0) for kind, count in rows})
+    return counts
+
+
+def report(start, end, period):
+    """Counts per (author_id, period start, kind) for days in [start, end]."""
+    rows = (
+        db.session.query(AuthorActivity.author_id, AuthorActivity.day, AuthorActivity.kind, AuthorActivity.count)
+        .filter(AuthorActivity.day >= start, AuthorActivity.day <= end, AuthorActivity.count > 0)
+    )
+    buckets = {}
+    for author_id, day, kind, count in rows:
+        key = (author_id, period_start(day, period))
+        bucket = buckets.setdefault(key, dict.fromkeys(RECORD_MODELS, 0))
+        bucket[kind] += count
+    return buckets
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def rebuild():
+    """Recount the rollup from the ANC/LDR/PNC tables."""
+    db.session.execute(db.delete(AuthorActivity))
+    for kind, model in RECORD_MODELS.items():
+        day = func.date(model.created)
+        rows = [
+            {"author_id": author_id, "kind": kind, "day": _as_date(value), "count": count}
+            for author_id, value, count in db.session.query(model.author_id, day, func.count()).group_by(model.author_id, day)
+        ]
+        if rows:
+            db.session.execute(db.insert(AuthorActivity), rows)
+
+
+@click.command('rebuild-activity')
+@with_appcontext
+def rebuild_activity_command():
+    """Rebuild the per-author activity rollup from the ANC/LDR/PNC tables."""
+    rebuild()
+    db.session.commit()
+    click.echo('Rebuilt the author activity rollup.')
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_activity_command)
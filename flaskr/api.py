@@ -1,6 +1,240 @@
-from flaskr import create_app
+import datetime
+import decimal
+import json
+
+from flask import Blueprint, Response, abort, g, request
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+
+from flaskr import sync
+from flaskr.auth import login_required
+from flaskr.models import ANC, LDR, PNC, Patient, PatientSummary, db
+from flaskr.pagination_collection import PaginationCollection
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# JSON API for the tablet clients. Every endpoint takes an optional
+# ?fields=a,b,c to return (and load) only those columns, and the batch
+# endpoints fetch many patients or records by id in one round trip.
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+MODELS = {'patients': Patient, 'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+MAX_BATCH = 500
+
+
+@bp.errorhandler(HTTPException)
+def error(e):
+    response = _json({'error': e.description})
+    response.status_code = e.code
+    return response
+
+
+@bp.before_request
+def require_login():
+    # A JSON 401 for the clients, rather than login_required's redirect to
+    # the HTML login page.
+    if g.user is None:
+        abort(401)
+
+
+@bp.route('/patients')
+@login_required
+def patients():
+    ids = _ids(request.args.get('ids'))
+    fields = _fields(Patient, request.args.get('fields'))
+    if ids is not None:
+        return _json({'patients': _fetch(Patient, ids, fields)})
+
+    builder = Patient.query.options(load_only(*_columns(Patient, fields)))
+    page = request.args.get('page', type=int, default=1)
+    pagination_collection = PaginationCollection(builder, page, keyset=(Patient.name, Patient.id), keyset_only=True)
+    return _json({
+        'patients': [_serialize(patient, fields) for patient in pagination_collection.items],
+        'after': pagination_collection.pagination.next_token,
+    })
+
+
+@bp.route('/patients/<int:patient_id>')
+@login_required
+def patient(patient_id):
+    fields = _fields(Patient, request.args.get('fields'))
+    found = _fetch(Patient, [patient_id], fields)
+    if not found:
+        abort(404)
+    return _json(found[0])
+
+
+@bp.route('/patients/<int:patient_id>/chart')
+@login_required
+def chart(patient_id):
+    """Everything the patient overview and record pages show, in one call."""
+    found = _fetch(Patient, [patient_id], _fields(Patient, request.args.get('fields')))
+    if not found:
+        abort(404)
+    limit = max(1, min(request.args.get('limit', type=int, default=20), MAX_BATCH))
+
+    summary = db.session.get(PatientSummary, patient_id)
+    current_info = (
+        ANC.query.filter_by(patient_id=patient_id, compulsory=True)
+        .order_by(ANC.created.desc())
+        .first()
+    )
+    chart = {
+        'patient': found[0],
+        'summary': _serialize(summary, None) if summary is not None else None,
+        'current_info': _serialize(current_info, None) if current_info is not None else None,
+    }
+    for kind in ('anc', 'ldr', 'pnc'):
+        model = MODELS[kind]
+        fields = _fields(model, request.args.get(f'{kind}_fields'))
+        records = (
+            model.query.options(load_only(*_columns(model, fields)))
+            .filter(model.patient_id == patient_id)
+            .order_by(model.created.desc(), model.id.desc())
+            .limit(limit)
+        )
+        chart[kind] = [_serialize(record, fields) for record in records]
+    return _json(chart)
+
+
+@bp.route('/<any(anc, ldr, pnc):kind>')
+@login_required
+def records(kind):
+    model = MODELS[kind]
+    fields = _fields(model, request.args.get('fields'))
+    ids = _ids(request.args.get('ids'))
+    if ids is not None:
+        return _json({kind: _fetch(model, ids, fields)})
+
+    patient_id = request.args.get('patient_id', type=int)
+    if patient_id is None:
+        abort(400, 'Either ids or patient_id is required.')
+    builder = (
+        model.query.options(load_only(*_columns(model, fields)))
+        .filter(model.patient_id == patient_id)
+    )
+    page = request.args.get('page', type=int, default=1)
+    keyset = (model.created.desc(), model.id.desc())
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset, keyset_only=True)
+    return _json({
+        kind: [_serialize(record, fields) for record in pagination_collection.items],
+        'after': pagination_collection.pagination.next_token,
+    })
+
+
+@bp.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    """Fetch patients and records by id in one round trip.
+
+    {"patients": [1, 2], "anc": [10, 11], "fields": {"anc": ["weight"]}}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, 'Expected a JSON object.')
+    requested_fields = body.get('fields') or {}
+    if not isinstance(requested_fields, dict) or not all(
+            isinstance(names, list) and all(isinstance(name, str) for name in names)
+            for names in requested_fields.values()):
+        abort(400, 'fields must map record types to lists of field names.')
+
+    result = {}
+    for name, model in MODELS.items():
+        if name not in body:
+            continue
+        ids = body[name]
+        if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+            abort(400, f'{name} must be a list of ids.')
+        if len(ids) > MAX_BATCH:
+            abort(400, f'At most {MAX_BATCH} {name} per request.')
+        fields = requested_fields.get(name)
+        fields = _fields(model, ','.join(fields) if isinstance(fields, list) else None)
+        result[name] = _fetch(model, ids, fields)
+    return _json(result)
+
+
+@bp.route('/sync')
+@login_required
+def sync_changes():
+    """Patients and records changed since ?since=<token>, plus deletes.
+
+    Call with no token for the first full download, then keep passing the
+    returned token; repeat straight away while "more" is true.
+    """
+    limit = max(1, min(request.args.get('limit', type=int, default=sync.BATCH), sync.MAX_BATCH))
+    changes, token, more = sync.changes(request.args.get('since'), limit)
+    data = {name: [_serialize(row, None) for row in rows] for name, rows in changes.items() if name != 'deleted'}
+    data['deleted'] = [
+        {'kind': tombstone.kind, 'id': tombstone.record_id, 'deleted_at': _value(tombstone.deleted_at)}
+        for tombstone in changes['deleted']
+    ]
+    data['since'] = token
+    data['more'] = more
+    return _json(data)
+
+
+def _fetch(model, ids, fields):
+    if not ids:
+        return []
+    rows = model.query.options(load_only(*_columns(model, fields))).filter(model.id.in_(ids))
+    by_id = {row.id: row for row in rows}
+    return [_serialize(by_id[id], fields) for id in dict.fromkeys(ids) if id in by_id]
+
+
+def _ids(value):
+    if value is None:
+        return None
+    try:
+        ids = [int(id) for id in value.split(',') if id.strip()]
+    except ValueError:
+        abort(400, 'ids must be a comma separated list of integers.')
+    if len(ids) > MAX_BATCH:
+        abort(400, f'At most {MAX_BATCH} ids per request.')
+    return ids
+
+
+def _fields(model, value):
+    if not value:
+        return None
+    columns = model.__table__.columns.keys()
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        abort(400, f"Unknown fields for {model.__tablename__}: {', '.join(unknown)}")
+    return ['id'] + [field for field in fields if field != 'id']
+
+
+def _columns(model, fields):
+    names = fields or model.__table__.columns.keys()
+    return [getattr(model, name) for name in names]
+
+
+def _serialize(obj, fields):
+    names = fields or obj.__table__.columns.keys()
+    return {name: _value(getattr(obj, name)) for name in names}
+
+
+def _value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def _json(data):
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+    return Response(body, mimetype='application/json')
 
-app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    from flaskr import create_app
+
+    create_app().run(debug=True)
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Static files are served under content-hashed names (custom.3f2a9c1b04de.css)
+# that url_for('static', ...) switches to automatically, so browsers can cache
+# them for a year without revalidating. 'flask compress-assets' writes .gz
+# (and .br, with the brotli package) next to the text assets, and those are
+# served as-is to clients that accept them. Other responses are compressed
+# on the fly once they are larger than COMPRESS_MIN_SIZE bytes.
+
+ONE_YEAR = 365 * 24 * 60 * 60
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.map')
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/javascript', 'application/x-ndjson', 'application/xml', 'image/svg+xml',
+)
+VARIANTS = {'br': '.br', 'gzip': '.gz'}
+
+
+def build_manifest(static_folder):
+    """Map each static file to its content-hashed name."""
+    manifest = {}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if name.endswith(tuple(VARIANTS.values())):
+                continue
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            stem, extension = os.path.splitext(filename)
+            manifest[filename] = f'{stem}.{digest}{extension}'
+    return manifest
+
+
+def _manifest():
+    app = current_app
+    state = app.extensions['assets']
+    if state['files'] is None or app.debug:
+        # Rebuilt on every request while debugging so edits show up.
+        files = build_manifest(app.static_folder)
+        state['files'] = files
+        state['originals'] = {hashed: filename for filename, hashed in files.items()}
+    return state
+
+
+def hashed_url_defaults(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        hashed = _manifest()['files'].get(values['filename'])
+        if hashed is not None:
+            values['filename'] = hashed
+
+
+def static(filename):
+    original = _manifest()['originals'].get(filename)
+    response = _send_static(original or filename)
+    if original is not None:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ONE_YEAR
+        response.cache_control.immutable = True
+    return response
+
+
+def _send_static(filename):
+    folder = current_app.static_folder
+    source = os.path.join(folder, filename)
+    for encoding, suffix in VARIANTS.items():
+        if encoding not in request.accept_encodings:
+            continue
+        variant = source + suffix
+        if os.path.isfile(variant) and os.path.isfile(source) and os.path.getmtime(variant) >= os.path.getmtime(source):
+            response = send_from_directory(folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = send_from_directory(folder, filename)
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or not _compressible(response.mimetype)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_size():
+        return response
+    if brotli is not None and 'br' in request.accept_encodings:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, 6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def min_size():
+    return int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+
+@click.command('compress-assets')
+@with_appcontext
+def compress_assets_command():
+    """Write pre-compressed .gz (and .br) variants of the text static files."""
+    folder = current_app.static_folder
+    written = 0
+    for filename in build_manifest(folder):
+        if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        path = os.path.join(folder, filename)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, 9, mtime=0))
+        written += 1
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+            written += 1
+    click.echo(f'Wrote {written} compressed files.')
+
+
+def init_app(app):
+    app.extensions['assets'] = {'files': None, 'originals': None}
+    app.url_defaults(hashed_url_defaults)
+    app.view_functions['static'] = static
+    app.after_request(compress_response)
+    app.cli.add_command(compress_assets_command)
@@ -5,6 +5,7 @@ from flask import (
 )
 from werkzeug.security import check_password_hash
 
+from . import identity
 from .models import User
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -25,6 +26,7 @@ def login():
         if error is None:
             session.clear()
             session['user_id'] = user.id
+            identity.remember(user)
             return redirect(url_for('index'))
 
         flash(error)
@@ -35,7 +37,11 @@ def login():
 @bp.before_app_request
 def load_logged_in_user():
     user_id = session.get('user_id')
-    g.user = User.query.get(user_id)
+
+    if user_id is None or request.endpoint == 'static':
+        g.user = None
+    else:
+        g.user = identity.load(user_id)
 
 
 @bp.route('/logout')
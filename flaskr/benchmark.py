@@ -0,0 +1,247 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from .models import ANC, LDR, PNC, Patient, PatientSummary, User, db
+
+# 'flask benchmark' requests every GET route of the main, patient, user and
+# diagnosis views through the test client, as an admin, against whatever
+# database the app is configured with (e.g. one filled by 'flask seed'), and
+# reports the p50/p95 latency and number of SQL statements of each.
+#
+# --save writes the results as the baseline; later runs compare against it
+# and exit with status 1 when a route's p95 grows past --threshold times the
+# baseline (plus --slack milliseconds, for noise on fast routes) or it runs
+# more statements than before. POST-only routes (the deletes) are skipped.
+#
+# 'flask startup-benchmark' starts fresh interpreters the way a new worker
+# does (import flaskr, create_app, serve the login page) and exits with
+# status 1 when the median startup or first request is over its budget, so
+# CI catches slow imports creeping back in.
+
+BLUEPRINTS = ('main', 'patient', 'user', 'diagnosis')
+# Milliseconds allowed for import plus create_app, and for the first request.
+STARTUP_BUDGET = 1000.0
+FIRST_REQUEST_BUDGET = 250.0
+
+
+def sample_values():
+    """Ids to fill the URL parameters with: the patient with the most ANC
+    records, and records and users that exist."""
+    patient_id = (
+        db.session.query(PatientSummary.patient_id).order_by(PatientSummary.anc_count.desc()).limit(1).scalar()
+        or db.session.query(Patient.id).limit(1).scalar()
+    )
+    return {
+        'patient_id': patient_id,
+        'anc': db.session.query(ANC.id).filter(ANC.patient_id == patient_id).limit(1).scalar(),
+        'ldr': db.session.query(LDR.id).filter(LDR.patient_id == patient_id).limit(1).scalar(),
+        'pnc': db.session.query(PNC.id).filter(PNC.patient_id == patient_id).limit(1).scalar(),
+        'user_id': (
+            db.session.query(User.id).filter(User.is_admin).order_by(User.id).limit(1).scalar()
+            or db.session.query(User.id).order_by(User.id).limit(1).scalar()
+        ),
+    }
+
+
+def routes(values):
+    """(endpoint, url) for each GET route; None as the url when a parameter
+    has no sample value."""
+    adapter = current_app.url_map.bind('localhost')
+    found = []
+    for rule in sorted(current_app.url_map.iter_rules(), key=lambda rule: rule.endpoint):
+        if rule.endpoint.split('.')[0] not in BLUEPRINTS or 'GET' not in rule.methods:
+            continue
+        arguments = {}
+        for name in rule.arguments:
+            if name == 'diagnosis_id':
+                value = values.get(rule.endpoint.rsplit('_', 1)[-1])
+            elif name == 'id':
+                value = values['user_id']
+            elif name == 'type':
+                value = 0
+            else:
+                value = values.get(name)
+            arguments[name] = value
+        if any(value is None for value in arguments.values()):
+            found.append((rule.endpoint, None))
+        else:
+            found.append((rule.endpoint, adapter.build(rule.endpoint, arguments)))
+    return found
+
+
+def run(repeat=20, warmup=2, user_id=None):
+    """{endpoint: {url, status, p50_ms, p95_ms, queries}}."""
+    values = sample_values()
+    user_id = user_id or values['user_id']
+    if user_id is None:
+        # Anonymous requests would only measure the redirects to the login page.
+        raise click.ClickException("No user to request the pages as; create one or run 'flask seed'.")
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    try:
+        results = {}
+        for endpoint, url in routes(values):
+            if url is None:
+                results[endpoint] = {'url': None, 'skipped': 'no sample data'}
+                continue
+            for _ in range(warmup):
+                client.get(url)
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                del statements[:]
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                queries = max(queries, len(statements))
+            timings.sort()
+            results[endpoint] = {
+                'url': url,
+                'status': response.status_code,
+                'p50_ms': round(_percentile(timings, 50), 2),
+                'p95_ms': round(_percentile(timings, 95), 2),
+                'queries': queries,
+            }
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+def compare(results, baseline, threshold, slack):
+    """Regression messages for results against a baseline."""
+    regressions = []
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+        if before is None or 'p95_ms' not in result or 'p95_ms' not in before:
+            continue
+        limit = before['p95_ms'] * threshold + slack
+        if result['p95_ms'] > limit:
+            regressions.append(f'{endpoint}: p95 {result["p95_ms"]}ms, baseline {before["p95_ms"]}ms (limit {limit:.1f}ms)')
+        if result['queries'] > before['queries']:
+            regressions.append(f'{endpoint}: {result["queries"]} queries, baseline {before["queries"]}')
+    return regressions
+
+
+STARTUP_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import flaskr
+imported = time.perf_counter()
+app = flaskr.create_app()
+created = time.perf_counter()
+app.test_client().get('/auth/login')
+answered = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (answered - created) * 1000}))
+'''
+
+
+def startup(runs=5):
+    """Median import, create_app and first request times in ms over runs
+    fresh processes."""
+    env = dict(os.environ)
+    # As a server worker, not the flask command, would start.
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples), 1) for key in samples[0]}
+
+
+def _percentile(sorted_values, point):
+    index = min(len(sorted_values) - 1, max(0, round(point / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+@click.command('benchmark')
+@with_appcontext
+@click.option('--repeat', default=20, show_default=True, help='Timed requests per route.')
+@click.option('--baseline', 'baseline_path', default=None,
+              help='Baseline JSON file (default: instance/benchmark-baseline.json).')
+@click.option('--save', is_flag=True, help='Write the results as the new baseline.')
+@click.option('--threshold', default=1.5, show_default=True, help='Allowed p95 growth factor.')
+@click.option('--slack', default=5.0, show_default=True, help='Allowed p95 growth in ms on top of the factor.')
+@click.option('--user', 'username', default=None, help='Request as this user (default: the first admin, or the first user).')
+def benchmark_command(repeat, baseline_path, save, threshold, slack, username):
+    """Time every main/patient/user/diagnosis page and compare with a baseline."""
+    baseline_path = baseline_path or os.path.join(current_app.instance_path, 'benchmark-baseline.json')
+    user_id = None
+    if username:
+        user_id = db.session.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
+            raise click.ClickException(f'No user {username}.')
+
+    results = run(repeat, user_id=user_id)
+    for endpoint, result in results.items():
+        if 'p95_ms' in result:
+            click.echo(f'{endpoint:36} {result["status"]}  p50 {result["p50_ms"]:8.2f}ms  '
+                       f'p95 {result["p95_ms"]:8.2f}ms  {result["queries"]:3} queries')
+        else:
+            click.echo(f'{endpoint:36} skipped: {result["skipped"]}')
+
+    if save:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        click.echo(f'Saved the baseline to {baseline_path}.')
+        return
+
+    if not os.path.exists(baseline_path):
+        click.echo(f'No baseline at {baseline_path}; run with --save to create one.')
+        return
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), threshold, slack)
+    for regression in regressions:
+        click.echo(f'REGRESSION {regression}', err=True)
+    if regressions:
+        raise SystemExit(1)
+    click.echo('No regressions against the baseline.')
+
+
+@click.command('startup-benchmark')
+@with_appcontext
+@click.option('--runs', default=5, show_default=True)
+@click.option('--budget', default=STARTUP_BUDGET, show_default=True, help='Allowed import plus create_app time in ms.')
+@click.option('--first-request-budget', default=FIRST_REQUEST_BUDGET, show_default=True,
+              help='Allowed first request time in ms.')
+def startup_benchmark_command(runs, budget, first_request_budget):
+    """Time a cold start of the app and check it against a budget."""
+    try:
+        result = startup(runs)
+    except subprocess.CalledProcessError as e:
+        raise click.ClickException(f'The app failed to start:\n{e.stderr}')
+    started = result['import_ms'] + result['create_app_ms']
+    click.echo(f'import {result["import_ms"]}ms, create_app {result["create_app_ms"]}ms '
+               f'(budget {budget:.0f}ms), first request {result["first_request_ms"]}ms '
+               f'(budget {first_request_budget:.0f}ms)')
+    if started > budget or result['first_request_ms'] > first_request_budget:
+        click.echo('Over budget.', err=True)
+        raise SystemExit(1)
+
+
+def init_app(app):
+    app.cli.add_command(benchmark_command)
+    app.cli.add_command(startup_benchmark_command)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.sql.util import find_tables
+
+from . import metrics
+
+# Totals for paginated lists, keyed by the compiled SQL and its parameters.
+# Entries live for COUNT_CACHE_TTL seconds and are dropped early by
+# invalidate() when a view commits a change to one of the tables involved.
+# With ESTIMATED_COUNTS=1, unfiltered lists may read the row count from the
+# engine statistics instead of running COUNT(*).
+
+_lock = threading.Lock()
+_entries = {}
+
+MAX_ENTRIES = 1024
+ESTIMATE_MIN_ROWS = 1000
+
+
+def count(builder, estimate=None):
+    ttl = cache_ttl()
+    compiled = builder.statement.compile(dialect=builder.session.get_bind().dialect)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+    metrics.cache_lookup('count', entry is not None and entry[0] > now)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    total = None
+    if estimate is not None and estimates_enabled():
+        total = estimated_count(builder.session, estimate.__table__.name)
+    if total is None:
+        total = builder.count()
+
+    if ttl > 0:
+        tables = {table.name for table in find_tables(builder.statement, include_joins=True)}
+        with _lock:
+            if len(_entries) >= MAX_ENTRIES:
+                _prune(now)
+            _entries[key] = (now + ttl, total, tables)
+    return total
+
+
+def invalidate(*models):
+    names = {model.__table__.name for model in models}
+    with _lock:
+        if not names:
+            _entries.clear()
+            return
+        for key in [key for key, entry in _entries.items() if entry[2] & names]:
+            del _entries[key]
+
+
+def _prune(now):
+    for key in [key for key, entry in _entries.items() if entry[0] <= now]:
+        del _entries[key]
+    while len(_entries) >= MAX_ENTRIES:
+        del _entries[next(iter(_entries))]
+
+
+def estimated_count(session, table):
+    dialect = session.get_bind().dialect.name
+    if dialect == 'mysql':
+        rows = session.execute(
+            text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                 "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"),
+            {"table": table},
+        ).scalar()
+    elif dialect == 'postgresql':
+        rows = session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        ).scalar()
+    else:
+        return None
+
+    # Statistics are missing (-1/NULL) before the first ANALYZE and too coarse
+    # to be worth it on small tables, where an exact COUNT is cheap anyway.
+    if rows is None or rows < ESTIMATE_MIN_ROWS:
+        return None
+    return int(rows)
+
+
+def cache_ttl():
+    return float(os.getenv("COUNT_CACHE_TTL", "30"))
+
+
+def estimates_enabled():
+    return os.getenv("ESTIMATED_COUNTS", "0").lower() in ('1', 'true', 'yes')
@@ -2,14 +2,12 @@ from flask import (
     Blueprint, flash, g, redirect, render_template, request, url_for
 )
 from werkzeug.exceptions import abort
-from dotenv import load_dotenv
 
 from flaskr.auth import login_required
 from .models import ANC, LDR, PNC, db
+from . import activity, count_cache, fragment_cache, measurements, metrics, reports, screening, summary, sync, validation
 from flaskr.patient import get_patient
 
-load_dotenv()
-
 bp = Blueprint("diagnosis", __name__)
 
 @bp.route('/view_anc/<int:diagnosis_id>')
@@ -47,20 +45,7 @@ def add_anc_compulsory(patient_id):
         medical_surgical_complications = request.form["medical_surgical_complications"]
         obstetric_other_complications = request.form["obstetric_other_complications"]
         
-        error = None
-
-        if not expected_delivery_date:
-            error = "Expected date of delivery is required."
-        elif not height:
-            error = "Mother's height is required."
-        elif not last_menstrual_period:
-            error = "Last menstral period is required."
-        elif not parity:
-            error = "Parity is required."
-        elif not living_children:
-            error = "Number of living children is required."
-        elif not gravida:
-            error = "Gravida is required."
+        error = validation.anc_compulsory_error(request.form)
 
         if error is not None:
             flash(error)
@@ -79,9 +64,12 @@ def add_anc_compulsory(patient_id):
                 gravida=gravida,
                 medical_surgical_complications=medical_surgical_complications,
                 obstetric_other_complications=obstetric_other_complications,
+                **measurements.typed_columns('anc', request.form),
             )
             db.session.add(new_diagnosis)
+            record_added(new_diagnosis)
             db.session.commit()
+            count_cache.invalidate(ANC)
             return redirect(url_for("patient.view_patient_anc", patient_id=patient_id))
 
     return render_template("diagnosis/add_anc_compulsory.html", patient_id=patient_id)
@@ -103,21 +91,7 @@ def add_anc_optional(patient_id):
         mendabazole = "mendabazole" in request.form
         hepatitis = "hepatitis" in request.form
 
-        error = None
-
-        if not (weight or
-                gestation or
-                blood_pressure or
-                fetal_assessment or
-                fetal_heartbeat or
-                symphysiofundal_height or
-                complications or
-                urine_dipstick or
-                vaccination or
-                folic_acid or
-                mendabazole or
-                hepatitis):
-            error = "Can not submit an empty form."
+        error = validation.anc_optional_error(request.form)
 
 
         if error is not None:
@@ -140,9 +114,12 @@ def add_anc_optional(patient_id):
                 folic_acid=folic_acid,
                 mendabazole=mendabazole,
                 hepatitis=hepatitis,
+                **measurements.typed_columns('anc', request.form),
             )
             db.session.add(new_diagnosis)
+            record_added(new_diagnosis)
             db.session.commit()
+            count_cache.invalidate(ANC)
             return redirect(url_for("patient.view_patient_anc", patient_id=patient_id))
 
     return render_template("diagnosis/add_anc_optional.html", patient_id=patient_id)
@@ -177,12 +154,7 @@ def add_ldr(patient_id):
         head_circumference = request.form["head_circumference"]
         death_time = None if request.form["death_time"] == "" else request.form["death_time"]
 
-        error = None
-
-        # if not expected_delivery_date:
-        #     error = "Expected date of delivery is required."
-        # elif not height:
-        #     error = "Mother's height is required."
+        error = validation.ldr_error(request.form)
 
         if error is not None:
             flash(error)
@@ -216,9 +188,12 @@ def add_ldr(patient_id):
                 length=length,
                 head_circumference=head_circumference,
                 death_time=death_time,
+                **measurements.typed_columns('ldr', request.form),
             )
             db.session.add(new_diagnosis)
+            record_added(new_diagnosis)
             db.session.commit()
+            count_cache.invalidate(LDR)
             return redirect(url_for("patient.view_patient_ldr", patient_id=patient_id))
 
     return render_template("diagnosis/add_ldr.html", patient_id=patient_id)
@@ -235,12 +210,7 @@ def add_pnc(patient_id):
         baby_comments = request.form["baby_comments"]
         other_comments = request.form["other_comments"]
 
-        error = None
-
-        # if not category:
-        #     error = "Category is required."
-        # elif not description:
-        #     error = "Description of Birth is required."
+        error = validation.pnc_error(request.form)
 
         if error is not None:
             flash(error)
@@ -256,9 +226,12 @@ def add_pnc(patient_id):
                 mother_comments=mother_comments,
                 baby_comments=baby_comments,
                 other_comments=other_comments,
+                **measurements.typed_columns('pnc', request.form),
             )
             db.session.add(new_diagnosis)
+            record_added(new_diagnosis)
             db.session.commit()
+            count_cache.invalidate(PNC)
             return redirect(url_for("patient.view_patient_pnc", patient_id=patient_id))
 
     return render_template("diagnosis/add_pnc.html", patient_id=patient_id)
@@ -280,24 +253,12 @@ def update_anc(diagnosis_id):
             medical_surgical_complications = request.form["medical_surgical_complications"]
             obstetric_other_complications = request.form["obstetric_other_complications"]
 
-            error = None
-
-            if not expected_delivery_date:
-                error = "Expected date of delivery is required."
-            elif not height:
-                error = "Mother's height is required."
-            elif not last_menstrual_period:
-                error = "Last menstral period is required."
-            elif not parity:
-                error = "Parity is required."
-            elif not living_children:
-                error = "Number of living children is required."
-            elif not gravida:
-                error = "Gravida is required."
+            error = validation.anc_compulsory_error(request.form)
 
             if error is not None:
                 flash(error)
             else:
+                reports.record_changed(diagnosis)
                 ANC.query.filter_by(id=diagnosis_id).update(
                     {"medical_surgical_complications": medical_surgical_complications,
                      "obstetric_other_complications": obstetric_other_complications,
@@ -307,9 +268,13 @@ def update_anc(diagnosis_id):
                      "last_menstrual_period": last_menstrual_period,
                      "parity": parity,
                      "living_children": living_children,
-                     "gravida": gravida}
+                     "gravida": gravida,
+                     **measurements.typed_columns('anc', request.form)}
                 )
+                summary.anc_changed(diagnosis.patient_id)
                 db.session.commit()
+                count_cache.invalidate(ANC)
+                fragment_cache.invalidate('anc', diagnosis_id)
                 flash('Ante natal care is updated', 'success')
                 return redirect(url_for("patient.view_patient_anc", patient_id=diagnosis.patient_id))
         else:
@@ -326,25 +291,12 @@ def update_anc(diagnosis_id):
             mendabazole = "mendabazole" in request.form
             hepatitis = "hepatitis" in request.form
 
-            error = None
-
-            if not (weight or
-                    gestation or
-                    blood_pressure or
-                    fetal_assessment or
-                    fetal_heartbeat or
-                    symphysiofundal_height or
-                    complications or
-                    urine_dipstick or
-                    vaccination or
-                    folic_acid or
-                    mendabazole or
-                    hepatitis):
-                error = "Can not submit an empty form."
+            error = validation.anc_optional_error(request.form)
 
             if error is not None:
                 flash(error)
             else:
+                reports.record_changed(diagnosis)
                 ANC.query.filter_by(id=diagnosis_id).update(
                     {"weight": weight,
                      "gestation": gestation,
@@ -357,9 +309,13 @@ def update_anc(diagnosis_id):
                      "vaccination": vaccination,
                      "folic_acid": folic_acid,
                      "mendabazole": mendabazole,
-                     "hepatitis": hepatitis}
+                     "hepatitis": hepatitis,
+                     **measurements.typed_columns('anc', request.form)}
                 )
+                screening.rescreen([diagnosis_id])
                 db.session.commit()
+                count_cache.invalidate(ANC)
+                fragment_cache.invalidate('anc', diagnosis_id)
                 flash('Ante natal care is updated', 'success')
                 return redirect(url_for("patient.view_patient_anc", patient_id=diagnosis.patient_id))
 
@@ -397,16 +353,14 @@ def update_ldr(diagnosis_id):
         head_circumference = request.form["head_circumference"]
         death_time = None if request.form["death_time"] == "" else request.form["death_time"]
 
-        error = None
-
-        # if not category:
-        #     error = "Category is required."
-        # elif not description:
-        #     error = "Description of Birth is required."
+        error = validation.ldr_error(request.form)
 
         if error is not None:
             flash(error)
         else:
+            # The old and the new delivery month.
+            reports.record_changed(diagnosis)
+            reports.mark_months([delivery_date])
             LDR.query.filter_by(id=diagnosis_id).update(
                 {"labour_onset": labour_onset,
                 "membranes_ruptured": membranes_ruptured,
@@ -432,9 +386,12 @@ def update_ldr(diagnosis_id):
                 "weight": weight,
                 "length": length,
                 "head_circumference": head_circumference,
-                "death_time": death_time}
+                "death_time": death_time,
+                **measurements.typed_columns('ldr', request.form)}
             )
             db.session.commit()
+            count_cache.invalidate(LDR)
+            fragment_cache.invalidate('ldr', diagnosis_id)
             flash('Labour & delivery record is updated', 'success')
             return redirect(url_for("patient.view_patient_ldr", patient_id=diagnosis.patient_id))
 
@@ -454,12 +411,7 @@ def update_pnc(diagnosis_id):
         baby_comments = request.form["baby_comments"]
         other_comments = request.form["other_comments"]
 
-        error = None
-
-        # if not category:
-        #     error = "Category is required."
-        # elif not description:
-        #     error = "Description of Birth is required."
+        error = validation.pnc_error(request.form)
 
         if error is not None:
             flash(error)
@@ -471,9 +423,12 @@ def update_pnc(diagnosis_id):
                  "baby_weight": baby_weight,
                  "mother_comments": mother_comments,
                  "baby_comments": baby_comments,
-                 "other_comments": other_comments}
+                 "other_comments": other_comments,
+                 **measurements.typed_columns('pnc', request.form)}
             )
             db.session.commit()
+            count_cache.invalidate(PNC)
+            fragment_cache.invalidate('pnc', diagnosis_id)
             flash('Post natal care is updated', 'success')
             return redirect(url_for("patient.view_patient_pnc", patient_id=diagnosis.patient_id))
 
@@ -487,7 +442,10 @@ def delete_anc(diagnosis_id):
 
     if diagnosis_to_delete:
         db.session.delete(diagnosis_to_delete)
+        record_removed(diagnosis_to_delete)
         db.session.commit()
+        count_cache.invalidate(ANC)
+        fragment_cache.invalidate('anc', diagnosis_id)
         flash(f"Diagnosis deleted successfully", "success")
     else:
         flash(f"Diagnosis not found", "danger")
@@ -502,7 +460,10 @@ def delete_ldr(diagnosis_id):
 
     if diagnosis_to_delete:
         db.session.delete(diagnosis_to_delete)
+        record_removed(diagnosis_to_delete)
         db.session.commit()
+        count_cache.invalidate(LDR)
+        fragment_cache.invalidate('ldr', diagnosis_id)
         flash(f"Diagnosis deleted successfully", "success")
     else:
         flash(f"Diagnosis not found", "danger")
@@ -517,7 +478,10 @@ def delete_pnc(diagnosis_id):
 
     if diagnosis_to_delete:
         db.session.delete(diagnosis_to_delete)
+        record_removed(diagnosis_to_delete)
         db.session.commit()
+        count_cache.invalidate(PNC)
+        fragment_cache.invalidate('pnc', diagnosis_id)
         flash(f"Diagnosis deleted successfully", "success")
     else:
         flash(f"Diagnosis not found", "danger")
@@ -555,4 +519,18 @@ def get_pnc(diagnosis_id, check_author=True):
     # if check_author and diagnosis.author_id != g.user.id:
     #     abort(403)
 
-    return diagnosis
\ No newline at end of file
+    return diagnosis
+
+def record_added(diagnosis):
+    summary.record_added(diagnosis)
+    activity.record_added(diagnosis)
+    reports.record_changed(diagnosis)
+    metrics.records_created(diagnosis.__tablename__)
+
+def record_removed(diagnosis):
+    summary.record_removed(diagnosis)
+    activity.record_removed(diagnosis)
+    reports.record_changed(diagnosis)
+    sync.record_deleted(diagnosis.__tablename__, diagnosis.id)
+    if diagnosis.__tablename__ == 'anc':
+        screening.record_removed(diagnosis.id)
@@ -0,0 +1,159 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+
+import click
+from flask import Blueprint, Response, abort, g, render_template, request, stream_with_context
+from flask.cli import with_appcontext
+from sqlalchemy import exists, or_
+
+from flaskr.auth import login_required
+from .models import ANC, LDR, PNC, Patient, User, db
+
+# Patients and ANC/LDR/PNC records (joined with their patient) as CSV or
+# NDJSON for the Ministry reports. Rows are streamed from a server-side
+# cursor in yield_per batches and written out as they arrive, so memory
+# stays flat however many records are exported.
+#
+# There is no facility column; the facility filter matches the patient's
+# address (village, commune or district), and records can also be narrowed
+# to the staff member who entered them.
+
+bp = Blueprint('export', __name__, url_prefix='/export')
+
+KINDS = ('patients', 'anc', 'ldr', 'pnc')
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+RECORD_MODELS = {'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+PATIENT_COLUMNS = ('id', 'name', 'sex', 'date_of_birth', 'phone', 'address')
+YIELD_PER = 1000
+FLUSH_ROWS = 500
+
+
+@bp.route('/')
+@login_required
+def index():
+    if not g.user.is_admin:
+        abort(403)
+    return render_template('export/index.html', kinds=KINDS, formats=FORMATS)
+
+
+@bp.route('/download')
+@login_required
+def download():
+    if not g.user.is_admin:
+        abort(403)
+
+    kind = request.args.get('kind', 'patients')
+    file_format = request.args.get('format', 'csv')
+    if kind not in KINDS or file_format not in FORMATS:
+        abort(400)
+    try:
+        start = _parse_date(request.args.get('start'))
+        end = _parse_date(request.args.get('end'))
+    except ValueError:
+        abort(400, 'Dates must be YYYY-MM-DD.')
+
+    statement = build_query(kind, start, end, request.args.get('facility'), request.args.get('author'))
+    filename = f'{kind}-{datetime.date.today().isoformat()}.{file_format}'
+    return Response(
+        stream_with_context(generate(statement, file_format)),
+        mimetype=FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
+def build_query(kind, start=None, end=None, facility=None, author=None):
+    """Select statement for an export; dates are inclusive days."""
+    if kind == 'patients':
+        statement = db.select(*[getattr(Patient, column) for column in PATIENT_COLUMNS]).order_by(Patient.id)
+        if start or end:
+            # Patients seen during the period.
+            statement = statement.where(or_(*[
+                exists().where(model.patient_id == Patient.id, *_created_between(model, start, end))
+                for model in RECORD_MODELS.values()
+            ]))
+    else:
+        model = RECORD_MODELS[kind]
+        statement = (
+            db.select(
+                *model.__table__.columns,
+                User.username.label('author'),
+                *[getattr(Patient, column).label(f'patient_{column}') for column in PATIENT_COLUMNS[1:]],
+            )
+            .join(Patient, Patient.id == model.patient_id)
+            .outerjoin(User, User.id == model.author_id)
+            .where(*_created_between(model, start, end))
+            .order_by(model.id)
+        )
+        if author:
+            statement = statement.where(User.username == author)
+    if facility:
+        # autoescape: '%' or '_' in the facility name are matched literally.
+        statement = statement.where(Patient.address.icontains(facility, autoescape=True))
+    return statement
+
+
+def _created_between(model, start, end):
+    conditions = []
+    if start:
+        conditions.append(model.created >= start)
+    if end:
+        conditions.append(model.created < end + datetime.timedelta(days=1))
+    return conditions
+
+
+def generate(statement, file_format):
+    result = db.session.execute(statement.execution_options(yield_per=YIELD_PER))
+    columns = list(result.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == 'csv':
+        writer.writerow(columns)
+
+    for number, row in enumerate(result, 1):
+        values = [_value(value) for value in row]
+        if file_format == 'csv':
+            writer.writerow(['' if value is None else value for value in values])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+            buffer.write('\n')
+        if number % FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value) if value else None
+
+
+@click.command('export-records')
+@with_appcontext
+@click.argument('kind', type=click.Choice(KINDS))
+@click.option('--format', 'file_format', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day of the period.')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day of the period.')
+@click.option('--facility', help='Only patients whose address contains this text.')
+@click.option('--author', help='Only records entered by this username.')
+@click.option('--output', '-o', default='-', help='File to write; defaults to stdout.')
+def export_records_command(kind, file_format, start, end, facility, author, output):
+    """Stream patients or ANC/LDR/PNC records as CSV or NDJSON."""
+    statement = build_query(kind, start and start.date(), end and end.date(), facility, author)
+    with click.open_file(output, 'w', encoding='utf-8', lazy=False) as f:
+        for chunk in generate(statement, file_format):
+            f.write(chunk)
+
+
+def init_app(app):
+    app.cli.add_command(export_records_command)
@@ -0,0 +1,166 @@
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import metrics
+
+# Rendered template fragments for the patient and record pages, which rarely
+# change after entry. Templates wrap the expensive part in
+#
+#     {% cache 'anc', diagnosis.id, diagnosis.updated_at, patient.updated_at %}
+#     ...
+#     {% endcache %}
+#
+# i.e. a kind, a record id and whatever the fragment's version depends on. A
+# new version replaces the old one, and the update/delete views also call
+# invalidate(kind, id) so edits within the same second are not missed.
+#
+# FRAGMENT_CACHE picks the store: 'memory' (default, an LRU of
+# FRAGMENT_CACHE_SIZE fragments per worker), 'filesystem' (instance/fragments,
+# shared by the workers on a host) or 'off'.
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, kind, record_id, version):
+        with self._lock:
+            entry = self._entries.get((kind, record_id))
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end((kind, record_id))
+            return entry[1]
+
+    def set(self, kind, record_id, version, value):
+        with self._lock:
+            self._entries[(kind, record_id)] = (version, value)
+            self._entries.move_to_end((kind, record_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, record_id):
+        with self._lock:
+            self._entries.pop((kind, record_id), None)
+
+    def size(self):
+        return len(self._entries)
+
+
+class FileSystemBackend:
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, kind, record_id, version):
+        try:
+            with open(self._path(kind, record_id, version), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, kind, record_id, version, value):
+        directory = self._directory(kind, record_id)
+        # Only the latest version of a fragment is kept.
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp, self._path(kind, record_id, version))
+
+    def invalidate(self, kind, record_id):
+        shutil.rmtree(self._directory(kind, record_id), ignore_errors=True)
+
+    def size(self):
+        return sum(len(files) for _, _, files in os.walk(self.root))
+
+    def _directory(self, kind, record_id):
+        return os.path.join(self.root, kind, str(record_id))
+
+    def _path(self, kind, record_id, version):
+        return os.path.join(self._directory(kind, record_id), hashlib.sha1(version.encode()).hexdigest() + '.html')
+
+
+class FragmentCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fragment(self, kind, record_id, version, render):
+        if self.backend is None:
+            return render()
+        value = self.backend.get(kind, record_id, version)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.cache_lookup('fragment', value is not None)
+        if value is None:
+            value = render()
+            self.backend.set(kind, record_id, version, str(value))
+        return Markup(value)
+
+    def invalidate(self, kind, record_id):
+        if self.backend is not None:
+            self.backend.invalidate(kind, record_id)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': self.backend.size() if self.backend is not None else 0,
+        }
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _cache(self, key, caller):
+        kind, record_id, *version = key
+        return current_app.extensions['fragment_cache'].fragment(
+            kind, record_id, '|'.join(str(part) for part in version), caller
+        )
+
+
+def invalidate(kind, record_id):
+    current_app.extensions['fragment_cache'].invalidate(kind, record_id)
+
+
+def stats():
+    return current_app.extensions['fragment_cache'].stats()
+
+
+def _backend(app):
+    name = os.getenv("FRAGMENT_CACHE", "memory")
+    if name == 'off':
+        return None
+    if name == 'filesystem':
+        return FileSystemBackend(os.path.join(app.instance_path, 'fragments'))
+    return MemoryBackend(int(os.getenv("FRAGMENT_CACHE_SIZE", "1000")))
+
+
+def init_app(app):
+    app.extensions['fragment_cache'] = FragmentCache(_backend(app))
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -0,0 +1,87 @@
+import collections
+import os
+import threading
+import time
+
+from flask import session
+
+from . import metrics
+from .models import User, db
+
+# Lightweight logged-in user records, so auth.load_logged_in_user does not
+# query User on every request.
+#
+# The session carries the user's record, its identity_version (a column on
+# user that user_edit bumps) and when it was read. The record is trusted for
+# IDENTITY_CACHE_TTL seconds; after that the User row is read again, so a
+# user demoted or deleted any other way (SQL, the CLI, another host) loses
+# the old rights within the TTL. Each worker also keeps the records it has
+# read recently, and a session record older than the worker's version of the
+# same user is re-read at once, so an edit is seen immediately by the worker
+# that made it and by workers that read the user since.
+
+CachedUser = collections.namedtuple('CachedUser', 'id username is_admin version')
+
+_lock = threading.Lock()
+_cache = {}
+# The newest identity_version this worker knows of, per user.
+_versions = {}
+
+
+def load(user_id):
+    now = time.time()
+    ttl = cache_ttl()
+    with _lock:
+        entry = _cache.get(user_id)
+        known = _versions.get(user_id, 0)
+    if entry is not None and (now - entry[0] >= ttl or (entry[1] is not None and entry[1].version < known)):
+        entry = None
+
+    stored = session.get('identity')
+    if stored and len(stored) == 5 and stored[0] == user_id and now - stored[4] < ttl and stored[3] >= known:
+        metrics.cache_lookup('identity', True)
+        return CachedUser(*stored[:4])
+
+    metrics.cache_lookup('identity', entry is not None)
+    if entry is not None:
+        loaded_at, user = entry
+    else:
+        row = (
+            User.query.with_entities(User.id, User.username, User.is_admin, User.identity_version)
+            .filter(User.id == user_id).first()
+        )
+        loaded_at = now
+        user = CachedUser(row.id, row.username, row.is_admin, row.identity_version or 0) if row else None
+        with _lock:
+            _cache[user_id] = (loaded_at, user)
+            if user is None:
+                _versions.pop(user_id, None)
+            else:
+                _versions[user_id] = user.version
+
+    if user is None:
+        session.pop('identity', None)
+    else:
+        session['identity'] = [*user, loaded_at]
+    return user
+
+
+def remember(user):
+    session['identity'] = [user.id, user.username, user.is_admin, user.identity_version or 0, time.time()]
+
+
+def invalidate(user_id):
+    """Bump the user's identity version; call before committing a change to
+    (or the deletion of) the user."""
+    db.session.execute(
+        db.update(User).where(User.id == user_id)
+        .values(identity_version=db.func.coalesce(User.identity_version, 0) + 1)
+    )
+    version = db.session.query(User.identity_version).filter(User.id == user_id).scalar()
+    with _lock:
+        _cache.pop(user_id, None)
+        _versions[user_id] = version or 0
+
+
+def cache_ttl():
+    return float(os.getenv("IDENTITY_CACHE_TTL", "60"))
@@ -0,0 +1,316 @@
+import collections
+import csv
+import datetime
+import json
+import os
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Boolean, Date, DateTime, String, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import activity, measurements, metrics, reports, search, summary, validation
+from .models import ANC, LDR, PNC, Patient, User, db
+
+# 'flask import-records' for entering a health centre's paper records in
+# bulk. The file is streamed, rows are checked with the same rules as the
+# patient and diagnosis forms, and each chunk is inserted with executemany
+# and committed together with its search keys, patient summaries and
+# author activity. After every commit the number of rows read is written to
+# a checkpoint file, so an interrupted import picks up where it stopped.
+
+MODELS = {'patient': Patient, 'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+FORMS = {
+    'patient': (validation.PATIENT_FIELDS, validation.patient_error),
+    'anc_compulsory': (validation.ANC_COMPULSORY_FIELDS, validation.anc_compulsory_error),
+    'anc_optional': (validation.ANC_OPTIONAL_FIELDS, validation.anc_optional_error),
+    'ldr': (validation.LDR_FIELDS, validation.ldr_error),
+    'pnc': (validation.PNC_FIELDS, validation.pnc_error),
+}
+TRUE = {'1', 'true', 'yes', 'y', 'on'}
+REPORTED_REJECTS = 20
+
+
+class Rejected(Exception):
+    pass
+
+
+class Importer:
+    def __init__(self, kind, author_id=None):
+        self.kind = kind
+        self.model = MODELS[kind]
+        self.author_id = author_id
+
+    def run(self, chunk):
+        """Insert and commit one chunk of (row number, raw row, read error).
+
+        Returns the number of rows imported and the rejected rows.
+        """
+        rows, rejected = [], []
+        for number, raw, error in chunk:
+            if error is None:
+                try:
+                    rows.append((number, raw, self.parse(raw)))
+                    continue
+                except Rejected as e:
+                    error = str(e)
+            rejected.append((number, raw, error))
+
+        if self.model is not Patient:
+            rows, missing = self._known_patients(rows)
+            rejected.extend(missing)
+            now = _as_datetime(db.session.execute(db.select(func.current_timestamp())).scalar())
+            for _, _, values in rows:
+                values['created'] = values['created'] or now
+
+        try:
+            inserted = self._insert([values for _, _, values in rows])
+            self._derive(inserted, [values for _, _, values in rows])
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            rows, failed = self._insert_one_by_one(rows)
+            rejected.extend(failed)
+        db.session.expunge_all()
+        return len(rows), sorted(rejected, key=lambda row: row[0])
+
+    def parse(self, raw):
+        values = {}
+        form = self.kind
+        if self.kind == 'anc':
+            values['compulsory'] = _boolean(raw.get('compulsory'))
+            form = 'anc_compulsory' if values['compulsory'] else 'anc_optional'
+        fields, check = FORMS[form]
+
+        columns = self.model.__table__.columns
+        for field in fields:
+            value = raw.get(field)
+            if isinstance(columns[field].type, Boolean):
+                values[field] = _boolean(value)
+            else:
+                values[field] = '' if value is None else str(value).strip()
+
+        error = check(values)
+        if error is not None:
+            raise Rejected(error)
+
+        for field in fields:
+            values[field] = _convert(field, columns[field].type, values[field])
+
+        if self.model is Patient:
+            values['phone_normalized'] = search.normalize_phone(values['phone'])
+        else:
+            try:
+                values['patient_id'] = int(raw.get('patient_id'))
+            except (TypeError, ValueError):
+                raise Rejected('patient_id is required.')
+            values['author_id'] = self.author_id
+            values['created'] = _convert('created', DateTime(), str(raw.get('created') or '').strip())
+            values.update(measurements.typed_columns(self.kind, values))
+        return values
+
+    def _known_patients(self, rows):
+        patient_ids = {values['patient_id'] for _, _, values in rows}
+        known = {row[0] for row in db.session.query(Patient.id).filter(Patient.id.in_(patient_ids))} if patient_ids else set()
+        kept, missing = [], []
+        for row in rows:
+            if row[2]['patient_id'] in known:
+                kept.append(row)
+            else:
+                missing.append((row[0], row[1], f"Patient {row[2]['patient_id']} doesn't exist."))
+        return kept, missing
+
+    def _insert(self, values):
+        if not values:
+            return []
+        if self.model is Patient:
+            # The ORM batches these into multi-row INSERTs and hands back the
+            # new ids, which the search index and summaries need.
+            patients = [Patient(**row) for row in values]
+            db.session.add_all(patients)
+            db.session.flush()
+            return patients
+        db.session.execute(db.insert(self.model), values)
+        return values
+
+    def _derive(self, inserted, values):
+        if not values:
+            return
+        if self.model is Patient:
+            search.index_new_patients(inserted)
+            summary.refresh_many([patient.id for patient in inserted])
+            return
+        summary.refresh_many(sorted({row['patient_id'] for row in values}))
+        activity.records_added(self.kind, collections.Counter(
+            (row['author_id'], row['created'].date()) for row in values
+        ))
+        reports.records_added(self.kind, values)
+        metrics.records_created(self.kind, len(values))
+
+    def _insert_one_by_one(self, rows):
+        # Something in the chunk broke the batch insert; find the offending
+        # rows and import the rest.
+        kept, failed = [], []
+        inserted = []
+        for number, raw, values in rows:
+            try:
+                with db.session.begin_nested():
+                    inserted.extend(self._insert([values]))
+                kept.append((number, raw, values))
+            except SQLAlchemyError as e:
+                failed.append((number, raw, str(getattr(e, 'orig', None) or e)))
+        self._derive(inserted, [values for _, _, values in kept])
+        db.session.commit()
+        return kept, failed
+
+
+@click.command('import-records')
+@with_appcontext
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--kind', type=click.Choice(list(MODELS)), required=True, help='What the file contains.')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to ndjson for .ndjson/.jsonl files and csv otherwise.')
+@click.option('--author', help='Username recorded as the author of ANC/LDR/PNC records.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per insert and commit.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), help='Defaults to PATH.checkpoint.')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first row.')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Append rejected rows to this NDJSON file.')
+def import_records_command(path, kind, file_format, author, batch_size, checkpoint, restart, rejects):
+    """Import patients or ANC/LDR/PNC records from a CSV or NDJSON file."""
+    author_id = None
+    if kind != 'patient':
+        if not author:
+            raise click.UsageError('--author is required for ANC/LDR/PNC records.')
+        author_id = db.session.query(User.id).filter(User.username == author).scalar()
+        if author_id is None:
+            raise click.UsageError(f'Unknown user {author}.')
+    file_format = file_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    checkpoint = checkpoint or path + '.checkpoint'
+
+    done = 0 if restart else _load_checkpoint(checkpoint, path, kind)
+    if done:
+        click.echo(f'Resuming after row {done}.')
+
+    importer = Importer(kind, author_id)
+    reject_file = open(rejects, 'a', encoding='utf-8') if rejects else None
+    started = time.monotonic()
+    read = imported = rejected = 0
+    try:
+        chunk = []
+        for row in _read(path, file_format, skip=done):
+            chunk.append(row)
+            if len(chunk) < batch_size:
+                continue
+            imported, rejected = _run(importer, chunk, imported, rejected, reject_file)
+            read += len(chunk)
+            _save_checkpoint(checkpoint, path, kind, chunk[-1][0])
+            _progress(read, imported, rejected, started)
+            chunk = []
+        if chunk:
+            imported, rejected = _run(importer, chunk, imported, rejected, reject_file)
+            read += len(chunk)
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    _progress(read, imported, rejected, started)
+    if rejected > REPORTED_REJECTS and not rejects:
+        click.echo(f'Only the first {REPORTED_REJECTS} rejected rows were shown; use --rejects to keep them all.')
+
+
+def _run(importer, chunk, imported, rejected, reject_file):
+    count, rejects = importer.run(chunk)
+    for number, raw, error in rejects:
+        if reject_file is not None:
+            reject_file.write(json.dumps({"row": number, "error": error, "data": raw}, default=str) + '\n')
+        if rejected < REPORTED_REJECTS:
+            click.echo(f'Row {number} rejected: {error}', err=True)
+        rejected += 1
+    return imported + count, rejected
+
+
+def _progress(read, imported, rejected, started):
+    elapsed = time.monotonic() - started
+    rate = read / elapsed if elapsed else 0
+    click.echo(f'{read} rows read, {imported} imported, {rejected} rejected '
+               f'in {elapsed:.1f}s ({rate:.0f} rows/s).')
+
+
+def _read(path, file_format, skip=0):
+    """Yield (row number, raw row, read error) without loading the file."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if file_format == 'csv':
+            for number, raw in enumerate(csv.DictReader(f), 1):
+                if number > skip:
+                    yield number, raw, None
+            return
+        for number, line in enumerate(f, 1):
+            if number <= skip or not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as e:
+                yield number, line.strip(), f'Invalid JSON: {e}'
+                continue
+            if isinstance(raw, dict):
+                yield number, raw, None
+            else:
+                yield number, raw, 'Expected a JSON object.'
+
+
+def _load_checkpoint(checkpoint, path, kind):
+    if not os.path.exists(checkpoint):
+        return 0
+    with open(checkpoint) as f:
+        state = json.load(f)
+    if state.get('kind') != kind or state.get('size') != os.path.getsize(path):
+        raise click.ClickException(f'{checkpoint} belongs to a different import; use --restart to ignore it.')
+    return state['rows']
+
+
+def _save_checkpoint(checkpoint, path, kind, rows):
+    state = {"path": os.path.abspath(path), "kind": kind, "size": os.path.getsize(path), "rows": rows}
+    with open(checkpoint + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE
+
+
+def _convert(field, column_type, value):
+    if isinstance(column_type, Boolean) or value is None:
+        return value
+    if isinstance(column_type, DateTime):
+        if not value:
+            return None
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise Rejected(f'{field} must be a date and time (YYYY-MM-DD HH:MM).')
+    if isinstance(column_type, Date):
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise Rejected(f'{field} must be a date (YYYY-MM-DD).')
+    if isinstance(column_type, String) and column_type.length and len(value) > column_type.length:
+        raise Rejected(f'{field} is longer than {column_type.length} characters.')
+    return value
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def init_app(app):
+    app.cli.add_command(import_records_command)
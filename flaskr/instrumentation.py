@@ -0,0 +1,123 @@
+import collections
+import logging
+import logging.handlers
+import os
+import re
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Optional SQL instrumentation, on when SQL_INSTRUMENTATION=1. Every statement
+# a request runs is counted and timed through the engine events, and the
+# response carries a Server-Timing header
+#
+#     Server-Timing: db;dur=12.5;desc="7 queries", app;dur=20.1
+#
+# which the browser's network panel shows next to the request. Statements
+# slower than SLOW_QUERY_MS go to instance/slow-queries.log (rotated at
+# SLOW_QUERY_LOG_BYTES) with the endpoint and the types of their parameters,
+# never their values. A request that runs the same statement N_PLUS_ONE_REPEATS
+# times or more, e.g. one query per row of a list, is logged as a warning.
+
+PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+PLACEHOLDER_LIST = re.compile(rf'{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})+')
+WHITESPACE = re.compile(r'\s+')
+
+slow_log = logging.getLogger('flaskr.slow_queries')
+_listening = False
+
+
+def enabled():
+    return os.getenv("SQL_INSTRUMENTATION", "0").lower() in ('1', 'true', 'yes')
+
+
+def slow_query_ms():
+    return float(os.getenv("SLOW_QUERY_MS", "200"))
+
+
+def n_plus_one_repeats():
+    return int(os.getenv("N_PLUS_ONE_REPEATS", "5"))
+
+
+def statement_shape(statement):
+    """The statement on one line, with expanded IN lists collapsed so that
+    queries differing only in the number of ids compare equal."""
+    return PLACEHOLDER_LIST.sub('...', WHITESPACE.sub(' ', statement).strip())
+
+
+def parameter_shape(parameters, executemany=False):
+    if executemany:
+        rows = list(parameters)
+        return f'{len(rows)} x {parameter_shape(rows[0])}' if rows else '0 x ()'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    elapsed = (time.perf_counter() - started) * 1000
+    endpoint = '-'
+    if has_request_context():
+        endpoint = request.endpoint or request.path
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats['count'] += 1
+            stats['ms'] += elapsed
+            stats['shapes'][statement_shape(statement)] += 1
+    if elapsed >= slow_query_ms():
+        slow_log.warning('%.1fms %s %s %s', elapsed, endpoint,
+                         parameter_shape(parameters, executemany), statement_shape(statement))
+
+
+def start_request():
+    g.sql_stats = {'count': 0, 'ms': 0.0, 'shapes': collections.Counter(), 'started': time.perf_counter()}
+
+
+def finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    total = (time.perf_counter() - stats['started']) * 1000
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={stats["ms"]:.1f};desc="{stats["count"]} queries", app;dur={max(total - stats["ms"], 0):.1f}',
+    )
+    repeats = n_plus_one_repeats()
+    for shape, count in stats['shapes'].items():
+        if count >= repeats:
+            slow_log.warning('N+1 in %s: %d x %s', request.endpoint or request.path, count, shape)
+    return response
+
+
+def _log_handler(app):
+    path = os.getenv("SLOW_QUERY_LOG") or os.path.join(app.instance_path, 'slow-queries.log')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=int(os.getenv("SLOW_QUERY_LOG_BYTES", str(10 * 1024 * 1024))), backupCount=5, encoding='utf-8',
+    )
+    handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+    return handler
+
+
+def init_app(app):
+    global _listening
+    if not enabled():
+        return
+    if not _listening:
+        # On the Engine class, so the replica engines are covered as well.
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+    if not slow_log.handlers:
+        slow_log.addHandler(_log_handler(app))
+        slow_log.setLevel(logging.WARNING)
+        slow_log.propagate = False
+    app.before_request(start_request)
+    app.after_request(finish_request)
@@ -1,12 +1,11 @@
 from flask import (
     Blueprint, render_template, request
 )
-from dotenv import load_dotenv
 
 from flaskr.auth import login_required
 from .models import Patient
 from .pagination_collection import PaginationCollection
-load_dotenv()
+from .search import search_patients
 
 bp = Blueprint('main', __name__)
 
@@ -16,7 +15,7 @@ def index():
     builder = Patient.query.order_by(Patient.name)
     page = request.args.get('page', type=int, default=1)
 
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, keyset=(Patient.name, Patient.id), estimate=Patient)
 
     return render_template('main/index.html', patients=pagination_collection.items, pagination=pagination_collection.pagination, endpoint='main.index')
 
@@ -31,21 +30,7 @@ def search():
     phone = request.args.get('phone', type=str, default=None)
     address = request.args.get('address', type=str, default=None)
 
-    builder = Patient.query.order_by(Patient.name)
-
-    if name:
-        builder = builder.filter_by(name=name)
-        print('yes')
-    if sex:
-        builder = builder.filter_by(sex=sex)
-    if date_of_birth:
-        builder = builder.filter_by(date_of_birth=date_of_birth)
-    if phone:
-        builder = builder.filter_by(phone=phone)
-    if address:
-        builder = builder.filter_by(address=address)
-
     page = request.args.get('page', type=int, default=1)
 
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = search_patients(page, name=name, sex=sex, date_of_birth=date_of_birth, phone=phone, address=address)
     return render_template('main/search.html', patients=pagination_collection.items, pagination=pagination_collection.pagination)
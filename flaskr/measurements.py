@@ -0,0 +1,173 @@
+import decimal
+import json
+import os
+import re
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Typed copies of the measurements the forms collect as text (String(8)), so
+# range queries and aggregates run in SQL. The diagnosis views and the
+# importer write both the text and the typed columns; backfill_chunk fills the
+# typed columns of existing rows. Values are not converted between units: a
+# value written with another unit than its column's ('120 lb') is unreadable
+# and its typed column stays NULL.
+
+KHMER_DIGITS = str.maketrans('០១២៣៤៥៦៧៨៩', '0123456789')
+NUMBER = re.compile(r'\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]*)\s*')
+BLOOD_PRESSURE = re.compile(r'\s*(\d{2,3})\s*[/\\-]\s*(\d{2,3})\s*([a-zA-Z]*)\s*')
+MAX_DECIMAL = decimal.Decimal('9999.99')
+
+
+def parse_decimal(value, unit=None):
+    """'55.5', '៥៥' or, with unit 'kg', '55,5 kg' as a Decimal; None when it
+    is not a number or carries another unit ('120 lb' is not 120 kg)."""
+    if value is None:
+        return None
+    match = NUMBER.fullmatch(str(value).translate(KHMER_DIGITS))
+    if match is None or not _unit_matches(match.group(2), unit):
+        return None
+    number = decimal.Decimal(match.group(1).replace(',', '.')).quantize(decimal.Decimal('0.01'))
+    return number if number <= MAX_DECIMAL else None
+
+
+def parse_int(value, unit=None):
+    number = parse_decimal(value, unit)
+    if number is None:
+        return None
+    return int(number.to_integral_value(decimal.ROUND_HALF_UP))
+
+
+def parse_blood_pressure(value, unit='mmhg'):
+    """'120/80' as (120, 80); (None, None) when it cannot be read."""
+    match = BLOOD_PRESSURE.fullmatch(str(value or '').translate(KHMER_DIGITS))
+    if match is None or not _unit_matches(match.group(3), unit):
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _unit_matches(written, unit):
+    # Values are stored as they are, not converted, so only the column's own
+    # unit (or none) is accepted.
+    return not written or written.lower() == unit
+
+
+# Text field -> (typed column(s), parser, unit), per record type.
+FIELDS = {
+    'anc': {
+        'height': ('height_cm', parse_decimal, 'cm'),
+        'weight': ('weight_kg', parse_decimal, 'kg'),
+        'blood_pressure': (('bp_systolic', 'bp_diastolic'), parse_blood_pressure, 'mmhg'),
+        'fetal_heartbeat': ('fetal_heartbeat_bpm', parse_int, 'bpm'),
+        'symphysiofundal_height': ('symphysiofundal_height_cm', parse_decimal, 'cm'),
+    },
+    'ldr': {
+        'placenta_weight': ('placenta_weight_g', parse_decimal, 'g'),
+        'blood_loss': ('blood_loss_ml', parse_int, 'ml'),
+        'weight': ('weight_g', parse_decimal, 'g'),
+        'length': ('length_cm', parse_decimal, 'cm'),
+        'head_circumference': ('head_circumference_cm', parse_decimal, 'cm'),
+    },
+    'pnc': {
+        'mother_height': ('mother_height_cm', parse_decimal, 'cm'),
+        'mother_weight': ('mother_weight_kg', parse_decimal, 'kg'),
+        'baby_weight': ('baby_weight_kg', parse_decimal, 'kg'),
+    },
+}
+
+
+def typed_columns(kind, values):
+    """Typed column values for the measurement fields present in values
+    (a submitted form or a dict)."""
+    columns = {}
+    for field, (targets, parse, unit) in FIELDS[kind].items():
+        if field not in values:
+            continue
+        parsed = parse(values[field], unit)
+        if isinstance(targets, tuple):
+            columns.update(zip(targets, parsed))
+        else:
+            columns[targets] = parsed
+    return columns
+
+
+def unparseable(kind, values):
+    """The measurement fields that hold text but no readable number."""
+    columns = typed_columns(kind, values)
+    fields = []
+    for field, (targets, _, _) in FIELDS[kind].items():
+        first = targets[0] if isinstance(targets, tuple) else targets
+        if str(values.get(field) or '').strip() and columns.get(first) is None:
+            fields.append(field)
+    return fields
+
+
+def backfill_chunk(connection, kind, after_id=0, chunk_size=1000):
+    """Fill the typed columns of the next chunk of rows after after_id.
+
+    Returns the last id handled (None when there are no rows left) and the
+    (id, field, value) of every value that could not be parsed.
+    """
+    fields = FIELDS[kind]
+    targets = []
+    for columns, parse, _ in fields.values():
+        column_type = sa.Numeric(6, 2) if parse is parse_decimal else sa.Integer()
+        targets += [sa.column(name, column_type) for name in (columns if isinstance(columns, tuple) else (columns,))]
+    table = sa.table(kind, sa.column('id', sa.Integer), *[sa.column(field, sa.String) for field in fields], *targets)
+
+    rows = connection.execute(
+        sa.select(table.c.id, *[table.c[field] for field in fields])
+        .where(table.c.id > after_id)
+        .order_by(table.c.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None, []
+
+    updates, problems = [], []
+    for row in rows:
+        values = dict(zip(fields, row[1:]))
+        updates.append({"record_id": row.id, **typed_columns(kind, values)})
+        problems += [(row.id, field, values[field]) for field in unparseable(kind, values)]
+    connection.execute(table.update().where(table.c.id == sa.bindparam('record_id')), updates)
+    return rows[-1].id, problems
+
+
+@click.command('backfill-measurements')
+@with_appcontext
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--restart', is_flag=True, help='Start again from the first row.')
+def backfill_measurements_command(chunk_size, restart):
+    """Fill the typed measurement columns from the text fields, resumably."""
+    from .models import db
+
+    path = os.path.join(current_app.instance_path, 'measurements-backfill.json')
+    progress = {}
+    if os.path.exists(path) and not restart:
+        with open(path) as f:
+            progress = json.load(f)
+
+    for kind in FIELDS:
+        after_id = progress.get(kind, 0)
+        problems = 0
+        while True:
+            with db.engine.begin() as connection:
+                last_id, unreadable = backfill_chunk(connection, kind, after_id, chunk_size)
+            if last_id is None:
+                break
+            for record_id, field, value in unreadable:
+                click.echo(f'{kind} {record_id}: cannot read {field} {value!r}', err=True)
+            problems += len(unreadable)
+            after_id = progress[kind] = last_id
+            with open(path, 'w') as f:
+                json.dump(progress, f)
+        click.echo(f'{kind}: done up to id {after_id}, {problems} unreadable values.')
+
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def init_app(app):
+    app.cli.add_command(backfill_measurements_command)
@@ -0,0 +1,115 @@
+import functools
+import importlib.util
+import os
+import time
+
+from flask import Response, abort, g, request
+
+from .models import db
+
+# Prometheus metrics at /metrics: requests and their latency per endpoint,
+# the time spent waiting for a database connection from the pool, cache
+# hits and misses (fragment, count and identity caches) and records
+# created per type.
+#
+# With several workers (gunicorn, uwsgi), point PROMETHEUS_MULTIPROC_DIR at
+# an empty directory shared by them and cleared on deploy; every worker then
+# writes its numbers to mmap-backed files there and /metrics, whichever
+# worker serves it, adds them all up. Without it each worker reports only
+# its own. When METRICS_TOKEN is set, scrapes must send it as a bearer token.
+#
+# prometheus_client is imported when the first value is recorded rather than
+# at startup, as it takes a good part of the app's own import time.
+
+
+@functools.cache
+def available():
+    return importlib.util.find_spec('prometheus_client') is not None
+
+
+@functools.cache
+def collectors():
+    import prometheus_client
+
+    return {
+        'requests': prometheus_client.Counter(
+            'flaskr_requests_total', 'HTTP requests.', ['endpoint', 'method', 'status']),
+        'latency': prometheus_client.Histogram(
+            'flaskr_request_duration_seconds', 'Time to respond, per endpoint.', ['endpoint']),
+        'pool_wait': prometheus_client.Histogram(
+            'flaskr_db_pool_checkout_seconds', 'Time to get a connection from the pool.', ['engine'],
+            buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)),
+        'cache': prometheus_client.Counter(
+            'flaskr_cache_lookups_total', 'Cache lookups.', ['cache', 'result']),
+        'records': prometheus_client.Counter(
+            'flaskr_records_created_total', 'ANC, LDR and PNC records created.', ['kind']),
+    }
+
+
+def cache_lookup(cache, hit):
+    if available():
+        collectors()['cache'].labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def records_created(kind, count=1):
+    if available():
+        collectors()['records'].labels(kind).inc(count)
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+
+
+def finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unknown'
+        collectors()['requests'].labels(endpoint, request.method, str(response.status_code)).inc()
+        collectors()['latency'].labels(endpoint).observe(time.perf_counter() - started)
+    return response
+
+
+def metrics_view():
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    import prometheus_client
+    from prometheus_client import multiprocess
+
+    collectors()
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def _time_checkouts(name, engine):
+    # Engine.connect is where a session waits for the pool, whatever pool
+    # class the dialect uses.
+    connect = engine.connect
+
+    @functools.wraps(connect)
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            collectors()['pool_wait'].labels(name).observe(time.perf_counter() - started)
+
+    engine.connect = timed_connect
+
+
+def init_app(app):
+    """Call after db.init_app."""
+    if not available():
+        return
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(os.getenv("PROMETHEUS_MULTIPROC_DIR"), exist_ok=True)
+    with app.app_context():
+        for name, engine in db.engines.items():
+            _time_checkouts(name or 'default', engine)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule('/metrics', endpoint='metrics', view_func=metrics_view)
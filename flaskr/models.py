@@ -1,35 +1,151 @@
 from flask_sqlalchemy import SQLAlchemy
 
+from .routing import RoutingSession
+
 # flask db migrate -m "Description of the changes"
 # flask db upgrade
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(32), unique=True, nullable=False)
     password = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, nullable=True)
+    # Bumped by identity.invalidate, so cached logins are re-read.
+    identity_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 class Patient(db.Model):
+    __table_args__ = (
+        db.Index('ix_patient_name', 'name', 'id'),
+        db.Index('ix_patient_phone_normalized', 'phone_normalized'),
+        db.Index('ix_patient_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(32), nullable=False)
     sex = db.Column(db.String(16), nullable=False)
     date_of_birth = db.Column(db.Date, nullable=False)
     phone = db.Column(db.String(32), nullable=False)
     address = db.Column(db.String(256), nullable=False)
+    phone_normalized = db.Column(db.String(32), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     def __repr__(self):
         return f'<Patient {self.name}>'
 
+class PatientSummary(db.Model):
+    __tablename__ = 'patient_summary'
+    __table_args__ = (
+        db.Index('ix_patient_summary_last_anc', 'last_anc_visit', 'patient_id'),
+    )
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), primary_key=True)
+    anc_count = db.Column(db.Integer, nullable=False, default=0)
+    ldr_count = db.Column(db.Integer, nullable=False, default=0)
+    pnc_count = db.Column(db.Integer, nullable=False, default=0)
+    last_visit = db.Column(db.DateTime, nullable=True)
+    last_record_type = db.Column(db.String(8), nullable=True)
+    last_anc_visit = db.Column(db.DateTime, nullable=True)
+    anc_terminated = db.Column(db.Boolean, nullable=False, default=False)
+    latest_compulsory_anc_id = db.Column(db.Integer, nullable=True)
+
+class AuthorActivity(db.Model):
+    __tablename__ = 'author_activity'
+    __table_args__ = (
+        db.Index('ix_author_activity_day', 'day', 'author_id'),
+    )
+
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(8), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ReportMonth(db.Model):
+    __tablename__ = 'report_month'
+
+    month = db.Column(db.Date, primary_key=True)
+    dirty = db.Column(db.Boolean, nullable=False, default=True)
+    refreshed_at = db.Column(db.DateTime, nullable=True)
+
+class MonthlyIndicator(db.Model):
+    __tablename__ = 'monthly_indicator'
+
+    month = db.Column(db.Date, primary_key=True)
+    indicator = db.Column(db.String(32), primary_key=True)
+    numerator = db.Column(db.Integer, nullable=False, default=0)
+    denominator = db.Column(db.Integer, nullable=True)
+
+class MonthlyHistogram(db.Model):
+    __tablename__ = 'monthly_histogram'
+
+    month = db.Column(db.Date, primary_key=True)
+    measure = db.Column(db.String(32), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class RiskFlag(db.Model):
+    __tablename__ = 'risk_flag'
+    __table_args__ = (
+        db.Index('ix_risk_flag_visit', 'visit_created', 'anc_id'),
+        db.Index('ix_risk_flag_patient', 'patient_id'),
+    )
+
+    anc_id = db.Column(db.Integer, db.ForeignKey('anc.id', ondelete='CASCADE'), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), nullable=False)
+    visit_created = db.Column(db.DateTime, nullable=False)
+    reasons = db.Column(db.String(128), nullable=False)
+    flagged_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+
+class ScreeningRun(db.Model):
+    __tablename__ = 'screening_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_anc_id = db.Column(db.Integer, nullable=False, default=0)
+    screened = db.Column(db.Integer, nullable=False, default=0)
+    flagged = db.Column(db.Integer, nullable=False, default=0)
+
+class PatientNameKey(db.Model):
+    __tablename__ = 'patient_name_key'
+    __table_args__ = (
+        db.Index('ix_patient_name_key_lookup', 'key', 'kind', 'patient_id'),
+    )
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(16), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+
+class Tombstone(db.Model):
+    __table_args__ = (
+        db.Index('ix_tombstone_deleted', 'deleted_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+
 class ANC(db.Model):
+    __table_args__ = (
+        db.Index('ix_anc_patient_created', 'patient_id', 'created', 'id'),
+        db.Index('ix_anc_patient_compulsory_created', 'patient_id', 'compulsory', 'created'),
+        db.Index('ix_anc_author_created', 'author_id', 'created', 'id'),
+        db.Index('ix_anc_updated', 'updated_at', 'id'),
+        db.Index('ix_anc_bp_systolic', 'bp_systolic'),
+        db.Index('ix_anc_created', 'created'),
+        db.Index('ix_anc_expected_delivery', 'expected_delivery_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), nullable=False)
     created = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     compulsory = db.Column(db.Boolean, nullable=True, default=False)
 
     expected_delivery_date = db.Column(db.Date, nullable=True)
@@ -49,6 +165,12 @@ class ANC(db.Model):
     fetal_assessment = db.Column(db.Text, nullable=True)
     fetal_heartbeat = db.Column(db.String(8), nullable=True)
     symphysiofundal_height = db.Column(db.String(8), nullable=True)
+    height_cm = db.Column(db.Numeric(6, 2), nullable=True)
+    weight_kg = db.Column(db.Numeric(6, 2), nullable=True)
+    bp_systolic = db.Column(db.Integer, nullable=True)
+    bp_diastolic = db.Column(db.Integer, nullable=True)
+    fetal_heartbeat_bpm = db.Column(db.Integer, nullable=True)
+    symphysiofundal_height_cm = db.Column(db.Numeric(6, 2), nullable=True)
     complications = db.Column(db.Text, nullable=True)
     vaccination = db.Column(db.Boolean, nullable=True, default=False)
     folic_acid = db.Column(db.Boolean, nullable=True, default=False)
@@ -56,10 +178,21 @@ class ANC(db.Model):
     hepatitis = db.Column(db.Boolean, nullable=True, default=False)
 
 class LDR(db.Model):
+    __table_args__ = (
+        db.Index('ix_ldr_patient_created', 'patient_id', 'created', 'id'),
+        db.Index('ix_ldr_author_created', 'author_id', 'created', 'id'),
+        db.Index('ix_ldr_updated', 'updated_at', 'id'),
+        db.Index('ix_ldr_blood_loss_ml', 'blood_loss_ml'),
+        db.Index('ix_ldr_weight_g', 'weight_g'),
+        db.Index('ix_ldr_delivery_date', 'delivery_date'),
+        db.Index('ix_ldr_created', 'created'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), nullable=False)
     created = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     labour_onset = db.Column(db.Date, nullable=True)
     membranes_ruptured = db.Column(db.Date, nullable=True)
@@ -88,12 +221,25 @@ class LDR(db.Model):
     head_circumference = db.Column(db.String(8), nullable=True)
     death_time = db.Column(db.DateTime, nullable=True)
 
+    placenta_weight_g = db.Column(db.Numeric(6, 2), nullable=True)
+    blood_loss_ml = db.Column(db.Integer, nullable=True)
+    weight_g = db.Column(db.Numeric(6, 2), nullable=True)
+    length_cm = db.Column(db.Numeric(6, 2), nullable=True)
+    head_circumference_cm = db.Column(db.Numeric(6, 2), nullable=True)
+
 
 class PNC(db.Model):
+    __table_args__ = (
+        db.Index('ix_pnc_patient_created', 'patient_id', 'created', 'id'),
+        db.Index('ix_pnc_author_created', 'author_id', 'created', 'id'),
+        db.Index('ix_pnc_updated', 'updated_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id', ondelete='CASCADE'), nullable=False)
     created = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     transferred_from = db.Column(db.String(256), nullable=False)
     mother_height = db.Column(db.String(8), nullable=True)
@@ -102,6 +248,9 @@ class PNC(db.Model):
     mother_comments = db.Column(db.Text, nullable=True)
     baby_comments = db.Column(db.Text, nullable=True)
     other_comments = db.Column(db.Text, nullable=True)
+    mother_height_cm = db.Column(db.Numeric(6, 2), nullable=True)
+    mother_weight_kg = db.Column(db.Numeric(6, 2), nullable=True)
+    baby_weight_kg = db.Column(db.Numeric(6, 2), nullable=True)
 
 
     def __repr__(self):
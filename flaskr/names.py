@@ -0,0 +1,99 @@
+import re
+import unicodedata
+
+# Name keys for bilingual patient lookup. A name written in Khmer script and
+# the same name romanized ("សុខា" / "Sokha" / "Sokhar") produce the same
+# phonetic key, so main.search can find either through the indexed
+# patient_name_key table instead of transforming names at query time.
+#
+# Keys per name word:
+#   khmer    - NFC Khmer text without zero-width characters
+#   latin    - lowercase ASCII romanization
+#   phonetic - consonant skeleton of the romanization
+# plus a phonetic key for the whole name, since Khmer is often written
+# without spaces between family and given name.
+
+KHMER = re.compile('[\u1780-\u17ff]')
+ZERO_WIDTH = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff'))
+
+CONSONANTS = {
+    'ក': 'k', 'ខ': 'kh', 'គ': 'k', 'ឃ': 'kh', 'ង': 'ng',
+    'ច': 'ch', 'ឆ': 'chh', 'ជ': 'ch', 'ឈ': 'chh', 'ញ': 'nh',
+    'ដ': 'd', 'ឋ': 'th', 'ឌ': 'd', 'ឍ': 'th', 'ណ': 'n',
+    'ត': 't', 'ថ': 'th', 'ទ': 't', 'ធ': 'th', 'ន': 'n',
+    'ប': 'b', 'ផ': 'ph', 'ព': 'p', 'ភ': 'ph', 'ម': 'm',
+    'យ': 'y', 'រ': 'r', 'ល': 'l', 'វ': 'v', 'ឝ': 's', 'ឞ': 's',
+    'ស': 's', 'ហ': 'h', 'ឡ': 'l', 'អ': '',
+}
+
+VOWELS = {
+    'ឥ': 'e', 'ឦ': 'ei', 'ឧ': 'o', 'ឩ': 'ou', 'ឪ': 'au', 'ឫ': 'rue',
+    'ឬ': 'rueu', 'ឭ': 'lue', 'ឮ': 'lueu', 'ឯ': 'ae', 'ឰ': 'ai',
+    'ឱ': 'ao', 'ឲ': 'ao', 'ឳ': 'au',
+    'ា': 'a', 'ិ': 'e', 'ី': 'ei', 'ឹ': 'oe', 'ឺ': 'eu', 'ុ': 'o',
+    'ូ': 'ou', 'ួ': 'uo', 'ើ': 'aeu', 'ឿ': 'oea', 'ៀ': 'ie', 'េ': 'e',
+    'ែ': 'ae', 'ៃ': 'ai', 'ោ': 'ao', 'ៅ': 'au', 'ំ': 'm', 'ះ': 'h',
+}
+
+# Romanization variants that sound the same, applied in order.
+PHONETIC_RULES = (
+    ('chh', 'c'), ('ch', 'c'), ('j', 'c'), ('kh', 'k'), ('ph', 'p'),
+    ('th', 't'), ('nh', 'n'), ('ng', 'q'), ('w', 'v'),
+)
+
+
+def normalize_khmer(value):
+    return unicodedata.normalize('NFC', value).translate(ZERO_WIDTH).strip()
+
+
+def romanize(value):
+    value = normalize_khmer(value)
+    if KHMER.search(value):
+        value = ''.join(CONSONANTS.get(char, VOWELS.get(char, char if char.isascii() else '')) for char in value)
+    folded = unicodedata.normalize('NFKD', value)
+    return ''.join(char for char in folded if char.isascii() and (char.isalnum() or char == ' ')).lower()
+
+
+def phonetic(value):
+    value = re.sub('[^a-z]', '', romanize(value))
+    if not value:
+        return ''
+    for pattern, replacement in PHONETIC_RULES:
+        value = value.replace(pattern, replacement)
+    # A final r is silent in Khmer and often added or dropped in spelling.
+    if len(value) > 1:
+        value = value.rstrip('r') or value
+    head = 'a' if value[0] in 'aeiouy' else value[0]
+    skeleton = head + re.sub('[aeiouyh]', '', value[1:])
+    return re.sub(r'(.)\1+', r'\1', skeleton)
+
+
+def words(value):
+    return [word for word in normalize_khmer(value or '').split() if word]
+
+
+def name_keys(value):
+    keys = set()
+    for word in words(value):
+        if KHMER.search(word):
+            keys.add(('khmer', word))
+        latin = romanize(word).replace(' ', '')
+        if latin:
+            keys.add(('latin', latin))
+        key = phonetic(word)
+        if key:
+            keys.add(('phonetic', key))
+    whole = phonetic(''.join(words(value)))
+    if whole:
+        keys.add(('phonetic', whole))
+    return {(kind, key[:64]) for kind, key in keys}
+
+
+def key_overlap(query, name):
+    """Fraction of the query's words that share a key with the name."""
+    query_words = words(query)
+    if not query_words:
+        return 0.0
+    keys = name_keys(name)
+    matched = sum(1 for word in query_words if name_keys(word) & keys)
+    return matched / len(query_words)
@@ -1,10 +1,207 @@
+import base64
+import datetime
+import json
 import os
+
+from flask import request, url_for
 from flask_paginate import Pagination
+from markupsafe import Markup, escape
+from sqlalchemy import DateTime, String, and_, func, or_, type_coerce
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+from . import count_cache
+
+# Keyset pagination is enabled per deployment with KEYSET_PAGINATION=1. Views
+# opt in by passing the same sort keys they order by, ending with a unique
+# column (usually id), e.g. keyset=(Patient.name, Patient.id). Unfiltered
+# lists can pass estimate=<Model> to allow an estimated total (count_cache).
+# keyset_only=True always uses keyset pagination, for lists that are never
+# counted.
 
 class PaginationCollection:
-    def __init__(self, builder, page):
+    def __init__(self, builder, page, keyset=None, estimate=None, keyset_only=False):
         per_page = int(os.getenv("PER_PAGE"))
+
+        if keyset and (keyset_only or keyset_enabled()):
+            self._init_keyset(builder, keyset, per_page)
+            return
+
         offset = (page - 1) * per_page
-        total = builder.count()
+        total = count_cache.count(builder, estimate=estimate)
         self.items = builder.offset(offset).limit(per_page).all()
-        self.pagination = Pagination(page=page, total=total, per_page=per_page, css_framework='bootstrap5')
\ No newline at end of file
+        self.pagination = Pagination(page=page, total=total, per_page=per_page, css_framework='bootstrap5')
+
+    def _init_keyset(self, builder, keyset, per_page):
+        keys = [_sort_key(key) for key in keyset]
+        sqlite = builder.session.get_bind().dialect.name == 'sqlite'
+        sort_keys = [(_sqlite_column(column), descending) for column, descending in keys] if sqlite else keys
+        after = request.args.get('after', type=str, default=None)
+        before = request.args.get('before', type=str, default=None)
+        backwards = before is not None and after is None
+
+        token = before if backwards else after
+        if token:
+            values = decode_token(token, [column for column, _ in keys])
+            if values is not None:
+                if sqlite:
+                    values = [_sqlite_sort_value(value) for value in values]
+                builder = builder.filter(_seek(sort_keys, values, backwards))
+
+        order = [
+            column.desc() if descending != backwards else column.asc()
+            for column, descending in sort_keys
+        ]
+        rows = builder.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+
+        self.items = rows
+        self.pagination = KeysetPagination(
+            prev_token=encode_token(_row_values(rows[0], keys)) if rows and (has_more if backwards else bool(token)) else None,
+            next_token=encode_token(_row_values(rows[-1], keys)) if rows and (bool(token) if backwards else has_more) else None,
+        )
+
+
+class KeysetPagination:
+    def __init__(self, prev_token, next_token):
+        self.prev_token = prev_token
+        self.next_token = next_token
+
+    def url(self, **tokens):
+        args = request.args.to_dict()
+        for name in ('page', 'after', 'before'):
+            args.pop(name, None)
+        args.update(request.view_args or {})
+        args.update(tokens)
+        return url_for(request.endpoint, **args)
+
+    @property
+    def links(self):
+        if self.prev_token is None and self.next_token is None:
+            return Markup('')
+
+        def item(label, token, direction):
+            if token is None:
+                return f'<li class="page-item disabled"><span class="page-link">{label}</span></li>'
+            href = escape(self.url(**{direction: token}))
+            return f'<li class="page-item"><a class="page-link" href="{href}">{label}</a></li>'
+
+        return Markup(
+            '<nav aria-label="pagination"><ul class="pagination">'
+            + item('&laquo;', self.prev_token, 'before')
+            + item('&raquo;', self.next_token, 'after')
+            + '</ul></nav>'
+        )
+
+
+def keyset_enabled():
+    return os.getenv("KEYSET_PAGINATION", "0").lower() in ('1', 'true', 'yes')
+
+
+def seek(keyset, values, dialect_name=None):
+    """Filter for the rows after values in keyset order, for hand-paged queries."""
+    if dialect_name == 'sqlite':
+        values = [_sqlite_value(value) for value in values]
+    return _seek([_sort_key(key) for key in keyset], values, False)
+
+
+def encode_token(values):
+    payload = json.dumps([_dump(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token, columns):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_load(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _sort_key(key):
+    if hasattr(key, '__clause_element__'):
+        key = key.__clause_element__()
+    if isinstance(key, UnaryExpression) and key.modifier in (operators.desc_op, operators.asc_op):
+        return key.element, key.modifier is operators.desc_op
+    return key, False
+
+
+def _seek(keys, values, backwards):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y) so that mixed
+    # sort directions work and every branch can use the index on (a, b).
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        if descending != backwards:
+            equal.append(column < values[i])
+        else:
+            equal.append(column > values[i])
+        clauses.append(and_(*equal))
+    return or_(*clauses)
+
+
+def _row_values(row, keys):
+    return [_row_value(row, column) for column, _ in keys]
+
+
+def _row_value(row, column):
+    annotations = getattr(column, '_annotations', None) or {}
+    mapper = annotations.get('parentmapper')
+    if mapper is None:
+        return row._mapping[column]
+    entity, attribute = mapper.class_, annotations.get('proxy_key', column.key)
+    if isinstance(row, entity):
+        return getattr(row, attribute)
+    for item in row:
+        if isinstance(item, entity):
+            return getattr(item, attribute)
+    raise LookupError(f"Sort key {column} is not part of the selected rows.")
+
+
+def _sqlite_value(value):
+    # SQLite keeps CURRENT_TIMESTAMP defaults as 'YYYY-MM-DD HH:MM:SS' text,
+    # which the DateTime bind format (with microseconds) does not compare
+    # equal to, so seek on the stored text form instead.
+    if isinstance(value, datetime.datetime):
+        return type_coerce(value.isoformat(sep=' '), String)
+    return value
+
+
+def _sqlite_column(column):
+    # Timestamps written by the app (the importer, seed data) are stored with
+    # microseconds and CURRENT_TIMESTAMP ones without, so the same instant has
+    # two text forms. Keyset pages sort and seek on one form (milliseconds).
+    if isinstance(column.type, DateTime):
+        return func.strftime('%Y-%m-%d %H:%M:%f', column)
+    return column
+
+
+def _sqlite_sort_value(value):
+    if isinstance(value, datetime.datetime):
+        return f"{value:%Y-%m-%d %H:%M:%S}.{value.microsecond // 1000:03d}"
+    return value
+
+
+def _dump(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _load(value, column):
+    try:
+        python_type = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+    if value is not None and python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if value is not None and python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    return value
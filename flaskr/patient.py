@@ -2,16 +2,17 @@ from flask import (
     Blueprint, flash, g, redirect, render_template, request, url_for
 )
 from werkzeug.exceptions import abort
-from dotenv import load_dotenv
 
 from flaskr.auth import login_required
-from .models import User, Patient, ANC, LDR, PNC, db
+from .models import User, Patient, PatientSummary, ANC, LDR, PNC, db
 from .pagination_collection import PaginationCollection
-from sqlalchemy import union_all
-load_dotenv()
+from . import count_cache, fragment_cache, reports, search, summary, sync, validation
+from sqlalchemy import literal, union_all
 
 bp = Blueprint('patient', __name__)
 
+RECORD_MODELS = {'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+
 @bp.route('/add_patient', methods=('GET', 'POST'))
 @login_required
 def add_patient():
@@ -21,23 +22,17 @@ def add_patient():
         date_of_birth = request.form['date_of_birth']
         phone = request.form['phone']
         address = request.form['address']
-        error = None
-
-        if not name:
-            error = 'Name is required.'
-        elif not date_of_birth:
-            error = 'Date of Birth is required.'
-        elif not phone:
-            error = 'Phone is required.'
-        elif not address:
-            error = 'Address is required.'
+        error = validation.patient_error(request.form)
 
         if error is not None:
             flash(error)
         else:
             new_patient = Patient(name=str(name), sex=str(sex), date_of_birth=str(date_of_birth), phone=str(phone), address=str(address))
             db.session.add(new_patient)
+            search.index_patient(new_patient)
+            db.session.add(PatientSummary(patient_id=new_patient.id))
             db.session.commit()
+            count_cache.invalidate(Patient)
             return redirect(url_for('main.index'))
 
     return render_template('patient/add_patient.html')
@@ -56,23 +51,18 @@ def update_patient(patient_id):
         date_of_birth = request.form['date_of_birth']
         phone = request.form['phone']
         address = request.form['address']
+        error = validation.patient_error(request.form)
 
-        if not name:
-            error = 'Name is required.'
-        elif not date_of_birth:
-            error = 'Date of Birth is required.'
-        elif not phone:
-            error = 'Phone is required.'
-        elif not address:
-            error = 'Address is required.'
-
-        if 'error' in locals():
+        if error is not None:
             flash(error)
         else:
             Patient.query.filter_by(id=patient_id).update(
                 {"name": name, "sex": sex, "date_of_birth": date_of_birth, "phone": phone, "address": address}
             )
+            search.index_patient(patient)
             db.session.commit()
+            count_cache.invalidate(Patient)
+            fragment_cache.invalidate('patient', patient_id)
             flash('Patient is updated', 'success')
             return redirect(url_for('main.index'))
 
@@ -83,8 +73,13 @@ def update_patient(patient_id):
 def delete_patient(patient_id):
     patient_to_delete = Patient.query.get(patient_id)
     if patient_to_delete:
+        sync.patient_deleted(patient_id)
+        reports.patient_deleted(patient_id)
         db.session.delete(patient_to_delete)
+        search.remove_patient(patient_id)
         db.session.commit()
+        count_cache.invalidate(Patient, ANC, LDR, PNC)
+        fragment_cache.invalidate('patient', patient_id)
         flash(f"Patient {patient_id} deleted successfully", 'success')
     else:
         flash(f"Patient with ID {patient_id} not found", 'danger')
@@ -93,22 +88,23 @@ def delete_patient(patient_id):
 @bp.route('/view/<int:patient_id>')
 @login_required
 def view_patient(patient_id):
-    anc_count = (
-        db.session.query(ANC)
-        .filter(ANC.patient_id == patient_id)
-        .count()
-    )
-    ldr_count = (
-        db.session.query(LDR)
-        .filter(LDR.patient_id == patient_id)
-        .count()
-    )
-    pnc_count = (
-        db.session.query(PNC)
-        .filter(PNC.patient_id == patient_id)
-        .count()
+    row = (
+        db.session.query(Patient, PatientSummary)
+        .outerjoin(PatientSummary, PatientSummary.patient_id == Patient.id)
+        .filter(Patient.id == patient_id)
+        .first()
     )
-    return render_template('patient/view_patient.html', patient=get_patient(patient_id), anc_count=anc_count, ldr_count=ldr_count, pnc_count=pnc_count)
+    if row is None:
+        abort(404, f"Patient id {patient_id} doesn't exist.")
+    patient, patient_summary = row
+    if patient_summary is None:
+        patient_summary = summary.get_summary(patient_id)
+    return render_template('patient/view_patient.html',
+                           patient=patient,
+                           summary=patient_summary,
+                           anc_count=patient_summary.anc_count,
+                           ldr_count=patient_summary.ldr_count,
+                           pnc_count=patient_summary.pnc_count)
 
 @bp.route('/view/<int:patient_id>/anc')
 @login_required
@@ -119,13 +115,14 @@ def view_patient_anc(patient_id):
         .join(User, ANC.author_id == User.id)
         .order_by(ANC.created.desc())
     )
+    keyset = (ANC.created.desc(), ANC.id.desc())
     current_info = (
         ANC.query.filter_by(patient_id=patient_id, compulsory=True)
         .order_by(ANC.created.desc())
         .first()
     )
     page = request.args.get('page', type=int, default=1)
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset)
     return render_template('patient/view_patient_anc.html',
                            patient=get_patient(patient_id),
                            diagnosis=pagination_collection.items,
@@ -141,13 +138,14 @@ def view_patient_ldr(patient_id):
         .join(User, LDR.author_id == User.id)
         .order_by(LDR.created.desc())
     )
+    keyset = (LDR.created.desc(), LDR.id.desc())
     current_info = (
         ANC.query.filter_by(patient_id=patient_id, compulsory=True)
         .order_by(ANC.created.desc())
         .first()
     )
     page = request.args.get('page', type=int, default=1)
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset)
     return render_template('patient/view_patient_ldr.html',
                            patient=get_patient(patient_id),
                            diagnosis=pagination_collection.items,
@@ -165,14 +163,45 @@ def view_patient_pnc(patient_id):
         .join(User, PNC.author_id == User.id)
         .order_by(PNC.created.desc())
     )
+    keyset = (PNC.created.desc(), PNC.id.desc())
     page = request.args.get('page', type=int, default=1)
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset)
     return render_template('patient/view_patient_pnc.html',
                            patient=get_patient(patient_id),
                            diagnosis=pagination_collection.items,
                            type=type,
                            pagination=pagination_collection.pagination)
 
+@bp.route('/view/<int:patient_id>/timeline')
+@login_required
+def view_patient_timeline(patient_id):
+    timeline = union_all(*(
+        db.select(literal(kind).label('kind'), model.id.label('id'), model.created.label('created'))
+        .where(model.patient_id == patient_id)
+        for kind, model in RECORD_MODELS.items()
+    )).subquery('timeline')
+    builder = db.session.query(timeline.c.kind, timeline.c.id, timeline.c.created)
+    keyset = (timeline.c.created.desc(), timeline.c.kind.desc(), timeline.c.id.desc())
+    page = request.args.get('page', type=int, default=1)
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset, keyset_only=True)
+
+    # Only the records on this page are loaded in full, one query per type.
+    records = {}
+    for kind, model in RECORD_MODELS.items():
+        ids = [item.id for item in pagination_collection.items if item.kind == kind]
+        if ids:
+            rows = db.session.query(model, User).join(User, model.author_id == User.id).filter(model.id.in_(ids))
+            records.update({(kind, record.id): (record, author) for record, author in rows})
+    diagnosis = [
+        (item.kind,) + records[(item.kind, item.id)]
+        for item in pagination_collection.items
+        if (item.kind, item.id) in records
+    ]
+    return render_template('patient/view_patient_timeline.html',
+                           patient=get_patient(patient_id),
+                           diagnosis=diagnosis,
+                           pagination=pagination_collection.pagination)
+
 def get_patient(patient_id):
     patient = Patient.query.get(patient_id)
 
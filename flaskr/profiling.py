@@ -0,0 +1,127 @@
+import cProfile
+import datetime
+import os
+import pstats
+import re
+import time
+
+from flask import Blueprint, abort, current_app, g, render_template, request, send_from_directory
+
+from flaskr.auth import login_required
+
+# Profiling single requests. An admin adds ?_profile=1 to a URL (or sends an
+# X-Profile: 1 header) and that one request runs under cProfile; the result is
+# saved in instance/profiles/ as <time>-<endpoint>.prof, the response says
+# which file in its X-Profile header, and /profiles lists the recent ones
+# with the functions that took the most time. The .prof files open in
+# snakeviz or python -m pstats. Only the newest PROFILE_KEEP are kept.
+
+bp = Blueprint('profiling', __name__, url_prefix='/profiles')
+
+FILENAME = re.compile(r'^(\d{8}-\d{6}-\d{3})-([\w.]+)\.prof$')
+SORTS = {'tottime': 'Own time', 'cumulative': 'Including calls'}
+
+
+@bp.route('/')
+@login_required
+def index():
+    if not g.user.is_admin:
+        abort(403)
+
+    sort = request.args.get('sort', type=str, default='tottime')
+    if sort not in SORTS:
+        sort = 'tottime'
+    profiles = [summary(name, sort) for name in recent()[:20]]
+    return render_template('profiling/index.html', profiles=profiles, sort=sort, sorts=SORTS)
+
+
+@bp.route('/<name>')
+@login_required
+def download(name):
+    if not g.user.is_admin:
+        abort(403)
+    if not FILENAME.match(name):
+        abort(404)
+    return send_from_directory(directory(), name, as_attachment=True)
+
+
+def directory():
+    return os.path.join(current_app.instance_path, 'profiles')
+
+
+def recent():
+    """Saved profile names, newest first."""
+    try:
+        names = os.listdir(directory())
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if FILENAME.match(name)), reverse=True)
+
+
+def summary(name, sort='tottime', limit=10):
+    taken, endpoint = FILENAME.match(name).groups()
+    stats = pstats.Stats(os.path.join(directory(), name))
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2 if sort == 'tottime' else 3], reverse=True)
+    return {
+        'name': name,
+        'endpoint': endpoint,
+        'taken': datetime.datetime.strptime(taken, '%Y%m%d-%H%M%S-%f'),
+        'total_ms': stats.total_tt * 1000,
+        'functions': [
+            {'function': _label(function), 'calls': calls, 'own_ms': own * 1000, 'cumulative_ms': cumulative * 1000}
+            for function, (_, calls, own, cumulative, _) in rows[:limit]
+        ],
+    }
+
+
+def _label(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{line}({name})'
+
+
+def _requested():
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def start_profile():
+    if g.get('user') is not None and g.user.is_admin and _requested():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def finish_profile(response):
+    name = _save()
+    if name is not None:
+        response.headers['X-Profile'] = name
+    return response
+
+
+def _save():
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None
+    profiler.disable()
+    now = time.time()
+    taken = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'-{int(now * 1000) % 1000:03d}'
+    name = f'{taken}-{request.endpoint or "unknown"}.prof'
+    os.makedirs(directory(), exist_ok=True)
+    profiler.dump_stats(os.path.join(directory(), name))
+    for old in recent()[keep():]:
+        try:
+            os.remove(os.path.join(directory(), old))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def keep():
+    return int(os.getenv("PROFILE_KEEP", "100"))
+
+
+def init_app(app):
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    # A request that raised skips after_request; save what it did anyway.
+    app.teardown_request(lambda exc: _save())
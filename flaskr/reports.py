@@ -0,0 +1,470 @@
+import collections
+import datetime
+import functools
+
+import click
+from flask import Blueprint, abort, flash, g, redirect, render_template, request, url_for
+from flask.cli import with_appcontext
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from flaskr.auth import login_required
+from .models import ANC, LDR, MonthlyHistogram, MonthlyIndicator, ReportMonth, db
+
+# Monthly facility indicators for the Ministry reports. Every month with
+# deliveries or ANC visits has a row per indicator (a numerator and, for
+# rates, a denominator) and a histogram of birth weight and blood loss, so a
+# report over any range of months sums a few hundred rows and reads its
+# percentiles off the merged histogram.
+#
+# The diagnosis views, the importer and patient deletes mark the months
+# they touch as dirty; 'flask refresh-reports' (run from cron) or the
+# Refresh button recomputes just those months. A delivery counts in the
+# month of its delivery_date, or of its entry when that is missing.
+#
+# anc_1/anc_4 count the ANC visits of the delivery's pregnancy: the mother's
+# visits in the PREGNANCY_WEEKS before the delivery day and after her
+# previous delivery. Saving or deleting an ANC visit therefore also marks the
+# months of her deliveries in the PREGNANCY_WEEKS after it.
+
+bp = Blueprint('reports', __name__, url_prefix='/reports')
+
+INDICATORS = {
+    'deliveries': 'Deliveries',
+    'shoulder_dystocia': 'Shoulder dystocia',
+    'tear': 'Tears',
+    'uterine_rupture': 'Uterine rupture',
+    'hysterectomy': 'Obstetric hysterectomy',
+    'low_birth_weight': 'Birth weight under 2500 g',
+    'anc_1': 'Deliveries with at least 1 ANC visit',
+    'anc_4': 'Deliveries with at least 4 ANC visits',
+    'anc_visits': 'ANC visits',
+    'anc_clients': 'Women seen for ANC',
+    'vaccination': 'ANC clients vaccinated',
+    'folic_acid': 'ANC clients given folic acid',
+}
+# Histogram bucket width per measure, in the measure's unit.
+MEASURES = {'birth_weight_g': 100, 'blood_loss_ml': 50}
+PERCENTILES = (10, 25, 50, 75, 90)
+LOW_BIRTH_WEIGHT_G = 2500
+PREGNANCY_WEEKS = 42
+
+
+@bp.route('/')
+@login_required
+def index():
+    if not g.user.is_admin:
+        abort(403)
+
+    try:
+        end = _parse_month(request.args.get('end')) or month_start(datetime.date.today())
+        start = _parse_month(request.args.get('start')) or add_months(end, -11)
+    except ValueError:
+        abort(400, 'Months must be YYYY-MM.')
+    if start > end:
+        start, end = end, start
+
+    return render_template('reports/index.html', report=report(start, end), start=start, end=end,
+                           indicators=INDICATORS, percentiles=PERCENTILES)
+
+
+@bp.route('/refresh', methods=('POST',))
+@login_required
+def refresh_view():
+    if not g.user.is_admin:
+        abort(403)
+
+    months = refresh()
+    flash(f'Refreshed {len(months)} months.', 'success')
+    return redirect(url_for('reports.index', start=request.form.get('start'), end=request.form.get('end')))
+
+
+def report(start, end):
+    """Indicators and percentiles for the months start..end (first days of
+    months, inclusive), totalled and per month."""
+    rows = (
+        db.session.query(MonthlyIndicator.month, MonthlyIndicator.indicator,
+                         MonthlyIndicator.numerator, MonthlyIndicator.denominator)
+        .filter(MonthlyIndicator.month >= start, MonthlyIndicator.month <= end)
+    )
+    months = {}
+    totals = {indicator: [0, None] for indicator in INDICATORS}
+    for month, indicator, numerator, denominator in rows:
+        months.setdefault(month, {})[indicator] = (numerator, denominator)
+        if indicator in totals:
+            totals[indicator][0] += numerator
+            if denominator is not None:
+                totals[indicator][1] = (totals[indicator][1] or 0) + denominator
+
+    histograms = collections.defaultdict(dict)
+    for measure, bucket, count in (
+        db.session.query(MonthlyHistogram.measure, MonthlyHistogram.bucket, func.sum(MonthlyHistogram.count))
+        .filter(MonthlyHistogram.month >= start, MonthlyHistogram.month <= end)
+        .group_by(MonthlyHistogram.measure, MonthlyHistogram.bucket)
+    ):
+        histograms[measure][bucket] = int(count)
+
+    pending = [
+        month for (month,) in
+        db.session.query(ReportMonth.month)
+        .filter(ReportMonth.dirty, ReportMonth.month >= start, ReportMonth.month <= end)
+        .order_by(ReportMonth.month)
+    ]
+    return {
+        'totals': {indicator: tuple(value) for indicator, value in totals.items()},
+        'months': dict(sorted(months.items())),
+        'distributions': {
+            measure: {'count': sum(histograms[measure].values()),
+                      'percentiles': percentiles(histograms[measure], width)}
+            for measure, width in MEASURES.items()
+        },
+        'pending': pending,
+    }
+
+
+def percentiles(histogram, width, points=PERCENTILES):
+    """Percentiles from {bucket: count}, interpolated within a bucket."""
+    if not histogram:
+        return dict.fromkeys(points)
+    buckets = sorted(histogram)
+    numpy = _numpy()
+    if numpy is not None:
+        lows = numpy.array(buckets, dtype=float) * width
+        counts = numpy.array([histogram[bucket] for bucket in buckets], dtype=float)
+        cumulative = numpy.cumsum(counts)
+        targets = numpy.array(points, dtype=float) / 100 * cumulative[-1]
+        index = numpy.minimum(numpy.searchsorted(cumulative, targets), len(buckets) - 1)
+        below = numpy.where(index > 0, cumulative[index - 1], 0.0)
+        values = lows[index] + (targets - below) / counts[index] * width
+        return {point: round(float(value), 1) for point, value in zip(points, values)}
+
+    total = sum(histogram.values())
+    result = {}
+    for point in points:
+        target = point / 100 * total
+        below = 0
+        for bucket in buckets:
+            count = histogram[bucket]
+            if below + count >= target or bucket == buckets[-1]:
+                result[point] = round(bucket * width + (target - below) / count * width, 1)
+                break
+            below += count
+    return result
+
+
+def compute_month(month):
+    """Indicator rows and histograms for one month, from the LDR/ANC tables."""
+    rows = db.session.execute(
+        db.select(LDR.shoulder_dystocia, LDR.tear, LDR.ulterine_rupture, LDR.obsteric_hysterectomy,
+                  LDR.weight_g, LDR.blood_loss_ml, LDR.patient_id, LDR.delivery_date, LDR.created)
+        .where(in_month(LDR, month))
+    ).all()
+    anc_counts = pregnancy_anc_counts([(row.patient_id, _as_date(row.delivery_date) or _as_date(row.created))
+                                       for row in rows])
+    deliveries = [(*row[:6], anc) for row, anc in zip(rows, anc_counts)]
+    visits = db.session.execute(
+        db.select(ANC.patient_id, ANC.vaccination, ANC.folic_acid)
+        .where(in_month(ANC, month))
+    ).all()
+
+    counts, histograms = (_count_numpy if _numpy() is not None else _count_python)(deliveries, visits)
+    delivered = counts['deliveries']
+    denominators = {
+        'deliveries': None, 'anc_visits': None, 'anc_clients': None,
+        'low_birth_weight': sum(histograms['birth_weight_g'].values()),
+        'vaccination': counts['anc_clients'], 'folic_acid': counts['anc_clients'],
+    }
+    indicators = {indicator: (counts[indicator], denominators.get(indicator, delivered)) for indicator in INDICATORS}
+    return indicators, histograms
+
+
+def pregnancy_anc_counts(deliveries):
+    """The number of ANC visits of the pregnancy ending in each of
+    deliveries, (patient_id, delivery day) pairs."""
+    patient_ids = sorted({patient_id for patient_id, _ in deliveries})
+    if not patient_ids:
+        return []
+    first = min(day for _, day in deliveries) - datetime.timedelta(weeks=PREGNANCY_WEEKS)
+    last = datetime.datetime.combine(max(day for _, day in deliveries) + datetime.timedelta(days=1), datetime.time())
+    visits = collections.defaultdict(list)
+    earlier = collections.defaultdict(list)
+    for ids in _chunks(patient_ids):
+        for patient_id, created in db.session.execute(
+            db.select(ANC.patient_id, ANC.created)
+            .where(ANC.patient_id.in_(ids), ANC.created >= datetime.datetime.combine(first, datetime.time()),
+                   ANC.created < last)
+        ):
+            visits[patient_id].append(_as_date(created))
+        for patient_id, delivery_date, created in db.session.execute(
+            db.select(LDR.patient_id, LDR.delivery_date, LDR.created).where(LDR.patient_id.in_(ids))
+        ):
+            earlier[patient_id].append(_as_date(delivery_date) or _as_date(created))
+
+    counts = []
+    for patient_id, day in deliveries:
+        start = day - datetime.timedelta(weeks=PREGNANCY_WEEKS)
+        previous = [other for other in earlier[patient_id] if other < day]
+        if previous:
+            start = max(start, max(previous) + datetime.timedelta(days=1))
+        counts.append(sum(start <= visit <= day for visit in visits[patient_id]))
+    return counts
+
+
+def _chunks(values, size=500):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+@functools.cache
+def _numpy():
+    # Imported on first use: numpy takes longer to import than the app, and
+    # most processes never compute a report.
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - numpy is optional
+        return None
+    return numpy
+
+
+def _count_numpy(deliveries, visits):
+    numpy = _numpy()
+    dystocia, tear, rupture, hysterectomy, weights, blood_loss, anc = list(zip(*deliveries)) or [()] * 7
+    patients, vaccinated, folic_acid = list(zip(*visits)) or [()] * 3
+    weights = numpy.array(weights, dtype=float)
+    blood_loss = numpy.array(blood_loss, dtype=float)
+    anc = numpy.array(anc, dtype=float)
+    patients = numpy.array(patients, dtype=numpy.int64)
+
+    def flagged(column):
+        return int(numpy.count_nonzero(numpy.array(column, dtype=bool)))
+
+    def clients(column):
+        return len(numpy.unique(patients[numpy.array(column, dtype=bool)]))
+
+    counts = {
+        'deliveries': len(deliveries),
+        'shoulder_dystocia': flagged(dystocia),
+        'tear': flagged(tear),
+        'uterine_rupture': flagged(rupture),
+        'hysterectomy': flagged(hysterectomy),
+        'low_birth_weight': int(numpy.count_nonzero(weights < LOW_BIRTH_WEIGHT_G)),
+        'anc_1': int(numpy.count_nonzero(anc >= 1)),
+        'anc_4': int(numpy.count_nonzero(anc >= 4)),
+        'anc_visits': len(visits),
+        'anc_clients': len(numpy.unique(patients)),
+        'vaccination': clients(vaccinated),
+        'folic_acid': clients(folic_acid),
+    }
+    histograms = {}
+    for measure, values in (('birth_weight_g', weights), ('blood_loss_ml', blood_loss)):
+        values = values[~numpy.isnan(values)]
+        buckets, bucket_counts = numpy.unique(numpy.floor(values / MEASURES[measure]).astype(numpy.int64),
+                                              return_counts=True)
+        histograms[measure] = {int(bucket): int(count) for bucket, count in zip(buckets, bucket_counts)}
+    return counts, histograms
+
+
+def _count_python(deliveries, visits):
+    counts = dict.fromkeys(INDICATORS, 0)
+    histograms = {measure: collections.Counter() for measure in MEASURES}
+    for dystocia, tear, rupture, hysterectomy, weight, blood_loss, anc in deliveries:
+        counts['deliveries'] += 1
+        counts['shoulder_dystocia'] += bool(dystocia)
+        counts['tear'] += bool(tear)
+        counts['uterine_rupture'] += bool(rupture)
+        counts['hysterectomy'] += bool(hysterectomy)
+        counts['anc_1'] += anc >= 1
+        counts['anc_4'] += anc >= 4
+        if weight is not None:
+            counts['low_birth_weight'] += weight < LOW_BIRTH_WEIGHT_G
+            histograms['birth_weight_g'][int(weight // MEASURES['birth_weight_g'])] += 1
+        if blood_loss is not None:
+            histograms['blood_loss_ml'][int(blood_loss // MEASURES['blood_loss_ml'])] += 1
+    counts['anc_visits'] = len(visits)
+    counts['anc_clients'] = len({patient_id for patient_id, _, _ in visits})
+    counts['vaccination'] = len({patient_id for patient_id, vaccinated, _ in visits if vaccinated})
+    counts['folic_acid'] = len({patient_id for patient_id, _, folic_acid in visits if folic_acid})
+    return counts, {measure: dict(histogram) for measure, histogram in histograms.items()}
+
+
+def refresh(months=None):
+    """Recompute the dirty months (or the given ones); each month is committed
+    on its own. Returns the months refreshed."""
+    if months is None:
+        months = [month for (month,) in db.session.query(ReportMonth.month).filter(ReportMonth.dirty).order_by(ReportMonth.month)]
+    for month in months:
+        # Cleared before computing, so a record saved meanwhile marks it again.
+        db.session.merge(ReportMonth(month=month, dirty=False, refreshed_at=datetime.datetime.now()))
+        indicators, histograms = compute_month(month)
+        db.session.execute(db.delete(MonthlyIndicator).where(MonthlyIndicator.month == month))
+        db.session.execute(db.delete(MonthlyHistogram).where(MonthlyHistogram.month == month))
+        db.session.execute(db.insert(MonthlyIndicator), [
+            {"month": month, "indicator": indicator, "numerator": numerator, "denominator": denominator}
+            for indicator, (numerator, denominator) in indicators.items()
+        ])
+        rows = [
+            {"month": month, "measure": measure, "bucket": bucket, "count": count}
+            for measure, histogram in histograms.items() for bucket, count in histogram.items()
+        ]
+        if rows:
+            db.session.execute(db.insert(MonthlyHistogram), rows)
+        db.session.commit()
+    return months
+
+
+def record_changed(record):
+    """Mark the month an ANC or LDR record is reported in for refreshing."""
+    kind = record.__tablename__
+    if kind == 'ldr':
+        mark_months([_as_date(record.delivery_date) or _as_date(record.created) or datetime.date.today()])
+    elif kind == 'anc':
+        created = _as_date(record.created) or datetime.date.today()
+        mark_months([created, *_later_deliveries([(record.patient_id, created)])])
+
+
+def records_added(kind, values):
+    """Bulk record_changed for imported rows (dicts of column values)."""
+    if kind == 'ldr':
+        mark_months({_as_date(row.get('delivery_date')) or row['created'] for row in values})
+    elif kind == 'anc':
+        visits = {(row['patient_id'], _as_date(row['created'])) for row in values}
+        mark_months({day for _, day in visits} | set(_later_deliveries(visits)))
+
+
+def _later_deliveries(visits):
+    """Delivery days whose anc_1/anc_4 may count visits, (patient_id, day)
+    pairs."""
+    by_patient = collections.defaultdict(list)
+    for patient_id, day in visits:
+        by_patient[patient_id].append(day)
+    days = set()
+    for ids in _chunks(sorted(by_patient)):
+        for patient_id, delivery_date, created in db.session.execute(
+            db.select(LDR.patient_id, LDR.delivery_date, LDR.created).where(LDR.patient_id.in_(ids))
+        ):
+            delivered = _as_date(delivery_date) or _as_date(created)
+            if any(day <= delivered <= day + datetime.timedelta(weeks=PREGNANCY_WEEKS)
+                   for day in by_patient[patient_id]):
+                days.add(delivered)
+    return days
+
+
+def patient_deleted(patient_id):
+    """Mark the months of a patient's records before they are deleted."""
+    days = {created for (created,) in db.session.query(ANC.created).filter(ANC.patient_id == patient_id)}
+    days.update(
+        _as_date(delivery_date) or created for delivery_date, created in
+        db.session.query(LDR.delivery_date, LDR.created).filter(LDR.patient_id == patient_id)
+    )
+    mark_months(days)
+
+
+def mark_months(days):
+    for month in sorted({month_start(day) for day in map(_as_date, days) if day is not None}):
+        update = (
+            db.update(ReportMonth)
+            .where(ReportMonth.month == month)
+            .values(dirty=True)
+            .execution_options(synchronize_session=False)
+        )
+        if db.session.execute(update).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(ReportMonth).values(month=month, dirty=True))
+        except IntegrityError:
+            db.session.execute(update)
+
+
+def in_month(model, month):
+    start, end = _bounds(month)
+    if model is LDR:
+        return or_(
+            and_(LDR.delivery_date >= start, LDR.delivery_date < end),
+            and_(LDR.delivery_date.is_(None),
+                 LDR.created >= datetime.datetime.combine(start, datetime.time()),
+                 LDR.created < datetime.datetime.combine(end, datetime.time())),
+        )
+    return and_(model.created >= datetime.datetime.combine(start, datetime.time()),
+                model.created < datetime.datetime.combine(end, datetime.time()))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _bounds(month):
+    return month, add_months(month, 1)
+
+
+def _parse_month(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value[:7], '%Y-%m').date()
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str) and value:
+        return datetime.date.fromisoformat(value[:10])
+    return None
+
+
+def _months_with_records():
+    first, last = None, None
+    for column in (ANC.created, LDR.created, LDR.delivery_date):
+        low, high = db.session.query(func.min(column), func.max(column)).one()
+        for value in (_as_date(low), _as_date(high)):
+            if value is not None:
+                first = value if first is None or value < first else first
+                last = value if last is None or value > last else last
+    if first is None:
+        return []
+    months, month = [], month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+@click.command('refresh-reports')
+@with_appcontext
+@click.option('--all', 'everything', is_flag=True, help='Recompute every month with records.')
+def refresh_reports_command(everything):
+    """Recompute the monthly report rollups for the months marked dirty."""
+    months = refresh(_months_with_records() if everything else None)
+    click.echo(f'Refreshed {len(months)} months.')
+
+
+@click.command('report')
+@with_appcontext
+@click.option('--start', help='First month, YYYY-MM (default: 11 months before --end).')
+@click.option('--end', help='Last month, YYYY-MM (default: this month).')
+def report_command(start, end):
+    """Print the monthly indicators for a range of months."""
+    end = _parse_month(end) or month_start(datetime.date.today())
+    start = _parse_month(start) or add_months(end, -11)
+    result = report(start, end)
+    click.echo(f'{start:%Y-%m} to {end:%Y-%m}')
+    for indicator, label in INDICATORS.items():
+        numerator, denominator = result['totals'][indicator]
+        rate = f' of {denominator} ({numerator / denominator:.1%})' if denominator else ''
+        click.echo(f'  {label}: {numerator}{rate}')
+    for measure, distribution in result['distributions'].items():
+        values = ', '.join(f'p{point} {value}' for point, value in distribution['percentiles'].items())
+        click.echo(f'  {measure} (n={distribution["count"]}): {values}')
+    if result['pending']:
+        click.echo(f'{len(result["pending"])} months are waiting for refresh-reports.', err=True)
+
+
+def init_app(app):
+    app.cli.add_command(refresh_reports_command)
+    app.cli.add_command(report_command)
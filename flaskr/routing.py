@@ -0,0 +1,136 @@
+import os
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+# Read replicas. SQLALCHEMY_REPLICA_URIS is a comma separated list of database
+# URIs; when it is set, GET requests to the main, patient, user and diagnosis
+# views read from a replica while everything else, including every flush and
+# commit, goes to SQLALCHEMY_DATABASE_URI.
+#
+# After a user writes, their reads stay on the primary for
+# REPLICA_STICKY_SECONDS so the record they just saved is there when they are
+# redirected to it. A replica that fails a health check or drops a
+# connection is skipped for REPLICA_RETRY_SECONDS; with no healthy replica,
+# reads fall back to the primary. A statement that fails on the replica
+# (lost connection, missing or broken database file, ...) is run again on the
+# primary, and the rest of the request reads from the primary too.
+
+READ_BLUEPRINTS = {'main', 'patient', 'user', 'diagnosis'}
+
+_lock = threading.Lock()
+_health = {}
+_listening = set()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.wrote_to_primary = True
+            elif _reads_from_replica():
+                replica = _request_replica(self._db.engines)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    # Session.execute, scalars, scalar and the ORM loaders all run their
+    # statements through _execute_internal.
+    def _execute_internal(self, *args, **kwargs):
+        try:
+            return super()._execute_internal(*args, **kwargs)
+        except DBAPIError as e:
+            if not (has_request_context() and g.pop('replica_failed', False)):
+                raise
+            current_app.logger.warning('Replica %s failed, reading from the primary', g.replica.url)
+            g.replica = None
+            if e.connection_invalidated:
+                # The session cannot go on with a dead connection in its
+                # transaction; that connection only ever read.
+                self.rollback()
+            return super()._execute_internal(*args, **kwargs)
+
+
+def replica_binds():
+    uris = [uri.strip() for uri in os.getenv("SQLALCHEMY_REPLICA_URIS", "").split(',') if uri.strip()]
+    return {f'replica{i}': uri for i, uri in enumerate(uris)}
+
+
+def _reads_from_replica():
+    return (
+        current_app.extensions['replicas']
+        and request.method in ('GET', 'HEAD')
+        and request.blueprint in READ_BLUEPRINTS
+        and session.get('primary_until', 0) < time.time()
+    )
+
+
+def _request_replica(engines):
+    # One replica per request, so a page never mixes two replicas' views.
+    if 'replica' not in g:
+        names = current_app.extensions['replicas']
+        healthy = [engines[name] for name in names if _healthy(engines[name])]
+        g.replica = random.choice(healthy) if healthy else None
+    return g.replica
+
+
+def _healthy(engine):
+    now = time.monotonic()
+    with _lock:
+        if engine not in _listening:
+            event.listen(engine, 'handle_error', _on_error)
+            _listening.add(engine)
+        checked_at, ok = _health.get(engine, (None, None))
+    if checked_at is not None and now - checked_at < (check_seconds() if ok else retry_seconds()):
+        return ok
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        ok = True
+    except Exception:
+        current_app.logger.warning('Replica %s is unreachable, reading from the primary', engine.url)
+        ok = False
+    with _lock:
+        _health[engine] = (now, ok)
+    return ok
+
+
+def _on_error(context):
+    failed_request = has_request_context() and context.engine is g.get('replica')
+    if failed_request:
+        g.replica_failed = True
+    if failed_request or context.is_disconnect or context.connection is None:
+        with _lock:
+            _health[context.engine] = (time.monotonic(), False)
+
+
+def mark_writes(response):
+    if g.get('wrote_to_primary'):
+        session['primary_until'] = time.time() + sticky_seconds()
+    return response
+
+
+def sticky_seconds():
+    return float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+
+def check_seconds():
+    return float(os.getenv("REPLICA_CHECK_SECONDS", "30"))
+
+
+def retry_seconds():
+    return float(os.getenv("REPLICA_RETRY_SECONDS", "10"))
+
+
+def init_app(app):
+    """Register the replicas; call before db.init_app."""
+    binds = replica_binds()
+    app.config.setdefault('SQLALCHEMY_BINDS', {}).update(binds)
+    app.extensions['replicas'] = list(binds)
+    app.after_request(mark_writes)
@@ -0,0 +1,160 @@
+import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from .models import ANC, RiskFlag, ScreeningRun, db
+
+# Batch screening of ANC visits for high-risk pregnancies. Visits are read in
+# id order, a chunk at a time, as columns (NumPy arrays) and every rule is
+# applied to the whole chunk at once; the visits that match any rule go to
+# the risk_flag worklist. Each run starts after the last visit the previous
+# run reached, so 'flask screen-anc' from cron only reads new visits. Edited
+# visits are screened again by the update view.
+#
+# Folic acid and vaccination are judged per patient: a follow-up visit is
+# flagged while none of the patient's visits records them, and the flag is
+# dropped once one does.
+
+RULES = {
+    'severe_hypertension': 'Blood pressure 160/110 or higher',
+    'hypertension': 'Blood pressure 140/90 or higher',
+    'fetal_heart_rate': 'Fetal heart rate outside 110-160 bpm',
+    'no_folic_acid': 'No folic acid recorded',
+    'no_vaccination': 'No vaccination recorded',
+}
+CHUNK_SIZE = 5000
+COLUMNS = (ANC.id, ANC.patient_id, ANC.created, ANC.compulsory,
+           ANC.bp_systolic, ANC.bp_diastolic, ANC.fetal_heartbeat_bpm)
+
+
+def screen(chunk_size=CHUNK_SIZE, full=False):
+    """Screen the visits added since the last run (all visits with full).
+    Each chunk is committed with the run's progress; returns the run."""
+    if full:
+        db.session.execute(db.delete(RiskFlag))
+        after_id = 0
+    else:
+        after_id = db.session.query(func.max(ScreeningRun.last_anc_id)).scalar() or 0
+    run = ScreeningRun(started_at=datetime.datetime.now(), last_anc_id=after_id, screened=0, flagged=0)
+    db.session.add(run)
+    db.session.commit()
+
+    while True:
+        rows = db.session.execute(
+            db.select(*COLUMNS).where(ANC.id > after_id).order_by(ANC.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        run.flagged += _store(rows)
+        run.screened += len(rows)
+        run.last_anc_id = after_id = rows[-1].id
+        db.session.commit()
+
+    run.finished_at = datetime.datetime.now()
+    db.session.commit()
+    return run
+
+
+def rescreen(anc_ids):
+    """Screen particular visits again, e.g. after an edit."""
+    rows = db.session.execute(db.select(*COLUMNS).where(ANC.id.in_(anc_ids))).all()
+    db.session.execute(db.delete(RiskFlag).where(RiskFlag.anc_id.in_(anc_ids)))
+    if rows:
+        _store(rows)
+
+
+def record_removed(anc_id):
+    db.session.execute(db.delete(RiskFlag).where(RiskFlag.anc_id == anc_id))
+
+
+def evaluate(rows):
+    """{rule: boolean array} over rows of COLUMNS."""
+    import numpy
+
+    _, patient_ids, _, compulsory, systolic, diastolic, heart_rate = zip(*rows)
+    patients = numpy.array(patient_ids, dtype=numpy.int64)
+    systolic = numpy.array(systolic, dtype=float)
+    diastolic = numpy.array(diastolic, dtype=float)
+    heart_rate = numpy.array(heart_rate, dtype=float)
+    follow_up = ~numpy.array(compulsory, dtype=bool)
+
+    severe = (systolic >= 160) | (diastolic >= 110)
+    unique_patients = numpy.unique(patients).tolist()
+    return {
+        'severe_hypertension': severe,
+        'hypertension': ((systolic >= 140) | (diastolic >= 90)) & ~severe,
+        'fetal_heart_rate': ~numpy.isnan(heart_rate) & ((heart_rate < 110) | (heart_rate > 160)),
+        'no_folic_acid': follow_up & ~numpy.isin(patients, _patients_with(ANC.folic_acid, unique_patients)),
+        'no_vaccination': follow_up & ~numpy.isin(patients, _patients_with(ANC.vaccination, unique_patients)),
+    }
+
+
+def _store(rows):
+    """Replace the flags of rows with the rules they match; returns how many
+    visits were flagged."""
+    import numpy
+
+    results = evaluate(rows)
+    matrix = numpy.vstack([results[rule] for rule in RULES])
+    flagged = numpy.flatnonzero(matrix.any(axis=0))
+    names = numpy.array(list(RULES))
+
+    ids = [row.id for row in rows]
+    db.session.execute(db.delete(RiskFlag).where(RiskFlag.anc_id.in_(ids)))
+    if len(flagged):
+        db.session.execute(db.insert(RiskFlag), [
+            {"anc_id": rows[i].id, "patient_id": rows[i].patient_id,
+             "visit_created": rows[i].created or datetime.datetime.now(),
+             "reasons": ','.join(names[matrix[:, i]])}
+            for i in flagged.tolist()
+        ])
+    _clear_resolved({row.patient_id for row in rows})
+    return len(flagged)
+
+
+def _patients_with(column, patient_ids):
+    if not patient_ids:
+        return []
+    return [patient_id for (patient_id,) in
+            db.session.query(ANC.patient_id).filter(ANC.patient_id.in_(patient_ids), column).distinct()]
+
+
+def _clear_resolved(patient_ids):
+    # Earlier visits' folic acid/vaccination flags for patients who have
+    # since had them.
+    resolved = {
+        'no_folic_acid': set(_patients_with(ANC.folic_acid, list(patient_ids))),
+        'no_vaccination': set(_patients_with(ANC.vaccination, list(patient_ids))),
+    }
+    candidates = set().union(*resolved.values())
+    if not candidates:
+        return
+    for flag in RiskFlag.query.filter(RiskFlag.patient_id.in_(candidates)):
+        reasons = [reason for reason in flag.reasons.split(',')
+                   if flag.patient_id not in resolved.get(reason, ())]
+        if not reasons:
+            db.session.delete(flag)
+        elif len(reasons) != len(flag.reasons.split(',')):
+            flag.reasons = ','.join(reasons)
+
+
+def last_run():
+    return ScreeningRun.query.order_by(ScreeningRun.id.desc()).first()
+
+
+@click.command('screen-anc')
+@with_appcontext
+@click.option('--full', is_flag=True, help='Screen every visit again instead of only new ones.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True)
+def screen_anc_command(full, chunk_size):
+    """Flag high-risk ANC visits for the risk worklist."""
+    run = screen(chunk_size, full)
+    seconds = (run.finished_at - run.started_at).total_seconds()
+    click.echo(f'Screened {run.screened} visits up to id {run.last_anc_id}, '
+               f'flagged {run.flagged}, in {seconds:.1f}s.')
+
+
+def init_app(app):
+    app.cli.add_command(screen_anc_command)
@@ -0,0 +1,432 @@
+import collections
+import datetime
+import os
+import re
+import threading
+import time
+import unicodedata
+
+import click
+from flask_paginate import Pagination
+from sqlalchemy import and_, func, inspect, or_, text
+
+from . import names
+from .models import Patient, PatientNameKey, Tombstone, db
+from .pagination_collection import PaginationCollection
+
+# Patient search behind main.search. Name and address terms are looked up in
+# a text index to get ranked candidates:
+#   - SQLite: the patient_search FTS5 table (trigram tokenizer),
+#   - Postgres: pg_trgm / tsvector GIN indexes on the patient table,
+#   - anything else: an in-process trigram index built from the patient table.
+# Candidates are re-ranked in Python (prefix matches first, then trigram
+# similarity), so results are the same whichever backend found them. Names
+# are also looked up by their Khmer/romanized keys (see names.py). Phone
+# numbers are matched on the indexed Patient.phone_normalized column.
+
+CANDIDATE_LIMIT = 200
+MIN_SIMILARITY = 0.2
+
+
+def search_patients(page, name=None, sex=None, date_of_birth=None, phone=None, address=None):
+    builder = Patient.query.order_by(Patient.name)
+    if sex:
+        builder = builder.filter(Patient.sex == sex)
+    if date_of_birth:
+        builder = builder.filter(Patient.date_of_birth == date_of_birth)
+    if phone:
+        digits = normalize_phone(phone)
+        if not digits:
+            # No digits to match; an empty prefix would match everyone.
+            return RankedResults([], page)
+        builder = builder.filter(
+            Patient.phone_normalized >= digits, Patient.phone_normalized < digits + ':'
+        )
+
+    raw_name, name = name, normalize_text(name)
+    address_tokens = tokenize(address)
+    if not name and not address_tokens:
+        return PaginationCollection(builder, page, keyset=(Patient.name, Patient.id))
+
+    backend = get_backend()
+    candidates = None
+    if name:
+        candidates = _merge(name_key_candidates(raw_name), backend.name_candidates(name))
+    if address_tokens:
+        matches = set(backend.address_candidates(address_tokens))
+        candidates = matches if candidates is None else [id for id in candidates if id in matches]
+
+    patients = builder.filter(Patient.id.in_(list(candidates)[:CANDIDATE_LIMIT])).all() if candidates else []
+    if address_tokens:
+        # The text indexes match substrings and skip short tokens; keep only
+        # addresses where every search token starts an address token.
+        patients = [patient for patient in patients if _address_matches(patient.address, address_tokens)]
+    ranked = rank(patients, raw_name)
+    return RankedResults(ranked, page)
+
+
+class RankedResults:
+    def __init__(self, patients, page):
+        per_page = int(os.getenv("PER_PAGE"))
+        offset = (page - 1) * per_page
+        self.items = patients[offset:offset + per_page]
+        self.pagination = Pagination(page=page, total=len(patients), per_page=per_page, css_framework='bootstrap5')
+
+
+def rank(patients, query):
+    name = normalize_text(query)
+    if not name:
+        return sorted(patients, key=lambda patient: (patient.name, patient.id))
+
+    scored = []
+    for patient in patients:
+        candidate = normalize_text(patient.name)
+        score = similarity(name, candidate) + 1.5 * names.key_overlap(query, patient.name)
+        if candidate.startswith(name):
+            score += 2
+        elif any(word.startswith(name) for word in candidate.split()):
+            score += 1
+        if score >= MIN_SIMILARITY:
+            scored.append((-score, patient.name, patient.id, patient))
+    scored.sort(key=lambda item: item[:3])
+    return [item[-1] for item in scored]
+
+
+def name_key_candidates(query):
+    """Patients sharing a Khmer, romanized or phonetic name key with the query."""
+    keys = names.name_keys(query)
+    if not keys:
+        return []
+    rows = db.session.execute(
+        db.select(PatientNameKey.patient_id)
+        .where(or_(*(and_(PatientNameKey.kind == kind, PatientNameKey.key == key) for kind, key in keys)))
+        .group_by(PatientNameKey.patient_id)
+        .order_by(func.count().desc())
+        .limit(CANDIDATE_LIMIT)
+    )
+    return [row[0] for row in rows]
+
+
+def _merge(*candidate_lists):
+    seen = {}
+    for candidates in candidate_lists:
+        for patient_id in candidates:
+            seen.setdefault(patient_id, None)
+    return list(seen)
+
+
+def _address_matches(address, tokens):
+    words = tokenize(address)
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def normalize_text(value):
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKC', value).casefold()
+    return ' '.join(value.split())
+
+
+def tokenize(value):
+    # Letters, digits and combining marks: Khmer vowel signs and the coeng
+    # are marks (Mn/Mc), and splitting on them would break words apart.
+    text = ''.join(char if unicodedata.category(char)[0] in 'LNM' else ' ' for char in normalize_text(value))
+    return text.split()
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('855') and len(digits) > 9:
+        digits = digits[3:]
+    return digits.lstrip('0')
+
+
+def trigrams(value):
+    grams = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def index_patient(patient):
+    """Refresh the search data for a patient; call before committing."""
+    patient.phone_normalized = normalize_phone(patient.phone)
+    db.session.flush()
+    index_name_keys(patient.id, patient.name)
+    get_backend().update(patient.id, patient.name, patient.address)
+
+
+def index_name_keys(patient_id, name):
+    db.session.execute(db.delete(PatientNameKey).where(PatientNameKey.patient_id == patient_id))
+    keys = names.name_keys(name)
+    if keys:
+        db.session.execute(db.insert(PatientNameKey), [
+            {"patient_id": patient_id, "kind": kind, "key": key} for kind, key in keys
+        ])
+
+
+def index_new_patients(patients):
+    """Bulk index_patient for patients just flushed with phone_normalized set."""
+    patient_ids = [patient.id for patient in patients]
+    db.session.execute(db.delete(PatientNameKey).where(PatientNameKey.patient_id.in_(patient_ids)))
+    keys = [{"patient_id": patient.id, "kind": kind, "key": key}
+            for patient in patients for kind, key in names.name_keys(patient.name)]
+    if keys:
+        db.session.execute(db.insert(PatientNameKey), keys)
+    backend = get_backend()
+    for patient in patients:
+        backend.update(patient.id, patient.name, patient.address)
+
+
+def remove_patient(patient_id):
+    get_backend().remove(patient_id)
+
+
+class SqliteFtsBackend:
+    table = 'patient_search'
+
+    def name_candidates(self, name):
+        if len(name) < 3:
+            return _prefix_candidates(name)
+        grams = {name[i:i + 3] for i in range(len(name) - 2)}
+        query = ' OR '.join(_fts_phrase(gram) for gram in grams)
+        return self._match(f'name : ({query})')
+
+    def address_candidates(self, tokens):
+        query = ' AND '.join(_fts_phrase(token) for token in tokens if len(token) >= 3)
+        if not query:
+            return NgramBackend.shared().address_candidates(tokens)
+        return self._match(f'address : ({query})')
+
+    def _match(self, query):
+        rows = db.session.execute(
+            text(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH :query "
+                 f"ORDER BY bm25({self.table}) LIMIT :limit"),
+            {"query": query, "limit": CANDIDATE_LIMIT},
+        )
+        return [row[0] for row in rows]
+
+    def update(self, patient_id, name, address):
+        self.remove(patient_id)
+        db.session.execute(
+            text(f"INSERT INTO {self.table} (rowid, name, address) VALUES (:id, :name, :address)"),
+            {"id": patient_id, "name": name, "address": address},
+        )
+
+    def remove(self, patient_id):
+        db.session.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {"id": patient_id})
+
+    def rebuild(self):
+        db.session.execute(text(f"DELETE FROM {self.table}"))
+        db.session.execute(text(f"INSERT INTO {self.table} (rowid, name, address) SELECT id, name, address FROM patient"))
+
+
+class PostgresTrigramBackend:
+    def name_candidates(self, name):
+        rows = db.session.execute(
+            text("SELECT id FROM patient WHERE lower(name) % :name OR lower(name) LIKE :prefix "
+                 "ORDER BY similarity(lower(name), :name) DESC LIMIT :limit"),
+            {"name": name, "prefix": _escape_like(name) + '%', "limit": CANDIDATE_LIMIT},
+        )
+        return [row[0] for row in rows]
+
+    def address_candidates(self, tokens):
+        rows = db.session.execute(
+            text("SELECT id FROM patient WHERE to_tsvector('simple', address) @@ to_tsquery('simple', :query) "
+                 "LIMIT :limit"),
+            {"query": ' & '.join(token + ':*' for token in tokens), "limit": CANDIDATE_LIMIT},
+        )
+        return [row[0] for row in rows]
+
+    # The trigram and tsvector indexes are on the patient table itself and
+    # kept up to date by Postgres; there is nothing to maintain here.
+    def update(self, patient_id, name, address):
+        pass
+
+    def remove(self, patient_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class NgramBackend:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._updated_after = None
+        self._deleted_after = None
+        self._names = {}
+        self._addresses = {}
+        self._grams = collections.defaultdict(set)
+        self._tokens = collections.defaultdict(set)
+
+    def name_candidates(self, name):
+        self._ensure_built()
+        counts = collections.Counter()
+        with self._lock:
+            for gram in trigrams(name):
+                counts.update(self._grams.get(gram, ()))
+        return [patient_id for patient_id, _ in counts.most_common(CANDIDATE_LIMIT)]
+
+    def address_candidates(self, tokens):
+        self._ensure_built()
+        with self._lock:
+            matches = None
+            for token in tokens:
+                ids = set()
+                for indexed, patient_ids in self._tokens.items():
+                    if indexed.startswith(token):
+                        ids |= patient_ids
+                matches = ids if matches is None else matches & ids
+        return sorted(matches or ())
+
+    def update(self, patient_id, name, address):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove(patient_id)
+            self._add(patient_id, name, address)
+
+    def remove(self, patient_id):
+        with self._lock:
+            self._remove(patient_id)
+
+    def rebuild(self):
+        rows = db.session.execute(db.select(Patient.id, Patient.name, Patient.address, Patient.updated_at)).all()
+        deleted_after = db.session.query(func.max(Tombstone.deleted_at)).scalar()
+        with self._lock:
+            self._names.clear()
+            self._addresses.clear()
+            self._grams.clear()
+            self._tokens.clear()
+            for row in rows:
+                self._add(row.id, row.name, row.address)
+            self._updated_after = max((row.updated_at for row in rows), default=None)
+            self._deleted_after = deleted_after
+            self._built_at = time.monotonic()
+
+    def refresh(self):
+        """Apply the patients changed or deleted since the last build or
+        refresh, e.g. by other workers."""
+        # Re-read a margin before the last change seen, for transactions that
+        # committed late with an earlier timestamp; re-adding is harmless.
+        margin = datetime.timedelta(seconds=float(os.getenv("SEARCH_INDEX_MARGIN", "60")))
+        changed = db.select(Patient.id, Patient.name, Patient.address, Patient.updated_at)
+        if self._updated_after is not None:
+            changed = changed.where(Patient.updated_at >= self._updated_after - margin)
+        deleted = db.select(Tombstone.record_id, Tombstone.deleted_at).where(Tombstone.kind == 'patients')
+        if self._deleted_after is not None:
+            deleted = deleted.where(Tombstone.deleted_at >= self._deleted_after - margin)
+        rows = db.session.execute(changed).all()
+        tombstones = db.session.execute(deleted).all()
+        with self._lock:
+            for row in rows:
+                self._remove(row.id)
+                self._add(row.id, row.name, row.address)
+            for tombstone in tombstones:
+                self._remove(tombstone.record_id)
+            self._updated_after = max([row.updated_at for row in rows] + [self._updated_after or datetime.datetime.min])
+            self._deleted_after = max([tombstone.deleted_at for tombstone in tombstones]
+                                      + [self._deleted_after or datetime.datetime.min])
+            self._built_at = time.monotonic()
+
+    def _ensure_built(self):
+        # Built once per worker; after that, other workers' edits are picked
+        # up every SEARCH_INDEX_TTL seconds by reading just the changed rows.
+        if self._built_at is None:
+            self.rebuild()
+        elif time.monotonic() - self._built_at > float(os.getenv("SEARCH_INDEX_TTL", "30")):
+            self.refresh()
+
+    def _add(self, patient_id, name, address):
+        name = normalize_text(name)
+        tokens = set(tokenize(address))
+        self._names[patient_id] = name
+        self._addresses[patient_id] = tokens
+        for gram in trigrams(name):
+            self._grams[gram].add(patient_id)
+        for token in tokens:
+            self._tokens[token].add(patient_id)
+
+    def _remove(self, patient_id):
+        name = self._names.pop(patient_id, None)
+        if name is not None:
+            for gram in trigrams(name):
+                self._grams[gram].discard(patient_id)
+        for token in self._addresses.pop(patient_id, ()):
+            self._tokens[token].discard(patient_id)
+
+
+_backends = {}
+
+
+def get_backend():
+    engine = db.engine
+    backend = _backends.get(engine)
+    if backend is None:
+        backend = _backends[engine] = _detect_backend(engine)
+    return backend
+
+
+def _detect_backend(engine):
+    if engine.dialect.name == 'sqlite' and inspect(engine).has_table(SqliteFtsBackend.table):
+        return SqliteFtsBackend()
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            if connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+                return PostgresTrigramBackend()
+    return NgramBackend.shared()
+
+
+def _prefix_candidates(name):
+    # Names shorter than a trigram cannot use the text index; short prefixes
+    # are rare enough that a bounded scan is acceptable.
+    rows = db.session.execute(
+        db.select(Patient.id)
+        .where(func.lower(Patient.name).like(_escape_like(name) + '%', escape='\\'))
+        .order_by(Patient.name)
+        .limit(CANDIDATE_LIMIT)
+    )
+    return [row[0] for row in rows]
+
+
+def _fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@click.command('reindex-search')
+def reindex_search_command():
+    """Rebuild the patient search index, name keys and normalized phone numbers."""
+    for patient in Patient.query.yield_per(1000):
+        patient.phone_normalized = normalize_phone(patient.phone)
+        index_name_keys(patient.id, patient.name)
+    get_backend().rebuild()
+    db.session.commit()
+    click.echo('Rebuilt the patient search index.')
+
+
+def init_app(app):
+    app.cli.add_command(reindex_search_command)
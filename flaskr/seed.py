@@ -0,0 +1,205 @@
+import collections
+import datetime
+import random
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from . import activity, measurements, reports, search, summary
+from .models import ANC, LDR, PNC, Patient, User, db
+
+# 'flask seed' fills an empty database with synthetic patients and records
+# for benchmarking. The same --seed always produces the same data. Volumes
+# follow the clinics' own: about six ANC visits per pregnancy, a delivery
+# for most, and up to three postnatal visits after it, so 100k patients give
+# roughly 1M records. Patients are added with the ORM (for their ids) and
+# records with executemany, a chunk of patients at a time, together with
+# their search keys, summaries and report months; the author activity rollup
+# is recounted at the end.
+
+GIVEN_NAMES = ('Sophea', 'Sreymom', 'Channary', 'Bopha', 'Dara', 'Kanha', 'Thida', 'Rachana', 'Vanna',
+               'Sokha', 'Chenda', 'Leakhena', 'Malis', 'Pisey', 'Raksmey', 'Sreyneang')
+FAMILY_NAMES = ('Chea', 'Kim', 'Heng', 'Ly', 'Sok', 'Chhun', 'Meas', 'Keo', 'Pich', 'Nhem', 'Som', 'Touch',
+                'Seng', 'Chan', 'Hun', 'Mao')
+PROVINCES = ('Phnom Penh', 'Kandal', 'Takeo', 'Kampot', 'Siem Reap', 'Battambang', 'Kampong Cham', 'Prey Veng')
+CHUNK_SIZE = 1000
+
+
+class Generator:
+    def __init__(self, seed, start, days, author_ids):
+        self.rng = random.Random(seed)
+        self.start = start
+        self.days = days
+        self.author_ids = author_ids
+
+    def patient(self):
+        rng = self.rng
+        return {
+            "name": f'{rng.choice(FAMILY_NAMES)} {rng.choice(GIVEN_NAMES)}',
+            "sex": 'female',
+            "date_of_birth": datetime.date(1975, 1, 1) + datetime.timedelta(days=rng.randrange(30 * 365)),
+            "phone": f'0{rng.choice((10, 12, 15, 16, 17, 77, 78, 89, 92, 96))} {rng.randrange(10 ** 6):06d}',
+            "address": f'Village {rng.randrange(1, 400)}, {rng.choice(PROVINCES)}',
+        }
+
+    def records(self, patient_id):
+        """ANC, LDR and PNC rows for one pregnancy."""
+        rng = self.rng
+        lmp = self.start + datetime.timedelta(days=rng.randrange(self.days))
+        due = lmp + datetime.timedelta(days=280)
+        terminated = rng.random() < 0.02
+        anc = [self._record(patient_id, lmp + datetime.timedelta(weeks=rng.randint(8, 12)), {
+            "compulsory": True,
+            "expected_delivery_date": due,
+            "terminate": terminated,
+            "height": str(rng.randint(145, 168)),
+            "last_menstrual_period": lmp,
+            "parity": str(rng.randint(0, 4)),
+            "living_children": str(rng.randint(0, 4)),
+            "gravida": str(rng.randint(1, 5)),
+            "medical_surgical_complications": '',
+            "obstetric_other_complications": '',
+        })]
+        hypertensive = rng.random() < 0.08
+        for week in sorted(rng.sample(range(14, 40), rng.randint(2, 8))):
+            systolic = rng.randint(140, 170) if hypertensive and week > 20 else rng.randint(95, 135)
+            heartbeat = rng.randint(165, 180) if rng.random() < 0.03 else rng.randint(120, 160)
+            anc.append(self._record(patient_id, lmp + datetime.timedelta(weeks=week, days=rng.randrange(7)), {
+                "compulsory": False,
+                "weight": f'{rng.uniform(45, 80):.1f}',
+                "gestation": str(week),
+                "blood_pressure": f'{systolic}/{systolic - rng.randint(35, 55)}',
+                "urine_dipstick": rng.random() < 0.9,
+                "fetal_assessment": '',
+                "fetal_heartbeat": str(heartbeat),
+                "symphysiofundal_height": str(max(week - rng.randint(0, 3), 12)),
+                "complications": '',
+                "vaccination": rng.random() < 0.8,
+                "folic_acid": rng.random() < 0.85,
+                "mendabazole": rng.random() < 0.6,
+                "hepatitis": rng.random() < 0.3,
+            }))
+        if terminated or rng.random() < 0.15:
+            return anc, [], []
+
+        delivered = due + datetime.timedelta(days=rng.randint(-21, 10))
+        ldr = [self._record(patient_id, datetime.datetime.combine(delivered, datetime.time(rng.randrange(24))), {
+            "labour_onset": delivered,
+            "membranes_ruptured": delivered,
+            "duration_2nd_stage": str(rng.randint(10, 120)),
+            "duration_3rd_stage": str(rng.randint(5, 30)),
+            "placenta_delivery": rng.choice(('spontaneous', 'controlled cord traction')),
+            "placenta_complete": rng.random() < 0.97,
+            "membranes_complete": rng.random() < 0.97,
+            "placenta_weight": str(rng.randint(400, 700)),
+            "blood_loss": str(rng.randint(600, 1500) if rng.random() < 0.05 else rng.randint(100, 450)),
+            "shoulder_dystocia": rng.random() < 0.01,
+            "tear": rng.random() < 0.15,
+            "ulterine_rupture": rng.random() < 0.002,
+            "obsteric_hysterectomy": rng.random() < 0.001,
+            "comments": '',
+            "attendent": '',
+            "other_delivery_method": '',
+            "delivery_liquor": rng.choice(('clear', 'clear', 'clear', 'meconium')),
+            "name": '',
+            "delivery_date": delivered,
+            "sex": rng.choice(('male', 'female')),
+            "condition": 'alive',
+            "weight": str(int(rng.gauss(3100, 450))),
+            "length": str(rng.randint(45, 54)),
+            "head_circumference": str(rng.randint(31, 37)),
+        })]
+        pnc = [
+            self._record(patient_id, datetime.datetime.combine(delivered, datetime.time(9)) + datetime.timedelta(days=day), {
+                "transferred_from": '',
+                "mother_height": anc[0]["height"],
+                "mother_weight": f'{rng.uniform(45, 75):.1f}',
+                "baby_weight": f'{rng.gauss(3.3, 0.5):.2f}',
+                "mother_comments": '',
+                "baby_comments": '',
+                "other_comments": '',
+            })
+            for day in sorted(rng.sample((1, 3, 7, 14, 42), rng.randint(0, 3)))
+        ]
+        return anc, ldr, pnc
+
+    def _record(self, patient_id, created, values):
+        if not isinstance(created, datetime.datetime):
+            created = datetime.datetime.combine(created, datetime.time(self.rng.randint(7, 16), self.rng.randrange(60)))
+        return {"patient_id": patient_id, "author_id": self.rng.choice(self.author_ids), "created": created, **values}
+
+
+def seed(patients, seed_value=0, authors=20, start=datetime.date(2020, 1, 1), days=5 * 365, chunk_size=CHUNK_SIZE,
+         progress=None):
+    """Add patients and their records; returns {kind: rows added}."""
+    existing = {user.username: user for user in User.query.filter(User.username.like('seed-%'))}
+    users = [existing.get(f'seed-midwife{i}') or User(username=f'seed-midwife{i}', password='-', is_admin=False)
+             for i in range(authors)]
+    # For 'flask benchmark', which requests the admin pages as well.
+    admin = existing.get('seed-admin') or User(username='seed-admin', password='-', is_admin=True)
+    db.session.add_all(users + [admin])
+    db.session.flush()
+    generator = Generator(seed_value, start, days, [user.id for user in users])
+
+    added = collections.Counter()
+    for offset in range(0, patients, chunk_size):
+        batch = [Patient(**generator.patient()) for _ in range(min(chunk_size, patients - offset))]
+        for patient in batch:
+            patient.phone_normalized = search.normalize_phone(patient.phone)
+        db.session.add_all(batch)
+        db.session.flush()
+
+        rows = {'anc': [], 'ldr': [], 'pnc': []}
+        for patient in batch:
+            for kind, records in zip(rows, generator.records(patient.id)):
+                rows[kind] += [{**record, **measurements.typed_columns(kind, record)} for record in records]
+
+        for kind, model in (('anc', ANC), ('ldr', LDR), ('pnc', PNC)):
+            if rows[kind]:
+                db.session.execute(db.insert(model), rows[kind])
+                reports.records_added(kind, rows[kind])
+            added[kind] += len(rows[kind])
+        search.index_new_patients(batch)
+        summary.refresh_many([patient.id for patient in batch])
+        db.session.commit()
+        db.session.expunge_all()
+
+        added['patient'] += len(batch)
+        if progress is not None:
+            progress(added)
+
+    # Synthetic visits spread over years touch a different (author, day)
+    # row almost every time, so one recount beats updating per record.
+    activity.rebuild()
+    db.session.commit()
+    return added
+
+
+@click.command('seed')
+@with_appcontext
+@click.option('--patients', default=1000, show_default=True)
+@click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--authors', default=20, show_default=True, help='Number of seed-midwife users entering the records.')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), default='2020-01-01', show_default=True,
+              help='Earliest last menstrual period.')
+@click.option('--days', default=5 * 365, show_default=True, help='Spread of the pregnancies after --start.')
+@click.option('--append', is_flag=True, help='Allow seeding a database that already has patients.')
+def seed_command(patients, seed_value, authors, start, days, append):
+    """Fill the database with deterministic synthetic patients and records."""
+    if not append and db.session.query(Patient.id).first() is not None:
+        raise click.ClickException('The database already has patients; use --append to add more.')
+
+    started = time.perf_counter()
+
+    def progress(added):
+        elapsed = time.perf_counter() - started
+        click.echo(f'{added["patient"]} patients, {added["anc"]} ANC, {added["ldr"]} LDR, {added["pnc"]} PNC '
+                   f'({sum(added.values()) / max(elapsed, 1e-6):.0f} rows/s)')
+
+    seed(patients, seed_value, authors, start.date(), days, progress=progress)
+    click.echo("Done. Run 'flask refresh-reports --all' and 'flask screen-anc' to fill the reports and worklist.")
+
+
+def init_app(app):
+    app.cli.add_command(seed_command)
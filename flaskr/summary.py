@@ -0,0 +1,196 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, or_
+
+from .models import ANC, LDR, PNC, Patient, PatientSummary, db
+
+# Per-patient record counters behind patient.view_patient. The add/delete
+# views in diagnosis.py call record_added/record_removed before committing,
+# so the counters change in the same transaction as the record itself.
+# last_anc_visit, latest_compulsory_anc_id and anc_terminated (the terminate
+# flag of that record) back the overdue ANC and expected delivery worklists.
+
+RECORD_MODELS = {'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+COLUMNS = ('anc_count', 'ldr_count', 'pnc_count', 'last_visit', 'last_record_type', 'last_anc_visit',
+           'anc_terminated', 'latest_compulsory_anc_id')
+
+
+def record_added(record):
+    db.session.flush()
+    kind = record.__tablename__
+    model = RECORD_MODELS[kind]
+    counter = getattr(PatientSummary, f'{kind}_count')
+    created = db.select(model.created).where(model.id == record.id).scalar_subquery()
+    newer = or_(PatientSummary.last_visit.is_(None), PatientSummary.last_visit <= created)
+    updated = db.session.execute(
+        db.update(PatientSummary)
+        .where(PatientSummary.patient_id == record.patient_id)
+        .values({counter: counter + 1,
+                 PatientSummary.last_visit: case((newer, created), else_=PatientSummary.last_visit),
+                 PatientSummary.last_record_type: case((newer, kind), else_=PatientSummary.last_record_type),
+                 **(_anc_values(record.patient_id) if kind == 'anc' else {})})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        refresh(record.patient_id)
+
+
+def record_removed(record):
+    db.session.flush()
+    kind = record.__tablename__
+    counter = getattr(PatientSummary, f'{kind}_count')
+    last_visit, last_record_type = _last_visit(record.patient_id)
+    updated = db.session.execute(
+        db.update(PatientSummary)
+        .where(PatientSummary.patient_id == record.patient_id)
+        .values({counter: case((counter > 0, counter - 1), else_=0),
+                 PatientSummary.last_visit: last_visit,
+                 PatientSummary.last_record_type: last_record_type,
+                 **(_anc_values(record.patient_id) if kind == 'anc' else {})})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        refresh(record.patient_id)
+
+
+def anc_changed(patient_id):
+    """Refresh the ANC pointer after an ANC record is edited."""
+    updated = db.session.execute(
+        db.update(PatientSummary)
+        .where(PatientSummary.patient_id == patient_id)
+        .values(_anc_values(patient_id))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        refresh(patient_id)
+
+
+def get_summary(patient_id):
+    summary = db.session.get(PatientSummary, patient_id)
+    if summary is None:
+        # Patients created before the summary table existed, until
+        # 'flask rebuild-summaries' has been run.
+        summary = compute(patient_id)
+    return summary
+
+
+def compute(patient_id):
+    return compute_many([patient_id])[patient_id]
+
+
+def compute_many(patient_ids):
+    summaries = {patient_id: PatientSummary(patient_id=patient_id, anc_count=0, ldr_count=0, pnc_count=0,
+                                            anc_terminated=False)
+                 for patient_id in patient_ids}
+    for kind, model in RECORD_MODELS.items():
+        rows = (
+            db.session.query(model.patient_id, func.count(), func.max(model.created))
+            .filter(model.patient_id.in_(patient_ids))
+            .group_by(model.patient_id)
+        )
+        for patient_id, count, created in rows:
+            summary = summaries[patient_id]
+            setattr(summary, f'{kind}_count', count)
+            if kind == 'anc':
+                summary.last_anc_visit = created
+            if created is not None and (summary.last_visit is None or created > summary.last_visit):
+                summary.last_visit = created
+                summary.last_record_type = kind
+
+    latest_compulsory = {}
+    for patient_id, anc_id, terminate in (
+        db.session.query(ANC.patient_id, ANC.id, ANC.terminate)
+        .filter(ANC.patient_id.in_(patient_ids), ANC.compulsory)
+        .order_by(ANC.patient_id, ANC.created, ANC.id)
+    ):
+        latest_compulsory[patient_id] = (anc_id, terminate)
+    for patient_id, (anc_id, terminate) in latest_compulsory.items():
+        summaries[patient_id].latest_compulsory_anc_id = anc_id
+        summaries[patient_id].anc_terminated = bool(terminate)
+    return summaries
+
+
+def refresh(patient_id):
+    computed = compute(patient_id)
+    db.session.merge(computed)
+    return computed
+
+
+def refresh_many(patient_ids):
+    """Recompute the counters of many patients with one query per record type."""
+    computed = compute_many(patient_ids)
+    db.session.execute(
+        db.delete(PatientSummary).where(PatientSummary.patient_id.in_(patient_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(db.insert(PatientSummary), [
+        {"patient_id": patient_id, **{column: getattr(summary, column) for column in COLUMNS}}
+        for patient_id, summary in computed.items()
+    ])
+
+
+def _anc_values(patient_id):
+    last_anc_visit = db.session.query(func.max(ANC.created)).filter(ANC.patient_id == patient_id).scalar()
+    anc_id, terminate = (
+        db.session.query(ANC.id, ANC.terminate)
+        .filter(ANC.patient_id == patient_id, ANC.compulsory)
+        .order_by(ANC.created.desc(), ANC.id.desc())
+        .first()
+    ) or (None, None)
+    return {PatientSummary.last_anc_visit: last_anc_visit, PatientSummary.anc_terminated: bool(terminate),
+            PatientSummary.latest_compulsory_anc_id: anc_id}
+
+
+def _last_visit(patient_id):
+    latest = None
+    for kind, model in RECORD_MODELS.items():
+        created = (
+            db.session.query(model.created)
+            .filter(model.patient_id == patient_id)
+            .order_by(model.created.desc())
+            .limit(1)
+            .scalar()
+        )
+        if created is not None and (latest is None or created > latest[0]):
+            latest = (created, kind)
+    return latest or (None, None)
+
+
+@click.command('rebuild-summaries')
+@with_appcontext
+@click.option('--verify', is_flag=True, help='Only report patients whose counters are wrong.')
+def rebuild_summaries_command(verify):
+    """Rebuild the per-patient record counters from the ANC/LDR/PNC tables."""
+    checked = wrong = 0
+    patient_ids = [row[0] for row in db.session.query(Patient.id).order_by(Patient.id)]
+    for start in range(0, len(patient_ids), 500):
+        chunk = patient_ids[start:start + 500]
+        stored = {summary.patient_id: summary for summary in
+                  PatientSummary.query.filter(PatientSummary.patient_id.in_(chunk))}
+        for patient_id, expected in compute_many(chunk).items():
+            checked += 1
+            current = stored.get(patient_id)
+            if current is None or any(getattr(current, column) != getattr(expected, column) for column in COLUMNS):
+                wrong += 1
+                if verify:
+                    click.echo(f'Patient {patient_id}: stored {_describe(current)}, expected {_describe(expected)}')
+                else:
+                    db.session.merge(expected)
+        if not verify:
+            db.session.commit()
+        db.session.expunge_all()
+
+    action = 'out of date' if verify else 'rebuilt'
+    click.echo(f'Checked {checked} patients, {wrong} {action}.')
+    if verify and wrong:
+        raise SystemExit(1)
+
+
+def _describe(summary):
+    if summary is None:
+        return 'nothing'
+    return ', '.join(f'{column}={getattr(summary, column)}' for column in COLUMNS)
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_summaries_command)
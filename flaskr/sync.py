@@ -0,0 +1,108 @@
+import datetime
+import os
+
+from sqlalchemy import func, literal
+
+from .models import ANC, LDR, PNC, Patient, Tombstone, db
+from .pagination_collection import decode_token, encode_token, seek
+
+# Delta sync for the tablets' local replicas. Every patient and record has an
+# updated_at, and deletes leave a tombstone. A change token holds, for each
+# of those streams, the (updated_at, id) of the last row the client has
+# seen; changes() returns the rows after it in bounded batches.
+#
+# Only rows older than SYNC_SETTLE_SECONDS are handed out, so a transaction
+# that commits late with an earlier timestamp is still picked up by the next
+# pull instead of falling behind a token that has already moved past it.
+#
+# A tombstone only deletes the local row if that row's updated_at is not
+# newer than deleted_at (ids can be reused after a delete on some engines).
+
+STREAMS = {'patients': Patient, 'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+RECORD_MODELS = {'anc': ANC, 'ldr': LDR, 'pnc': PNC}
+BATCH = 500
+MAX_BATCH = 2000
+
+
+def record_deleted(kind, record_id):
+    db.session.add(Tombstone(kind=kind, record_id=record_id))
+
+
+def patient_deleted(patient_id):
+    """Tombstones for a patient and the records the delete cascades to."""
+    record_deleted('patients', patient_id)
+    _records_deleted(lambda model: model.patient_id == patient_id)
+
+
+def user_deleted(user_id):
+    """Tombstones for the records deleting a user cascades to (author_id)."""
+    _records_deleted(lambda model: model.author_id == user_id)
+
+
+def _records_deleted(criterion):
+    for kind, model in RECORD_MODELS.items():
+        db.session.execute(
+            db.insert(Tombstone).from_select(
+                ['kind', 'record_id'],
+                db.select(literal(kind), model.id).where(criterion(model)),
+            )
+        )
+
+
+def changes(token=None, limit=BATCH):
+    """Rows changed after token: {stream: [rows]}, tombstones, the next token
+    and whether more changes are waiting."""
+    columns = _token_columns()
+    values = decode_token(token, columns) if token else None
+    if values is None:
+        values = [None] * len(columns)
+    positions = [values[i:i + 2] for i in range(0, len(values), 2)]
+
+    cutoff = _as_datetime(db.session.execute(db.select(func.current_timestamp())).scalar())
+    cutoff -= datetime.timedelta(seconds=settle_seconds())
+    dialect_name = db.session.get_bind().dialect.name
+
+    result = {}
+    more = False
+    remaining = limit
+    streams = list(STREAMS.items()) + [('deleted', Tombstone)]
+    for i, (name, model) in enumerate(streams):
+        changed_at = _changed_at(model)
+        if remaining <= 0:
+            result[name] = []
+            more = True
+            continue
+        query = model.query.filter(changed_at < cutoff)
+        if positions[i][1] is not None:
+            query = query.filter(seek((changed_at, model.id), positions[i], dialect_name))
+        rows = query.order_by(changed_at, model.id).limit(remaining + 1).all()
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            more = True
+        if rows:
+            positions[i] = [getattr(rows[-1], changed_at.key), rows[-1].id]
+        remaining -= len(rows)
+        result[name] = rows
+
+    return result, encode_token([value for position in positions for value in position]), more
+
+
+def _changed_at(model):
+    return Tombstone.deleted_at if model is Tombstone else model.updated_at
+
+
+def _token_columns():
+    columns = []
+    for model in list(STREAMS.values()) + [Tombstone]:
+        columns += [_changed_at(model), model.id]
+    return columns
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def settle_seconds():
+    return float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
@@ -1,9 +1,13 @@
+import datetime
+
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for
+    Blueprint, flash, g, jsonify, redirect, render_template, request, url_for
 )
 from werkzeug.security import generate_password_hash
 from werkzeug.exceptions import abort
+from flaskr.auth import login_required
 from .pagination_collection import PaginationCollection
+from . import activity, count_cache, fragment_cache, identity, sync
 from sqlalchemy import union_all
 
 from .models import User, Patient, ANC, LDR, PNC, db
@@ -19,32 +23,53 @@ def index():
 
     page = request.args.get('page', type=int, default=1)
 
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, estimate=User)
 
     return render_template('user/index.html', pagination_collection=pagination_collection)
 
 @bp.route('/profile', methods=('GET', 'POST'))
 def profile():
-    anc_count = (
-        db.session.query(ANC)
-        .filter(ANC.author_id == g.user.id)
-        .count()
-    )
-    ldr_count = (
-        db.session.query(LDR)
-        .filter(LDR.author_id == g.user.id)
-        .count()
-    )
-    pnc_count = (
-        db.session.query(PNC)
-        .filter(PNC.author_id == g.user.id)
-        .count()
-    )
+    counts = activity.totals(g.user.id)
     return render_template('user/profile.html',
                            user=g.user,
-                           anc_count=anc_count,
-                           ldr_count=ldr_count,
-                           pnc_count=pnc_count)
+                           anc_count=counts['anc'],
+                           ldr_count=counts['ldr'],
+                           pnc_count=counts['pnc'])
+
+@bp.route('/activity')
+@login_required
+def activity_report():
+    if not g.user.is_admin:
+        abort(403)
+
+    period = request.args.get('period', type=str, default='week')
+    if period not in activity.PERIODS:
+        period = 'week'
+    end = request.args.get('end', type=_parse_date, default=None) or datetime.date.today()
+    start = request.args.get('start', type=_parse_date, default=None) or end - datetime.timedelta(days=90)
+
+    buckets = activity.report(start, end, period)
+    usernames = dict(
+        db.session.query(User.id, User.username)
+        .filter(User.id.in_({author_id for author_id, _ in buckets}))
+    )
+    rows = sorted(
+        ((period_start, usernames.get(author_id, author_id), counts)
+         for (author_id, period_start), counts in buckets.items()),
+        key=lambda row: (-row[0].toordinal(), str(row[1])),
+    )
+    return render_template('user/activity.html', rows=rows, period=period, start=start, end=end)
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value)
+
+@bp.route('/cache')
+@login_required
+def cache_stats():
+    if not g.user.is_admin:
+        abort(403)
+
+    return jsonify(fragment_cache=fragment_cache.stats())
 
 @bp.route('/profile/<int:type>', methods=('GET', 'POST'))
 def recent_diagnosis(type):
@@ -55,6 +80,7 @@ def recent_diagnosis(type):
             .join(Patient, ANC.patient_id == Patient.id)
             .order_by(ANC.created.desc())
         )
+        keyset = (ANC.created.desc(), ANC.id.desc())
     if type == 1:
         builder = (
             db.session.query(LDR, Patient)
@@ -62,6 +88,7 @@ def recent_diagnosis(type):
             .join(Patient, LDR.patient_id == Patient.id)
             .order_by(LDR.created.desc())
         )
+        keyset = (LDR.created.desc(), LDR.id.desc())
     if type == 2:
         builder = (
             db.session.query(PNC, Patient)
@@ -69,10 +96,11 @@ def recent_diagnosis(type):
             .join(Patient, PNC.patient_id == Patient.id)
             .order_by(PNC.created.desc())
         )
+        keyset = (PNC.created.desc(), PNC.id.desc())
 
     page = request.args.get('page', type=int, default=1)
 
-    pagination_collection = PaginationCollection(builder, page)
+    pagination_collection = PaginationCollection(builder, page, keyset=keyset)
 
     return render_template('user/recent_diagnosis.html',
                            user=g.user,
@@ -101,7 +129,9 @@ def user_edit(id):
 
         user.username = username
         user.is_admin = is_admin
+        identity.invalidate(user.id)
         db.session.commit()
+        count_cache.invalidate(User)
         if 'error' in locals():
             flash(error)
         else:
@@ -135,6 +165,7 @@ def user_create():
             new_user = User(username=username, password=generate_password_hash(password), is_admin=is_admin)
             db.session.add(new_user)
             db.session.commit()
+            count_cache.invalidate(User)
             return redirect(url_for("user.index"))
 
     return render_template('user/form.html', user=User())
@@ -144,8 +175,11 @@ def user_delete(user_id):
     user_to_delete = User.query.get(user_id)
 
     if user_to_delete:
+        identity.invalidate(user_id)
+        sync.user_deleted(user_id)
         db.session.delete(user_to_delete)
         db.session.commit()
+        count_cache.invalidate(User, ANC, LDR, PNC)
         flash(f"User deleted successfully", 'success')
     else:
         flash(f"User not found", 'danger')
@@ -0,0 +1,72 @@
+# Field lists and validation rules for the patient and diagnosis forms,
+# shared by the form views and 'flask import-records'. Each *_error
+# function takes the submitted form (or an imported row) and returns the
+# message to flash, or None when the values are acceptable.
+
+PATIENT_FIELDS = ('name', 'sex', 'date_of_birth', 'phone', 'address')
+
+ANC_COMPULSORY_FIELDS = (
+    'expected_delivery_date', 'terminate', 'height', 'last_menstrual_period', 'parity',
+    'living_children', 'gravida', 'medical_surgical_complications', 'obstetric_other_complications',
+)
+
+ANC_OPTIONAL_FIELDS = (
+    'weight', 'gestation', 'blood_pressure', 'fetal_assessment', 'fetal_heartbeat',
+    'symphysiofundal_height', 'complications', 'urine_dipstick', 'vaccination', 'folic_acid',
+    'mendabazole', 'hepatitis',
+)
+
+LDR_FIELDS = (
+    'labour_onset', 'membranes_ruptured', 'duration_2nd_stage', 'duration_3rd_stage',
+    'placenta_delivery', 'placenta_complete', 'membranes_complete', 'placenta_weight', 'blood_loss',
+    'shoulder_dystocia', 'tear', 'ulterine_rupture', 'obsteric_hysterectomy', 'comments', 'attendent',
+    'other_delivery_method', 'delivery_liquor', 'name', 'delivery_date', 'sex', 'condition', 'weight',
+    'length', 'head_circumference', 'death_time',
+)
+
+PNC_FIELDS = (
+    'transferred_from', 'mother_height', 'mother_weight', 'baby_weight', 'mother_comments',
+    'baby_comments', 'other_comments',
+)
+
+
+def patient_error(form):
+    if not form.get('name'):
+        return 'Name is required.'
+    if not form.get('date_of_birth'):
+        return 'Date of Birth is required.'
+    if not form.get('phone'):
+        return 'Phone is required.'
+    if not form.get('address'):
+        return 'Address is required.'
+    return None
+
+
+def anc_compulsory_error(form):
+    if not form.get('expected_delivery_date'):
+        return "Expected date of delivery is required."
+    if not form.get('height'):
+        return "Mother's height is required."
+    if not form.get('last_menstrual_period'):
+        return "Last menstral period is required."
+    if not form.get('parity'):
+        return "Parity is required."
+    if not form.get('living_children'):
+        return "Number of living children is required."
+    if not form.get('gravida'):
+        return "Gravida is required."
+    return None
+
+
+def anc_optional_error(form):
+    if not any(form.get(field) for field in ANC_OPTIONAL_FIELDS):
+        return "Can not submit an empty form."
+    return None
+
+
+def ldr_error(form):
+    return None
+
+
+def pnc_error(form):
+    return None
@@ -0,0 +1,105 @@
+import datetime
+
+from flask import Blueprint, render_template, request
+from sqlalchemy import and_, literal
+
+from flaskr.auth import login_required
+from .models import ANC, Patient, PatientSummary, RiskFlag, db
+from .pagination_collection import PaginationCollection
+from . import screening
+
+# Lists for the midwives: flagged visits, expected deliveries and women whose
+# ANC visits have lapsed. A pregnancy counts as ongoing while the patient's
+# latest record is an ANC visit (no delivery or postnatal record since) and
+# her latest compulsory ANC record is not marked terminated.
+
+bp = Blueprint('worklist', __name__, url_prefix='/worklist')
+
+DELIVERY_DAYS = 14
+MAX_DELIVERY_DAYS = 90
+OVERDUE_WEEKS = 6
+MAX_OVERDUE_WEEKS = 52
+# Visits older than this belong to a pregnancy that has ended one way or
+# another, whatever was recorded.
+MAX_PREGNANCY_WEEKS = 42
+
+
+@bp.route('/risk')
+@login_required
+def risk():
+    rule = request.args.get('rule', type=str, default=None)
+
+    builder = (
+        db.session.query(RiskFlag, Patient, ANC)
+        .join(Patient, RiskFlag.patient_id == Patient.id)
+        .join(ANC, RiskFlag.anc_id == ANC.id)
+    )
+    if rule in screening.RULES:
+        # Whole names only: 'hypertension' must not match 'severe_hypertension'.
+        builder = builder.filter((literal(',') + RiskFlag.reasons + literal(',')).contains(f',{rule},', autoescape=True))
+
+    pagination_collection = PaginationCollection(
+        builder, 1, keyset=(RiskFlag.visit_created.desc(), RiskFlag.anc_id.desc()), keyset_only=True,
+    )
+    return render_template('worklist/risk.html',
+                           rows=pagination_collection.items,
+                           pagination=pagination_collection.pagination,
+                           rules=screening.RULES,
+                           rule=rule,
+                           last_run=screening.last_run())
+
+
+@bp.route('/deliveries')
+@login_required
+def deliveries():
+    days = max(1, min(request.args.get('days', type=int, default=DELIVERY_DAYS), MAX_DELIVERY_DAYS))
+    today = datetime.date.today()
+
+    # One row per patient: her latest compulsory ANC record (kept on
+    # patient_summary), which carries the current due date and terminate flag.
+    builder = (
+        db.session.query(ANC, Patient)
+        .join(PatientSummary, and_(PatientSummary.patient_id == ANC.patient_id,
+                                   PatientSummary.latest_compulsory_anc_id == ANC.id))
+        .join(Patient, ANC.patient_id == Patient.id)
+        .filter(
+            ANC.terminate.isnot(True),
+            ANC.expected_delivery_date >= today,
+            ANC.expected_delivery_date <= today + datetime.timedelta(days=days),
+            PatientSummary.last_record_type == 'anc',
+        )
+    )
+    pagination_collection = PaginationCollection(
+        builder, 1, keyset=(ANC.expected_delivery_date, ANC.id), keyset_only=True,
+    )
+    return render_template('worklist/deliveries.html',
+                           rows=pagination_collection.items,
+                           pagination=pagination_collection.pagination,
+                           days=days,
+                           today=today)
+
+
+@bp.route('/overdue')
+@login_required
+def overdue():
+    weeks = max(1, min(request.args.get('weeks', type=int, default=OVERDUE_WEEKS), MAX_OVERDUE_WEEKS))
+    now = datetime.datetime.now()
+
+    builder = (
+        db.session.query(PatientSummary, Patient)
+        .join(Patient, PatientSummary.patient_id == Patient.id)
+        .filter(
+            PatientSummary.last_anc_visit < now - datetime.timedelta(weeks=weeks),
+            PatientSummary.last_anc_visit >= now - datetime.timedelta(weeks=MAX_PREGNANCY_WEEKS),
+            PatientSummary.last_record_type == 'anc',
+            PatientSummary.anc_terminated.is_(False),
+        )
+    )
+    pagination_collection = PaginationCollection(
+        builder, 1, keyset=(PatientSummary.last_anc_visit.desc(), PatientSummary.patient_id.desc()), keyset_only=True,
+    )
+    return render_template('worklist/overdue.html',
+                           rows=pagination_collection.items,
+                           pagination=pagination_collection.pagination,
+                           weeks=weeks,
+                           now=now)
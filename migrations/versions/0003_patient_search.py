@@ -0,0 +1,77 @@
+"""patient search indexes
+
+Adds the normalized phone column and the text index used by main.search:
+an FTS5 table on SQLite, pg_trgm/tsvector GIN indexes on Postgres. Other
+backends use the in-process index in flaskr/search.py. The phone
+normalization is copied here from flaskr/search.py, so this revision keeps
+doing the same thing whatever the app code becomes.
+
+Revision ID: 0003_patient_search
+Revises: 0002_clinical_indexes
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_patient_search'
+down_revision = '0002_clinical_indexes'
+branch_labels = None
+depends_on = None
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('855') and len(digits) > 9:
+        digits = digits[3:]
+    return digits.lstrip('0')
+
+
+def upgrade():
+    with op.batch_alter_table('patient', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_normalized', sa.String(length=32), nullable=True))
+        batch_op.create_index('ix_patient_phone_normalized', ['phone_normalized'], unique=False)
+
+    bind = op.get_bind()
+    patient = sa.table('patient', sa.column('id', sa.Integer), sa.column('phone', sa.String),
+                       sa.column('phone_normalized', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(patient.c.id, patient.c.phone)
+            .where(patient.c.id > last_id)
+            .order_by(patient.c.id)
+            .limit(1000)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            patient.update().where(patient.c.id == sa.bindparam('patient_id')),
+            [{"patient_id": row.id, "phone_normalized": normalize_phone(row.phone)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    if bind.dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE patient_search USING fts5(name, address, tokenize='trigram')")
+        op.execute("INSERT INTO patient_search (rowid, name, address) SELECT id, name, address FROM patient")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_patient_name_trgm ON patient USING gin (lower(name) gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_patient_address_tsv ON patient USING gin (to_tsvector('simple', address))")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE patient_search")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_patient_address_tsv")
+        op.execute("DROP INDEX ix_patient_name_trgm")
+
+    with op.batch_alter_table('patient', schema=None) as batch_op:
+        batch_op.drop_index('ix_patient_phone_normalized')
+        batch_op.drop_column('phone_normalized')
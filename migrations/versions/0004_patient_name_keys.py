@@ -0,0 +1,140 @@
+"""patient name keys
+
+Side table of normalized Khmer, romanized and phonetic keys per patient
+name, backfilled from the existing patients. The key functions are copied
+here from flaskr/names.py, so this revision keeps backfilling the same keys
+whatever the app code becomes.
+
+Revision ID: 0004_patient_name_keys
+Revises: 0003_patient_search
+Create Date: 2026-10-18 10:03:47.815530
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_patient_name_keys'
+down_revision = '0003_patient_search'
+branch_labels = None
+depends_on = None
+
+
+KHMER = re.compile('[\u1780-\u17ff]')
+ZERO_WIDTH = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff'))
+
+CONSONANTS = {
+    'ក': 'k', 'ខ': 'kh', 'គ': 'k', 'ឃ': 'kh', 'ង': 'ng',
+    'ច': 'ch', 'ឆ': 'chh', 'ជ': 'ch', 'ឈ': 'chh', 'ញ': 'nh',
+    'ដ': 'd', 'ឋ': 'th', 'ឌ': 'd', 'ឍ': 'th', 'ណ': 'n',
+    'ត': 't', 'ថ': 'th', 'ទ': 't', 'ធ': 'th', 'ន': 'n',
+    'ប': 'b', 'ផ': 'ph', 'ព': 'p', 'ភ': 'ph', 'ម': 'm',
+    'យ': 'y', 'រ': 'r', 'ល': 'l', 'វ': 'v', 'ឝ': 's', 'ឞ': 's',
+    'ស': 's', 'ហ': 'h', 'ឡ': 'l', 'អ': '',
+}
+
+VOWELS = {
+    'ឥ': 'e', 'ឦ': 'ei', 'ឧ': 'o', 'ឩ': 'ou', 'ឪ': 'au', 'ឫ': 'rue',
+    'ឬ': 'rueu', 'ឭ': 'lue', 'ឮ': 'lueu', 'ឯ': 'ae', 'ឰ': 'ai',
+    'ឱ': 'ao', 'ឲ': 'ao', 'ឳ': 'au',
+    'ា': 'a', 'ិ': 'e', 'ី': 'ei', 'ឹ': 'oe', 'ឺ': 'eu', 'ុ': 'o',
+    'ូ': 'ou', 'ួ': 'uo', 'ើ': 'aeu', 'ឿ': 'oea', 'ៀ': 'ie', 'េ': 'e',
+    'ែ': 'ae', 'ៃ': 'ai', 'ោ': 'ao', 'ៅ': 'au', 'ំ': 'm', 'ះ': 'h',
+}
+
+# Romanization variants that sound the same, applied in order.
+PHONETIC_RULES = (
+    ('chh', 'c'), ('ch', 'c'), ('j', 'c'), ('kh', 'k'), ('ph', 'p'),
+    ('th', 't'), ('nh', 'n'), ('ng', 'q'), ('w', 'v'),
+)
+
+
+def normalize_khmer(value):
+    return unicodedata.normalize('NFC', value).translate(ZERO_WIDTH).strip()
+
+
+def romanize(value):
+    value = normalize_khmer(value)
+    if KHMER.search(value):
+        value = ''.join(CONSONANTS.get(char, VOWELS.get(char, char if char.isascii() else '')) for char in value)
+    folded = unicodedata.normalize('NFKD', value)
+    return ''.join(char for char in folded if char.isascii() and (char.isalnum() or char == ' ')).lower()
+
+
+def phonetic(value):
+    value = re.sub('[^a-z]', '', romanize(value))
+    if not value:
+        return ''
+    for pattern, replacement in PHONETIC_RULES:
+        value = value.replace(pattern, replacement)
+    # A final r is silent in Khmer and often added or dropped in spelling.
+    if len(value) > 1:
+        value = value.rstrip('r') or value
+    head = 'a' if value[0] in 'aeiouy' else value[0]
+    skeleton = head + re.sub('[aeiouyh]', '', value[1:])
+    return re.sub(r'(.)\1+', r'\1', skeleton)
+
+
+def words(value):
+    return [word for word in normalize_khmer(value or '').split() if word]
+
+
+def name_keys(value):
+    keys = set()
+    for word in words(value):
+        if KHMER.search(word):
+            keys.add(('khmer', word))
+        latin = romanize(word).replace(' ', '')
+        if latin:
+            keys.add(('latin', latin))
+        key = phonetic(word)
+        if key:
+            keys.add(('phonetic', key))
+    whole = phonetic(''.join(words(value)))
+    if whole:
+        keys.add(('phonetic', whole))
+    return {(kind, key[:64]) for kind, key in keys}
+
+
+def upgrade():
+    name_key = op.create_table('patient_name_key',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id', 'kind', 'key')
+    )
+    with op.batch_alter_table('patient_name_key', schema=None) as batch_op:
+        batch_op.create_index('ix_patient_name_key_lookup', ['key', 'kind', 'patient_id'], unique=False)
+
+    bind = op.get_bind()
+    patient = sa.table('patient', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(patient.c.id, patient.c.name)
+            .where(patient.c.id > last_id)
+            .order_by(patient.c.id)
+            .limit(1000)
+        ).all()
+        if not rows:
+            break
+        keys = [
+            {"patient_id": row.id, "kind": kind, "key": key}
+            for row in rows
+            for kind, key in name_keys(row.name)
+        ]
+        if keys:
+            bind.execute(name_key.insert(), keys)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('patient_name_key', schema=None) as batch_op:
+        batch_op.drop_index('ix_patient_name_key_lookup')
+
+    op.drop_table('patient_name_key')
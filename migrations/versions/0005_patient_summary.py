@@ -0,0 +1,67 @@
+"""patient summary counters
+
+Per-patient ANC/LDR/PNC counts and last visit, backfilled from the
+existing records. 'flask rebuild-summaries --verify' checks them.
+
+Revision ID: 0005_patient_summary
+Revises: 0004_patient_name_keys
+Create Date: 2026-10-18 11:26:09.337481
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_patient_summary'
+down_revision = '0004_patient_name_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    summary = op.create_table('patient_summary',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('anc_count', sa.Integer(), nullable=False),
+    sa.Column('ldr_count', sa.Integer(), nullable=False),
+    sa.Column('pnc_count', sa.Integer(), nullable=False),
+    sa.Column('last_visit', sa.DateTime(), nullable=True),
+    sa.Column('last_record_type', sa.String(length=8), nullable=True),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id')
+    )
+
+    bind = op.get_bind()
+    patient = sa.table('patient', sa.column('id', sa.Integer))
+    records = {
+        kind: sa.table(kind, sa.column('patient_id', sa.Integer), sa.column('created', sa.DateTime))
+        for kind in ('anc', 'ldr', 'pnc')
+    }
+    last_id = 0
+    while True:
+        patient_ids = bind.execute(
+            sa.select(patient.c.id).where(patient.c.id > last_id).order_by(patient.c.id).limit(1000)
+        ).scalars().all()
+        if not patient_ids:
+            break
+        rows = {patient_id: {"patient_id": patient_id, "anc_count": 0, "ldr_count": 0, "pnc_count": 0,
+                             "last_visit": None, "last_record_type": None}
+                for patient_id in patient_ids}
+        for kind, table in records.items():
+            counts = bind.execute(
+                sa.select(table.c.patient_id, sa.func.count(), sa.func.max(table.c.created))
+                .where(table.c.patient_id.in_(patient_ids))
+                .group_by(table.c.patient_id)
+            )
+            for patient_id, count, created in counts:
+                row = rows[patient_id]
+                row[f'{kind}_count'] = count
+                if created is not None and (row['last_visit'] is None or created > row['last_visit']):
+                    row['last_visit'] = created
+                    row['last_record_type'] = kind
+        bind.execute(summary.insert(), list(rows.values()))
+        last_id = patient_ids[-1]
+
+
+def downgrade():
+    op.drop_table('patient_summary')
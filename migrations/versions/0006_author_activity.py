@@ -0,0 +1,57 @@
+"""author activity rollup
+
+Records created per author, record type and day, backfilled from the
+existing records.
+
+Revision ID: 0006_author_activity
+Revises: 0005_patient_summary
+Create Date: 2026-10-18 12:40:52.190664
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_author_activity'
+down_revision = '0005_patient_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    activity = op.create_table('author_activity',
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=8), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('author_id', 'kind', 'day')
+    )
+    with op.batch_alter_table('author_activity', schema=None) as batch_op:
+        batch_op.create_index('ix_author_activity_day', ['day', 'author_id'], unique=False)
+
+    bind = op.get_bind()
+    for kind in ('anc', 'ldr', 'pnc'):
+        table = sa.table(kind, sa.column('author_id', sa.Integer), sa.column('created', sa.DateTime))
+        day = sa.func.date(table.c.created)
+        rows = [
+            {"author_id": author_id,
+             "kind": kind,
+             "day": datetime.date.fromisoformat(value[:10]) if isinstance(value, str) else value,
+             "count": count}
+            for author_id, value, count in bind.execute(
+                sa.select(table.c.author_id, day, sa.func.count()).group_by(table.c.author_id, day)
+            )
+        ]
+        if rows:
+            bind.execute(activity.insert(), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('author_activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_author_activity_day')
+
+    op.drop_table('author_activity')
@@ -0,0 +1,68 @@
+"""change tracking for sync
+
+updated_at on patient, anc, ldr and pnc (backfilled from created, or the
+migration time for patients), and a tombstone table for deletes.
+
+Revision ID: 0007_change_tracking
+Revises: 0006_author_activity
+Create Date: 2026-10-18 13:52:10.418237
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_change_tracking'
+down_revision = '0006_author_activity'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('patient', 'anc', 'ldr', 'pnc')
+
+
+def upgrade():
+    bind = op.get_bind()
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+        table = sa.table(name, sa.column('id', sa.Integer), sa.column('created', sa.DateTime),
+                         sa.column('updated_at', sa.DateTime))
+        value = sa.func.current_timestamp() if name == 'patient' else table.c.created
+        last_id = 0
+        max_id = bind.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0
+        while last_id < max_id:
+            bind.execute(
+                table.update()
+                .where(table.c.id > last_id, table.c.id <= last_id + 5000)
+                .values(updated_at=value)
+            )
+            last_id += 5000
+
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+            batch_op.create_index(f'ix_{name}_updated', ['updated_at', 'id'], unique=False)
+
+    op.create_table('tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('record_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_tombstone_deleted', ['deleted_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_tombstone_deleted')
+
+    op.drop_table('tombstone')
+
+    for name in reversed(TABLES):
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{name}_updated')
+            batch_op.drop_column('updated_at')
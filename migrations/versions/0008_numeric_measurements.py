@@ -0,0 +1,169 @@
+"""numeric measurements
+
+Typed copies of the text measurements on anc, ldr and pnc: systolic and
+diastolic blood pressure, heart rate and blood loss as integers, weights and
+lengths as decimals. Existing rows are backfilled in chunks of ids; values
+that cannot be parsed, or carry another unit than the column's, are logged
+and left NULL. 'flask backfill-measurements' runs the same backfill again,
+resumably, e.g. for rows written by an older release during the deploy.
+
+The parsing is copied here rather than imported from flaskr.measurements, so
+this revision keeps doing the same thing whatever the app code becomes.
+
+Revision ID: 0008_numeric_measurements
+Revises: 0007_change_tracking
+Create Date: 2026-10-18 16:05:41.902114
+
+"""
+import decimal
+import logging
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_numeric_measurements'
+down_revision = '0007_change_tracking'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+COLUMNS = {
+    'anc': [
+        ('height_cm', sa.Numeric(precision=6, scale=2)),
+        ('weight_kg', sa.Numeric(precision=6, scale=2)),
+        ('bp_systolic', sa.Integer()),
+        ('bp_diastolic', sa.Integer()),
+        ('fetal_heartbeat_bpm', sa.Integer()),
+        ('symphysiofundal_height_cm', sa.Numeric(precision=6, scale=2)),
+    ],
+    'ldr': [
+        ('placenta_weight_g', sa.Numeric(precision=6, scale=2)),
+        ('blood_loss_ml', sa.Integer()),
+        ('weight_g', sa.Numeric(precision=6, scale=2)),
+        ('length_cm', sa.Numeric(precision=6, scale=2)),
+        ('head_circumference_cm', sa.Numeric(precision=6, scale=2)),
+    ],
+    'pnc': [
+        ('mother_height_cm', sa.Numeric(precision=6, scale=2)),
+        ('mother_weight_kg', sa.Numeric(precision=6, scale=2)),
+        ('baby_weight_kg', sa.Numeric(precision=6, scale=2)),
+    ],
+}
+# Text field -> (typed column(s), kind of value, unit), per table.
+FIELDS = {
+    'anc': {
+        'height': ('height_cm', 'decimal', 'cm'),
+        'weight': ('weight_kg', 'decimal', 'kg'),
+        'blood_pressure': (('bp_systolic', 'bp_diastolic'), 'blood_pressure', 'mmhg'),
+        'fetal_heartbeat': ('fetal_heartbeat_bpm', 'int', 'bpm'),
+        'symphysiofundal_height': ('symphysiofundal_height_cm', 'decimal', 'cm'),
+    },
+    'ldr': {
+        'placenta_weight': ('placenta_weight_g', 'decimal', 'g'),
+        'blood_loss': ('blood_loss_ml', 'int', 'ml'),
+        'weight': ('weight_g', 'decimal', 'g'),
+        'length': ('length_cm', 'decimal', 'cm'),
+        'head_circumference': ('head_circumference_cm', 'decimal', 'cm'),
+    },
+    'pnc': {
+        'mother_height': ('mother_height_cm', 'decimal', 'cm'),
+        'mother_weight': ('mother_weight_kg', 'decimal', 'kg'),
+        'baby_weight': ('baby_weight_kg', 'decimal', 'kg'),
+    },
+}
+INDEXES = {
+    'anc': [('ix_anc_bp_systolic', ['bp_systolic'])],
+    'ldr': [('ix_ldr_blood_loss_ml', ['blood_loss_ml']), ('ix_ldr_weight_g', ['weight_g'])],
+    'pnc': [],
+}
+
+KHMER_DIGITS = str.maketrans('០១២៣៤៥៦៧៨៩', '0123456789')
+NUMBER = re.compile(r'\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]*)\s*')
+BLOOD_PRESSURE = re.compile(r'\s*(\d{2,3})\s*[/\\-]\s*(\d{2,3})\s*([a-zA-Z]*)\s*')
+MAX_DECIMAL = decimal.Decimal('9999.99')
+
+
+def parse(value, kind, unit):
+    """The typed value(s) of a text measurement; None for each column when
+    it cannot be read."""
+    text = str(value or '').translate(KHMER_DIGITS)
+    if kind == 'blood_pressure':
+        match = BLOOD_PRESSURE.fullmatch(text)
+        if match is None or match.group(3).lower() not in ('', unit):
+            return None, None
+        return int(match.group(1)), int(match.group(2))
+    match = NUMBER.fullmatch(text)
+    if match is None or match.group(2).lower() not in ('', unit):
+        return None
+    number = decimal.Decimal(match.group(1).replace(',', '.')).quantize(decimal.Decimal('0.01'))
+    if number > MAX_DECIMAL:
+        return None
+    return int(number.to_integral_value(decimal.ROUND_HALF_UP)) if kind == 'int' else number
+
+
+def backfill_chunk(connection, name, after_id, chunk_size):
+    """Fill the typed columns of the chunk of rows after after_id; returns
+    the last id (None when done) and the (id, field, value) left unread."""
+    fields = FIELDS[name]
+    table = sa.table(name, sa.column('id', sa.Integer), *[sa.column(field, sa.String) for field in fields],
+                     *[sa.column(column, column_type) for column, column_type in COLUMNS[name]])
+    rows = connection.execute(
+        sa.select(table.c.id, *[table.c[field] for field in fields])
+        .where(table.c.id > after_id)
+        .order_by(table.c.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None, []
+
+    updates, problems = [], []
+    for row in rows:
+        update = {'record_id': row.id}
+        for field, value in zip(fields, row[1:]):
+            columns, kind, unit = fields[field]
+            parsed = parse(value, kind, unit)
+            if isinstance(columns, tuple):
+                update.update(zip(columns, parsed))
+                parsed = parsed[0]
+            else:
+                update[columns] = parsed
+            if parsed is None and str(value or '').strip():
+                problems.append((row.id, field, value))
+        updates.append(update)
+    connection.execute(table.update().where(table.c.id == sa.bindparam('record_id')), updates)
+    return rows[-1].id, problems
+
+
+def upgrade():
+    bind = op.get_bind()
+    for name, columns in COLUMNS.items():
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            for column, column_type in columns:
+                batch_op.add_column(sa.Column(column, column_type, nullable=True))
+
+        last_id, problems = 0, 0
+        while True:
+            last_id, unreadable = backfill_chunk(bind, name, last_id, 5000)
+            if last_id is None:
+                break
+            for record_id, field, value in unreadable:
+                log.warning('%s %s: cannot read %s %r', name, record_id, field, value)
+            problems += len(unreadable)
+        log.info('%s: %d unreadable measurements left empty', name, problems)
+
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            for index, index_columns in INDEXES[name]:
+                batch_op.create_index(index, index_columns, unique=False)
+
+
+def downgrade():
+    for name in reversed(list(COLUMNS)):
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            for index, _ in INDEXES[name]:
+                batch_op.drop_index(index)
+            for column, _ in reversed(COLUMNS[name]):
+                batch_op.drop_column(column)
@@ -0,0 +1,61 @@
+"""monthly reports
+
+Rollup tables for the monthly facility report, and indexes on the dates
+the months are cut by. Run 'flask refresh-reports --all' once afterwards.
+
+Revision ID: 0009_monthly_reports
+Revises: 0008_numeric_measurements
+Create Date: 2026-10-18 17:21:06.551830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_monthly_reports'
+down_revision = '0008_numeric_measurements'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_month',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('dirty', sa.Boolean(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('month')
+    )
+    op.create_table('monthly_indicator',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('indicator', sa.String(length=32), nullable=False),
+    sa.Column('numerator', sa.Integer(), nullable=False),
+    sa.Column('denominator', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('month', 'indicator')
+    )
+    op.create_table('monthly_histogram',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('measure', sa.String(length=32), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('month', 'measure', 'bucket')
+    )
+    with op.batch_alter_table('anc', schema=None) as batch_op:
+        batch_op.create_index('ix_anc_created', ['created'], unique=False)
+
+    with op.batch_alter_table('ldr', schema=None) as batch_op:
+        batch_op.create_index('ix_ldr_delivery_date', ['delivery_date'], unique=False)
+        batch_op.create_index('ix_ldr_created', ['created'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ldr', schema=None) as batch_op:
+        batch_op.drop_index('ix_ldr_created')
+        batch_op.drop_index('ix_ldr_delivery_date')
+
+    with op.batch_alter_table('anc', schema=None) as batch_op:
+        batch_op.drop_index('ix_anc_created')
+
+    op.drop_table('monthly_histogram')
+    op.drop_table('monthly_indicator')
+    op.drop_table('report_month')
@@ -0,0 +1,54 @@
+"""risk screening
+
+The risk_flag worklist filled by 'flask screen-anc', and the screening_run
+history it resumes from.
+
+Revision ID: 0010_risk_screening
+Revises: 0009_monthly_reports
+Create Date: 2026-10-18 18:02:44.170395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_risk_screening'
+down_revision = '0009_monthly_reports'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('risk_flag',
+    sa.Column('anc_id', sa.Integer(), nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('visit_created', sa.DateTime(), nullable=False),
+    sa.Column('reasons', sa.String(length=128), nullable=False),
+    sa.Column('flagged_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['anc_id'], ['anc.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['patient_id'], ['patient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('anc_id')
+    )
+    with op.batch_alter_table('risk_flag', schema=None) as batch_op:
+        batch_op.create_index('ix_risk_flag_visit', ['visit_created', 'anc_id'], unique=False)
+        batch_op.create_index('ix_risk_flag_patient', ['patient_id'], unique=False)
+
+    op.create_table('screening_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('last_anc_id', sa.Integer(), nullable=False),
+    sa.Column('screened', sa.Integer(), nullable=False),
+    sa.Column('flagged', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('screening_run')
+    with op.batch_alter_table('risk_flag', schema=None) as batch_op:
+        batch_op.drop_index('ix_risk_flag_patient')
+        batch_op.drop_index('ix_risk_flag_visit')
+
+    op.drop_table('risk_flag')
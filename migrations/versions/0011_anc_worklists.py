@@ -0,0 +1,71 @@
+"""anc worklists
+
+Last ANC visit and terminated flag on patient_summary for the overdue ANC
+worklist, and an index on the expected delivery date.
+
+Revision ID: 0011_anc_worklists
+Revises: 0010_risk_screening
+Create Date: 2026-10-18 18:47:30.286114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_anc_worklists'
+down_revision = '0010_risk_screening'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('patient_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_anc_visit', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('anc_terminated', sa.Boolean(), nullable=True))
+
+    bind = op.get_bind()
+    summary = sa.table('patient_summary', sa.column('patient_id', sa.Integer),
+                       sa.column('last_anc_visit', sa.DateTime), sa.column('anc_terminated', sa.Boolean))
+    anc = sa.table('anc', sa.column('id', sa.Integer), sa.column('patient_id', sa.Integer),
+                   sa.column('created', sa.DateTime), sa.column('compulsory', sa.Boolean),
+                   sa.column('terminate', sa.Boolean))
+    last_anc_visit = (
+        sa.select(sa.func.max(anc.c.created))
+        .where(anc.c.patient_id == summary.c.patient_id)
+        .scalar_subquery()
+    )
+    terminate = (
+        sa.select(anc.c.terminate)
+        .where(anc.c.patient_id == summary.c.patient_id, anc.c.compulsory == sa.true())
+        .order_by(anc.c.created.desc(), anc.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    last_id = 0
+    max_id = bind.execute(sa.select(sa.func.max(summary.c.patient_id))).scalar() or 0
+    while last_id < max_id:
+        bind.execute(
+            summary.update()
+            .where(summary.c.patient_id > last_id, summary.c.patient_id <= last_id + 5000)
+            .values(last_anc_visit=last_anc_visit,
+                    anc_terminated=sa.func.coalesce(terminate, sa.false()))
+        )
+        last_id += 5000
+
+    with op.batch_alter_table('patient_summary', schema=None) as batch_op:
+        batch_op.alter_column('anc_terminated', existing_type=sa.Boolean(), nullable=False)
+        batch_op.create_index('ix_patient_summary_last_anc', ['last_anc_visit', 'patient_id'], unique=False)
+
+    with op.batch_alter_table('anc', schema=None) as batch_op:
+        batch_op.create_index('ix_anc_expected_delivery', ['expected_delivery_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('anc', schema=None) as batch_op:
+        batch_op.drop_index('ix_anc_expected_delivery')
+
+    with op.batch_alter_table('patient_summary', schema=None) as batch_op:
+        batch_op.drop_index('ix_patient_summary_last_anc')
+        batch_op.drop_column('anc_terminated')
+        batch_op.drop_column('last_anc_visit')
@@ -0,0 +1,29 @@
+"""identity version
+
+A version on user that editing a user bumps, so cached logins in other
+workers and hosts are re-read (see flaskr/identity.py).
+
+Revision ID: 0012_identity_version
+Revises: 0011_anc_worklists
+Create Date: 2026-10-19 09:12:04.517230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_identity_version'
+down_revision = '0011_anc_worklists'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('identity_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('identity_version')
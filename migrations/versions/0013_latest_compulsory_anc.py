@@ -0,0 +1,51 @@
+"""latest compulsory anc
+
+The id of each patient's latest compulsory ANC record on patient_summary, so
+the expected delivery worklist joins it instead of looking it up per row.
+
+Revision ID: 0013_latest_compulsory_anc
+Revises: 0012_identity_version
+Create Date: 2026-10-19 11:02:48.613905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013_latest_compulsory_anc'
+down_revision = '0012_identity_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('patient_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latest_compulsory_anc_id', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    summary = sa.table('patient_summary', sa.column('patient_id', sa.Integer),
+                       sa.column('latest_compulsory_anc_id', sa.Integer))
+    anc = sa.table('anc', sa.column('id', sa.Integer), sa.column('patient_id', sa.Integer),
+                   sa.column('created', sa.DateTime), sa.column('compulsory', sa.Boolean))
+    latest_compulsory = (
+        sa.select(anc.c.id)
+        .where(anc.c.patient_id == summary.c.patient_id, anc.c.compulsory == sa.true())
+        .order_by(anc.c.created.desc(), anc.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    last_id = 0
+    max_id = bind.execute(sa.select(sa.func.max(summary.c.patient_id))).scalar() or 0
+    while last_id < max_id:
+        bind.execute(
+            summary.update()
+            .where(summary.c.patient_id > last_id, summary.c.patient_id <= last_id + 5000)
+            .values(latest_compulsory_anc_id=latest_compulsory)
+        )
+        last_id += 5000
+
+
+def downgrade():
+    with op.batch_alter_table('patient_summary', schema=None) as batch_op:
+        batch_op.drop_column('latest_compulsory_anc_id')
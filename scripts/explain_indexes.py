@@ -0,0 +1,135 @@
+"""Print EXPLAIN plans for each route's queries before and after the
+clinical record indexes (migration 0002_clinical_indexes).
+
+    python scripts/explain_indexes.py
+    python scripts/explain_indexes.py --database-uri mysql+pymysql://root:@localhost/iex_explain
+
+The database must be empty: the script creates the tables, seeds synthetic
+data, drops the indexes for the "before" plans and recreates them.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--database-uri', default=None)
+parser.add_argument('--patients', type=int, default=2000)
+parser.add_argument('--visits', type=int, default=6, help='ANC/LDR/PNC records per patient and type')
+parser.add_argument('--authors', type=int, default=10)
+args = parser.parse_args()
+
+database_uri = args.database_uri or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain.sqlite')
+os.environ['SQLALCHEMY_DATABASE_URI'] = database_uri
+os.environ.setdefault('SECRET_KEY', 'explain')
+os.environ.setdefault('PER_PAGE', '12')
+
+from sqlalchemy import func, insert, text  # noqa: E402
+
+from flaskr import create_app  # noqa: E402
+from flaskr.models import db, User, Patient, ANC, LDR, PNC  # noqa: E402
+
+PATIENT_ID = 1
+AUTHOR_ID = 1
+
+
+def seed():
+    rng = random.Random(0)
+    start = datetime.datetime(2020, 1, 1)
+    db.session.execute(insert(User), [
+        {"username": f"midwife{i}", "password": "-", "is_admin": False}
+        for i in range(args.authors)
+    ])
+    db.session.execute(insert(Patient), [
+        {"name": f"Patient {rng.randrange(10 ** 6):06d}", "sex": "female",
+         "date_of_birth": datetime.date(1990, 1, 1), "phone": f"0{rng.randrange(10 ** 8):08d}",
+         "address": f"Village {rng.randrange(500)}"}
+        for _ in range(args.patients)
+    ])
+    for model, extra in ((ANC, {"compulsory": False}), (LDR, {}), (PNC, {"transferred_from": "-"})):
+        db.session.execute(insert(model), [
+            {"patient_id": patient_id, "author_id": rng.randrange(args.authors) + 1,
+             "created": start + datetime.timedelta(minutes=rng.randrange(10 ** 6)), **extra}
+            for patient_id in range(1, args.patients + 1)
+            for _ in range(args.visits)
+        ])
+    db.session.commit()
+
+
+def route_queries():
+    per_page = int(os.environ['PER_PAGE'])
+    yield 'main.index', Patient.query.order_by(Patient.name, Patient.id).limit(per_page)
+    yield 'main.search', Patient.query.filter_by(name='Patient 000042').order_by(Patient.name)
+    for model in (ANC, LDR, PNC):
+        name = model.__tablename__
+        yield f'patient.view_patient ({name} count)', db.session.query(func.count()).select_from(model).filter(model.patient_id == PATIENT_ID)
+        yield f'patient.view_patient_{name}', (
+            db.session.query(model, User)
+            .filter(model.patient_id == PATIENT_ID)
+            .join(User, model.author_id == User.id)
+            .order_by(model.created.desc(), model.id.desc())
+            .limit(per_page)
+        )
+        yield f'user.profile ({name} count)', db.session.query(func.count()).select_from(model).filter(model.author_id == AUTHOR_ID)
+        yield f'user.recent_diagnosis ({name})', (
+            db.session.query(model, Patient)
+            .filter(model.author_id == AUTHOR_ID)
+            .join(Patient, model.patient_id == Patient.id)
+            .order_by(model.created.desc(), model.id.desc())
+            .limit(per_page)
+        )
+    yield 'patient.view_patient_anc (current_info)', (
+        ANC.query.filter_by(patient_id=PATIENT_ID, compulsory=True).order_by(ANC.created.desc()).limit(1)
+    )
+
+
+def explain(query):
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + sql)).fetchall()
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' | '.join(str(value) for value in row) for row in rows]
+
+
+def print_plans(title):
+    print(f'==== {title} ====')
+    for route, query in route_queries():
+        print(f'-- {route}')
+        for line in explain(query):
+            print(f'   {line}')
+    print()
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Patient).count():
+            sys.exit('Refusing to run against a database that already has patients.')
+
+        indexes = [index for model in (Patient, ANC, LDR, PNC) for index in model.__table__.indexes]
+        for index in indexes:
+            index.drop(db.engine)
+
+        seed()
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('ANALYZE'))
+        print(f'Seeded {args.patients} patients with {args.visits} ANC/LDR/PNC records each ({database_uri})\n')
+        print_plans('before')
+
+        for index in indexes:
+            index.create(db.engine)
+        if db.engine.dialect.name in ('sqlite', 'postgresql'):
+            db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        print_plans('after')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import pytest
+
+from flaskr import create_app, identity
+from flaskr.models import db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("SECRET_KEY", "test")
+    monkeypatch.setenv("PER_PAGE", "10")
+    monkeypatch.setenv("JINJA_BYTECODE_CACHE", "0")
+    # Logins cached by earlier tests' databases.
+    identity._cache.clear()
+    identity._versions.clear()
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        # The primary only; replica binds from test_routing stay registered on db.
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
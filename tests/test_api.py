@@ -0,0 +1,45 @@
+import datetime
+
+import pytest
+
+from flaskr.models import ANC, Patient, User, db
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        user = User(username='midwife', password='-', is_admin=False)
+        db.session.add(user)
+        db.session.add(Patient(name='Sok', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address=''))
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+@pytest.mark.parametrize('fields', [['name'], 'name', {'patients': 'name'}, {'patients': [1]}])
+def test_batch_rejects_malformed_fields(client, fields):
+    response = client.post('/api/batch', json={'patients': [1], 'fields': fields})
+    assert response.status_code == 400
+
+
+def test_batch_selects_fields(client):
+    response = client.post('/api/batch', json={'patients': [1], 'fields': {'patients': ['name']}})
+    assert response.status_code == 200
+    assert response.get_json()['patients'] == [{'id': 1, 'name': 'Sok'}]
+
+
+def test_anonymous_requests_get_a_json_401(app):
+    response = app.test_client().get('/api/patients/1')
+    assert response.status_code == 401
+    assert 'error' in response.get_json()
+
+
+def test_chart_limit_is_clamped(client, app):
+    with app.app_context():
+        db.session.add_all([ANC(patient_id=1, author_id=1, compulsory=False) for _ in range(3)])
+        db.session.commit()
+    assert len(client.get('/api/patients/1/chart?limit=-1').get_json()['anc']) == 1
+    assert len(client.get('/api/patients/1/chart?limit=2').get_json()['anc']) == 2
@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+from flask import url_for
+
+
+@pytest.fixture
+def static_app(app, tmp_path):
+    app.static_folder = str(tmp_path)
+    (tmp_path / 'style.css').write_text('body { color: black; }\n' * 100)
+    return app
+
+
+def test_hashed_url_is_served_for_a_year(static_app):
+    with static_app.test_request_context():
+        url = url_for('static', filename='style.css')
+    assert url != '/static/style.css' and url.endswith('.css')
+
+    response = static_app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_precompressed_variants(static_app, tmp_path):
+    assert static_app.test_cli_runner().invoke(args=['compress-assets']).exit_code == 0
+    # Served as-is; the test only needs the file to exist.
+    (tmp_path / 'style.css.br').write_bytes(b'brotli bytes')
+    with static_app.test_request_context():
+        url = url_for('static', filename='style.css')
+    client = static_app.test_client()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.data) == (tmp_path / 'style.css').read_bytes()
+
+    response = client.get(url, headers={'Accept-Encoding': 'br, gzip'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.data == b'brotli bytes'
+
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == (tmp_path / 'style.css').read_bytes()
@@ -0,0 +1,38 @@
+import click
+import pytest
+
+from flaskr import benchmark, seed
+from flaskr.models import User
+
+
+def test_benchmark_on_seeded_database(app):
+    with app.app_context():
+        seed.seed(12, authors=3, chunk_size=5)
+        results = benchmark.run(repeat=1, warmup=0)
+
+    measured = {endpoint: result for endpoint, result in results.items() if 'status' in result}
+    assert {'main.index', 'patient.view_patient_anc', 'diagnosis.view_anc', 'user.index'} <= set(measured)
+    assert {endpoint: result['status'] for endpoint, result in measured.items() if result['status'] != 200} == {}
+    for endpoint in ('main.index', 'patient.view_patient', 'patient.view_patient_anc', 'diagnosis.view_anc',
+                     'diagnosis.view_ldr', 'user.index'):
+        assert measured[endpoint]['queries'] > 0, endpoint
+
+
+def test_benchmark_without_users_fails(app):
+    with app.app_context(), pytest.raises(click.ClickException):
+        benchmark.run(repeat=1, warmup=0)
+
+
+def test_seed_adds_an_admin(app):
+    with app.app_context():
+        seed.seed(2, authors=2)
+        assert User.query.filter_by(username='seed-admin').one().is_admin
+
+
+def test_compare_flags_slower_routes_and_more_queries():
+    baseline = {'main.index': {'p95_ms': 10.0, 'queries': 2}, 'main.search': {'p95_ms': 10.0, 'queries': 2}}
+    results = {'main.index': {'p95_ms': 20.0, 'queries': 2}, 'main.search': {'p95_ms': 11.0, 'queries': 3}}
+    regressions = benchmark.compare(results, baseline, threshold=1.5, slack=0)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('main.index: p95')
+    assert regressions[1].startswith('main.search: 3 queries')
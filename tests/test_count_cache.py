@@ -0,0 +1,26 @@
+import datetime
+
+from flaskr import count_cache
+from flaskr.models import ANC, Patient, User, db
+
+
+def test_cached_count_until_invalidated(app, monkeypatch):
+    monkeypatch.setattr(count_cache, '_entries', {})
+    with app.app_context():
+        db.session.add(User(username='midwife', password='-', is_admin=False))
+        db.session.add(Patient(name='Sok', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address=''))
+        db.session.add(ANC(patient_id=1, author_id=1, compulsory=False))
+        db.session.commit()
+        assert count_cache.count(ANC.query.filter(ANC.patient_id == 1)) == 1
+
+        db.session.add(ANC(patient_id=1, author_id=1, compulsory=False))
+        db.session.commit()
+        # Served from the cache; a change to another table leaves it alone.
+        assert count_cache.count(ANC.query.filter(ANC.patient_id == 1)) == 1
+        count_cache.invalidate(Patient)
+        assert count_cache.count(ANC.query.filter(ANC.patient_id == 1)) == 1
+
+        count_cache.invalidate(ANC)
+        assert count_cache.count(ANC.query.filter(ANC.patient_id == 1)) == 2
+        # Other parameters are a separate entry.
+        assert count_cache.count(ANC.query.filter(ANC.patient_id == 2)) == 0
@@ -0,0 +1,39 @@
+import datetime
+
+from flaskr import export
+from flaskr.models import Patient, User, db
+
+
+def _patients(app):
+    with app.app_context():
+        db.session.add_all([
+            Patient(name='Dara', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='Takeo clinic'),
+            Patient(name='Vanna', sex='female', date_of_birth=datetime.date(1991, 1, 1), phone='',
+                    address='Kampot 100% health centre'),
+        ])
+        db.session.commit()
+
+
+def _names(app, facility):
+    with app.app_context():
+        return [row.name for row in db.session.execute(export.build_query('patients', facility=facility))]
+
+
+def test_facility_wildcards_are_literal(app):
+    _patients(app)
+    assert _names(app, '%') == ['Vanna']
+    assert _names(app, '_') == []
+    assert _names(app, 'takeo') == ['Dara']
+
+
+def test_export_requires_admin(app):
+    with app.app_context():
+        user = User(username='midwife', password='-', is_admin=None)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    assert client.get('/export/').status_code == 403
+    assert client.get('/export/download?kind=patients').status_code == 403
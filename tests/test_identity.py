@@ -0,0 +1,66 @@
+from flaskr import identity
+from flaskr.models import User, db
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def _login(app, **fields):
+    with app.app_context():
+        user = User(username='admin', password='-', **fields)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client, user_id
+
+
+def test_change_outside_user_edit_is_seen_after_the_ttl(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(identity, 'time', clock)
+    monkeypatch.setenv('IDENTITY_CACHE_TTL', '60')
+    client, user_id = _login(app, is_admin=True)
+    assert client.get('/user/activity').status_code == 200
+
+    with app.app_context():
+        # e.g. demoted with SQL or from another host
+        db.session.execute(db.update(User).where(User.id == user_id).values(is_admin=False))
+        db.session.commit()
+    identity._cache.clear()  # a different worker
+    clock.now += 30
+    assert client.get('/user/activity').status_code == 200
+    clock.now += 31
+    assert client.get('/user/activity').status_code == 403
+
+
+def test_deleted_user_is_logged_out_after_the_ttl(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(identity, 'time', clock)
+    client, user_id = _login(app, is_admin=True)
+    assert client.get('/user/activity').status_code == 200
+
+    with app.app_context():
+        db.session.execute(db.delete(User).where(User.id == user_id))
+        db.session.commit()
+    identity._cache.clear()
+    clock.now += 61
+    assert client.get('/user/activity').status_code == 302
+
+
+def test_user_edit_is_seen_at_once(app, monkeypatch):
+    monkeypatch.setattr(identity, 'time', Clock())
+    client, user_id = _login(app, is_admin=True)
+    assert client.get('/user/activity').status_code == 200
+
+    response = client.post(f'/user/{user_id}', data={'username': 'admin'})
+    assert response.status_code == 302
+    assert client.get('/user/activity').status_code == 403
+    with app.app_context():
+        assert db.session.get(User, user_id).identity_version == 1
@@ -0,0 +1,17 @@
+from flaskr.instrumentation import parameter_shape, statement_shape
+
+
+def test_statement_shape_collapses_whitespace_and_in_lists():
+    one = statement_shape('SELECT *\n  FROM anc\n WHERE anc.id IN (?, ?, ?)')
+    assert one == 'SELECT * FROM anc WHERE anc.id IN (...)'
+    assert statement_shape('SELECT * FROM anc WHERE anc.id IN (?)') == 'SELECT * FROM anc WHERE anc.id IN (?)'
+    assert statement_shape('SELECT * FROM anc WHERE anc.id IN (%(id_1)s, %(id_2)s)') == (
+        'SELECT * FROM anc WHERE anc.id IN (...)')
+    assert statement_shape('SELECT * FROM anc WHERE anc.id IN (:a,:b)') == 'SELECT * FROM anc WHERE anc.id IN (...)'
+
+
+def test_parameter_shape_lists_types_not_values():
+    assert parameter_shape((1, 'Sok')) == '(int, str)'
+    assert parameter_shape({'name': 'Sok'}) == '{name: str}'
+    assert parameter_shape([(1,), (2,)], executemany=True) == '2 x (int)'
+    assert parameter_shape(None) == '()'
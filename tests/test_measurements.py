@@ -0,0 +1,63 @@
+import decimal
+import importlib.util
+import os
+
+import pytest
+
+from flaskr import measurements
+
+
+@pytest.mark.parametrize('value, unit, expected', [
+    ('55.5', 'kg', decimal.Decimal('55.50')),
+    ('55,5 kg', 'kg', decimal.Decimal('55.50')),
+    (' 60KG ', 'kg', decimal.Decimal('60.00')),
+    ('៥៥', 'kg', decimal.Decimal('55.00')),
+    ('120 lb', 'kg', None),
+    ('62 in', 'cm', None),
+    ('abc', 'kg', None),
+    ('', 'kg', None),
+    (None, 'kg', None),
+    ('120/80', 'kg', None),
+    ('10000', 'g', None),
+])
+def test_parse_decimal(value, unit, expected):
+    assert measurements.parse_decimal(value, unit) == expected
+
+
+def test_parse_int_rounds_half_up():
+    assert measurements.parse_int('140.5', 'bpm') == 141
+    assert measurements.parse_int('350 ml', 'ml') == 350
+    assert measurements.parse_int('350 oz', 'ml') is None
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('120/80', (120, 80)),
+    ('120 / 80 mmHg', (120, 80)),
+    ('១២០-៨០', (120, 80)),
+    ('120/80 lb', (None, None)),
+    ('high', (None, None)),
+    (None, (None, None)),
+])
+def test_parse_blood_pressure(value, expected):
+    assert measurements.parse_blood_pressure(value) == expected
+
+
+def test_other_units_are_unparseable():
+    values = {'weight': '120 lb', 'height': '150 cm', 'blood_pressure': ''}
+    columns = measurements.typed_columns('anc', values)
+    assert columns['weight_kg'] is None
+    assert columns['height_cm'] == decimal.Decimal('150.00')
+    assert measurements.unparseable('anc', values) == ['weight']
+
+
+def test_migration_parses_like_the_app():
+    path = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'versions', '0008_numeric_measurements.py')
+    spec = importlib.util.spec_from_file_location('numeric_measurements', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    samples = ['55,5 kg', '120 lb', '140.5', '120/80 mmHg', '120/80 lb', '៥៥', 'tall', '']
+    for kind, fields in measurements.FIELDS.items():
+        for field, (columns, parse, unit) in fields.items():
+            assert migration.FIELDS[kind][field][::2] == (columns, unit)
+            for value in samples:
+                assert migration.parse(value, *migration.FIELDS[kind][field][1:]) == parse(value, unit)
@@ -0,0 +1,18 @@
+import os
+
+import flask_migrate
+
+import flaskr
+from flaskr.models import db
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+
+
+def test_migrations_match_the_models(app):
+    flaskr.init_migrations(app)
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        flask_migrate.upgrade(directory=MIGRATIONS)
+        # Exits when autogenerate finds differences, e.g. the search tables
+        # created by 0003 that are not in the models.
+        flask_migrate.check(directory=MIGRATIONS)
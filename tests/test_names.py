@@ -0,0 +1,21 @@
+import importlib.util
+import os
+
+from flaskr import names
+
+SAMPLES = ['សុខា', 'Sokha', 'Sokhar', 'ចាន់ ដារា', 'Chan Dara', 'Chhun​Vanna', 'Ngeth Srey Pov', '', 'Ō\'Neill']
+
+
+def test_khmer_and_romanized_names_share_a_key():
+    assert names.name_keys('សុខា') & names.name_keys('Sokha')
+    assert names.name_keys('Sokha') & names.name_keys('Sokhar')
+    assert ('khmer', 'សុខា') in names.name_keys('សុខា​')
+
+
+def test_migration_backfills_the_same_keys():
+    path = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'versions', '0004_patient_name_keys.py')
+    spec = importlib.util.spec_from_file_location('patient_name_keys', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    for name in SAMPLES:
+        assert migration.name_keys(name) == names.name_keys(name), name
@@ -0,0 +1,70 @@
+import datetime
+import html
+import re
+
+from flaskr.models import ANC, LDR, PNC, Patient, User, db
+from flaskr.pagination_collection import decode_token, encode_token
+
+
+def test_token_round_trip():
+    values = [datetime.datetime(2026, 3, 1, 9, 30), 42]
+    token = encode_token(values)
+    assert '=' not in token
+    assert decode_token(token, (ANC.created, ANC.id)) == values
+
+
+def test_token_dates():
+    token = encode_token([datetime.date(2026, 3, 1), 7])
+    assert decode_token(token, (ANC.expected_delivery_date, ANC.id)) == [datetime.date(2026, 3, 1), 7]
+
+
+def test_bad_tokens_decode_to_none():
+    assert decode_token('not a token!', (ANC.id,)) is None
+    assert decode_token(encode_token([1, 2]), (ANC.id,)) is None
+    assert decode_token(encode_token(['yesterday', 1]), (ANC.created, ANC.id)) is None
+
+
+def _timeline_page(client, url):
+    body = client.get(url).get_data(as_text=True)
+    records = re.findall(r'/view_(anc|ldr|pnc)/(\d+)"', body)
+    links = dict(re.findall(r'href="([^"]+)">(&laquo;|&raquo;)</a>', body))
+    links = {label: html.unescape(href) for href, label in links.items()}
+    return [(kind, int(id)) for kind, id in records], links
+
+
+def test_timeline_pages_records_with_equal_timestamps(app, monkeypatch):
+    monkeypatch.setenv('PER_PAGE', '2')
+    same, earlier = datetime.datetime(2026, 3, 1, 9, 0), datetime.datetime(2026, 2, 1, 9, 0)
+    with app.app_context():
+        db.session.add(User(username='midwife', password='-', is_admin=False))
+        db.session.add(Patient(name='Sok', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address=''))
+        db.session.add_all([ANC(patient_id=1, author_id=1, created=same) for _ in range(2)])
+        db.session.add(ANC(patient_id=1, author_id=1, created=earlier))
+        db.session.add_all([LDR(patient_id=1, author_id=1, created=same) for _ in range(2)])
+        db.session.add_all([PNC(patient_id=1, author_id=1, created=same, transferred_from='') for _ in range(2)])
+        db.session.commit()
+        # As CURRENT_TIMESTAMP stores it, without microseconds.
+        db.session.execute(db.update(LDR).where(LDR.id == 1).values(created=db.literal_column("'2026-03-01 09:00:00'")))
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    pages, url = [], '/view/1/timeline'
+    while url:
+        records, links = _timeline_page(client, url)
+        pages.append(records)
+        url = links.get('&raquo;')
+    assert pages == [
+        [('pnc', 2), ('pnc', 1)],
+        [('ldr', 2), ('ldr', 1)],
+        [('anc', 2), ('anc', 1)],
+        [('anc', 3)],
+    ]
+
+    # And back again from the last page.
+    backwards = []
+    while url := links.get('&laquo;'):
+        records, links = _timeline_page(client, url)
+        backwards.append(records)
+    assert backwards == pages[-2::-1]
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+from flaskr import reports
+from flaskr.models import ANC, LDR, Patient, ReportMonth, db
+
+
+HISTOGRAM = {20: 3, 25: 10, 30: 40, 35: 12, 40: 1}
+
+
+def test_percentiles_without_numpy_match_numpy(monkeypatch):
+    with_numpy = reports.percentiles(HISTOGRAM, 100)
+    monkeypatch.setattr(reports, '_numpy', lambda: None)
+    assert reports.percentiles(HISTOGRAM, 100) == with_numpy
+    assert reports.percentiles({}, 100) == dict.fromkeys(reports.PERCENTILES)
+
+
+def test_percentiles_interpolate_within_buckets():
+    # 10 values evenly in [1000, 1100): the median is half way.
+    assert reports.percentiles({10: 10}, 100)[50] == 1050.0
+
+
+def _patient(name):
+    patient = Patient(name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='')
+    db.session.add(patient)
+    db.session.flush()
+    return patient.id
+
+
+def _anc(patient_id, day):
+    anc = ANC(patient_id=patient_id, author_id=1, compulsory=False, created=datetime.datetime.combine(day, datetime.time(9)))
+    db.session.add(anc)
+    return anc
+
+
+def _ldr(patient_id, day, **values):
+    db.session.add(LDR(patient_id=patient_id, author_id=1, delivery_date=day,
+                       created=datetime.datetime.combine(day, datetime.time(12)), **values))
+
+
+@pytest.fixture
+def deliveries(app):
+    with app.app_context():
+        # A second pregnancy: four visits before her first delivery, two since.
+        second = _patient('Second Pregnancy')
+        for day in ('2024-06-01', '2024-08-01', '2024-10-01', '2024-12-01'):
+            _anc(second, datetime.date.fromisoformat(day))
+        _ldr(second, datetime.date(2025, 1, 10))
+        for day in ('2025-07-01', '2025-09-01'):
+            _anc(second, datetime.date.fromisoformat(day))
+        _ldr(second, datetime.date(2025, 10, 5), weight_g=2400, blood_loss_ml=300)
+
+        first = _patient('First Pregnancy')
+        for day in ('2025-02-01', '2025-04-01', '2025-06-01', '2025-08-01'):
+            _anc(first, datetime.date.fromisoformat(day))
+        _anc(first, datetime.date(2025, 10, 20))  # after the delivery
+        _ldr(first, datetime.date(2025, 10, 12), weight_g=3200, blood_loss_ml=200, tear=True)
+        db.session.commit()
+        yield first, second
+
+
+@pytest.mark.parametrize('numpy', [True, False])
+def test_compute_month(app, deliveries, monkeypatch, numpy):
+    if not numpy:
+        monkeypatch.setattr(reports, '_numpy', lambda: None)
+    with app.app_context():
+        indicators, histograms = reports.compute_month(datetime.date(2025, 10, 1))
+
+    assert indicators['deliveries'] == (2, None)
+    assert indicators['anc_1'] == (2, 2)
+    assert indicators['anc_4'] == (1, 2)
+    assert indicators['tear'] == (1, 2)
+    assert indicators['low_birth_weight'] == (1, 2)
+    assert indicators['anc_visits'] == (1, None)
+    assert histograms['birth_weight_g'] == {24: 1, 32: 1}
+    assert histograms['blood_loss_ml'] == {4: 1, 6: 1}
+
+
+def _dirty():
+    return sorted(month for (month,) in db.session.query(ReportMonth.month).filter(ReportMonth.dirty))
+
+
+def test_anc_changes_mark_later_delivery_months(app, deliveries):
+    first, second = deliveries
+    with app.app_context():
+        reports.record_changed(_anc(first, datetime.date(2025, 3, 15)))
+        assert _dirty() == [datetime.date(2025, 3, 1), datetime.date(2025, 10, 1)]
+
+        db.session.execute(db.delete(ReportMonth))
+        # Visits more than PREGNANCY_WEEKS before a delivery do not count for it.
+        reports.records_added('anc', [
+            {'patient_id': second, 'created': datetime.datetime(2024, 3, 1, 9)},
+            {'patient_id': second, 'created': datetime.datetime(2025, 8, 1, 9)},
+        ])
+        assert _dirty() == [datetime.date(2024, 3, 1), datetime.date(2025, 8, 1), datetime.date(2025, 10, 1)]
@@ -0,0 +1,90 @@
+import datetime
+import shutil
+
+import pytest
+
+from flaskr import create_app, identity, routing
+from flaskr.models import Patient, User, db
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """An app with a primary and one replica, two SQLite files holding the
+    same user and a patient named after the database."""
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{primary}")
+    monkeypatch.setenv("SQLALCHEMY_REPLICA_URIS", f"sqlite:///{replica}")
+    monkeypatch.setenv("SECRET_KEY", "test")
+    monkeypatch.setenv("PER_PAGE", "10")
+    monkeypatch.setenv("JINJA_BYTECODE_CACHE", "0")
+    monkeypatch.setenv("REPLICA_STICKY_SECONDS", "10")
+    identity._cache.clear()
+    identity._versions.clear()
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(User(username='midwife', password='-', is_admin=False))
+        db.session.commit()
+        db.engine.dispose()
+        shutil.copy(primary, replica)
+        for name, engine in (('Primary', db.engine), ('Replica', db.engines['replica0'])):
+            with engine.begin() as connection:
+                connection.execute(db.insert(Patient).values(
+                    name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='1', address='x'))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    yield app, client, replica
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _index(client):
+    response = client.get('/')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_get_reads_from_the_replica(replicated):
+    app, client, _ = replicated
+    page = _index(client)
+    assert 'Replica' in page and 'Primary' not in page
+
+
+def test_post_writes_to_the_primary_and_sticks(replicated):
+    app, client, _ = replicated
+    assert client.post('/delete_patient/1').status_code == 302
+    with app.app_context():
+        assert db.session.get(Patient, 1) is None
+        with db.engines['replica0'].connect() as connection:
+            assert connection.execute(db.select(Patient.name)).scalar() == 'Replica'
+
+    # Within REPLICA_STICKY_SECONDS the user's reads stay on the primary.
+    page = _index(client)
+    assert 'Replica' not in page and 'Primary' not in page
+    with client.session_transaction() as session:
+        session['primary_until'] = 0
+    assert 'Replica' in _index(client)
+
+
+def test_broken_replica_falls_back_to_the_primary(replicated):
+    app, client, replica = replicated
+    with app.app_context():
+        db.engines['replica0'].dispose()
+    replica.unlink()
+
+    page = _index(client)
+    assert 'Primary' in page
+    with app.app_context():
+        assert routing._health[db.engines['replica0']][1] is False
+
+
+def test_corrupt_replica_falls_back_to_the_primary(replicated):
+    app, client, replica = replicated
+    with app.app_context():
+        db.engines['replica0'].dispose()
+    replica.write_bytes(b'not a database' * 100)
+
+    assert 'Primary' in _index(client)
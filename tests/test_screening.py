@@ -0,0 +1,37 @@
+import datetime
+
+from flaskr import screening
+from flaskr.models import ANC, Patient, db
+
+
+def _row(anc_id, patient_id, compulsory=False, systolic=None, diastolic=None, heart_rate=None):
+    return (anc_id, patient_id, datetime.datetime(2026, 1, 1), compulsory, systolic, diastolic, heart_rate)
+
+
+def test_evaluate(app):
+    with app.app_context():
+        patients = [Patient(name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='')
+                    for name in ('Treated', 'Untreated')]
+        db.session.add_all(patients)
+        db.session.flush()
+        treated, untreated = (patient.id for patient in patients)
+        db.session.add(ANC(patient_id=treated, author_id=1, compulsory=True, folic_acid=True, vaccination=True))
+        db.session.commit()
+
+        rows = [
+            _row(1, treated, compulsory=True, systolic=120, diastolic=80, heart_rate=140),
+            _row(2, treated, systolic=140, diastolic=85),
+            _row(3, treated, systolic=165, diastolic=95),
+            _row(4, treated, systolic=130, diastolic=110),
+            _row(5, untreated, heart_rate=100),
+            _row(6, untreated, compulsory=True, heart_rate=170),
+        ]
+        results = {rule: matches.tolist() for rule, matches in screening.evaluate(rows).items()}
+
+    assert set(results) == set(screening.RULES)
+    assert results['severe_hypertension'] == [False, False, True, True, False, False]
+    assert results['hypertension'] == [False, True, False, False, False, False]
+    assert results['fetal_heart_rate'] == [False, False, False, False, True, True]
+    # Folic acid and vaccination are only checked on follow-up visits.
+    assert results['no_folic_acid'] == [False, False, False, False, True, False]
+    assert results['no_vaccination'] == [False, False, False, False, True, False]
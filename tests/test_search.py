@@ -0,0 +1,42 @@
+import datetime
+
+from flaskr import search, sync
+from flaskr.models import Patient, db
+
+
+def _patient(name, phone='', address=''):
+    return Patient(name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone=phone, address=address)
+
+
+def test_tokenize_keeps_khmer_marks_in_words():
+    # ភូមិ (village): ូ and ិ are combining vowel signs.
+    assert search.tokenize('ភូមិ ថ្មី, Phnom_Penh') == ['ភូមិ', 'ថ្មី', 'phnom', 'penh']
+
+
+def test_phone_without_digits_matches_nobody(app):
+    with app.test_request_context():
+        patient = _patient('Sok', phone='012 345 678')
+        db.session.add(patient)
+        search.index_patient(patient)
+        db.session.commit()
+        assert search.search_patients(1, phone='+++').items == []
+        assert [p.name for p in search.search_patients(1, phone='012345').items] == ['Sok']
+
+
+def test_ngram_index_refreshes_incrementally(app, monkeypatch):
+    with app.app_context():
+        kept, deleted = _patient('Chan Dara'), _patient('Chan Sophea')
+        db.session.add_all([kept, deleted])
+        db.session.commit()
+        backend = search.NgramBackend()
+        assert set(backend.name_candidates('chan')) == {kept.id, deleted.id}
+
+        # Changes made elsewhere (another worker) are picked up without a rebuild.
+        monkeypatch.setenv('SEARCH_INDEX_TTL', '0')
+        monkeypatch.setattr(backend, 'rebuild', lambda: (_ for _ in ()).throw(AssertionError('rebuilt')))
+        added = _patient('Chan Vanna')
+        db.session.add(added)
+        db.session.delete(deleted)
+        sync.patient_deleted(deleted.id)
+        db.session.commit()
+        assert set(backend.name_candidates('chan')) == {kept.id, added.id}
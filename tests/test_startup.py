@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from flaskr import benchmark
+
+
+# Wall-clock budgets are only meaningful on a quiet machine; the hard gate is
+# 'flask startup-benchmark'. Run with STARTUP_BUDGET_TEST=1 to include it.
+@pytest.mark.skipif(os.getenv("STARTUP_BUDGET_TEST") != "1", reason="set STARTUP_BUDGET_TEST=1 to time startup")
+def test_startup_is_within_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'startup.db'}")
+    monkeypatch.setenv("SECRET_KEY", "test")
+    result = benchmark.startup(runs=3)
+    assert result['import_ms'] + result['create_app_ms'] <= benchmark.STARTUP_BUDGET, result
+    assert result['first_request_ms'] <= benchmark.FIRST_REQUEST_BUDGET, result
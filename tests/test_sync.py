@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+
+from flaskr.models import ANC, LDR, Patient, Tombstone, User, db
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # Hand out rows as soon as they are written.
+    monkeypatch.setenv('SYNC_SETTLE_SECONDS', '-60')
+    with app.app_context():
+        user = User(username='midwife', password='-', is_admin=False)
+        db.session.add(user)
+        db.session.add(Patient(name='Sok', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address=''))
+        db.session.commit()
+        db.session.add_all([ANC(patient_id=1, author_id=user.id, compulsory=False) for _ in range(2)])
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+def _pull(client, since=None, limit=None):
+    query = {key: value for key, value in {'since': since, 'limit': limit}.items() if value is not None}
+    response = client.get('/api/sync', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_token_round_trip_carries_deletes(client):
+    first = _pull(client)
+    assert [row['id'] for row in first['patients']] == [1]
+    assert [row['id'] for row in first['anc']] == [1, 2]
+    assert first['deleted'] == [] and not first['more']
+
+    assert client.post('/delete_anc/2').status_code == 302
+    second = _pull(client, first['since'])
+    assert second['patients'] == [] and second['anc'] == []
+    assert [(row['kind'], row['id']) for row in second['deleted']] == [('anc', 2)]
+
+    third = _pull(client, second['since'])
+    assert third['deleted'] == [] and third['anc'] == []
+
+
+def test_limit_is_clamped(client):
+    page = _pull(client, limit=0)
+    assert [row['id'] for row in page['patients']] == [1]
+    assert page['anc'] == [] and page['more']
+
+
+def test_user_delete_leaves_tombstones_for_their_records(client, app):
+    with app.app_context():
+        author = User(username='leaving', password='-', is_admin=False)
+        db.session.add(author)
+        db.session.commit()
+        db.session.add(LDR(patient_id=1, author_id=author.id))
+        db.session.commit()
+        author_id = author.id
+
+    assert client.post(f'/user/delete/{author_id}').status_code == 302
+    with app.app_context():
+        assert [(t.kind, t.record_id) for t in Tombstone.query.all()] == [('ldr', 1)]
@@ -0,0 +1,10 @@
+def test_activity_report_redirects_anonymous_users_to_login(app):
+    response = app.test_client().get('/user/activity')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
+
+
+def test_cache_stats_redirects_anonymous_users_to_login(app):
+    response = app.test_client().get('/user/cache')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
@@ -0,0 +1,29 @@
+from flaskr import validation
+
+
+PATIENT = {'name': 'Sok', 'date_of_birth': '1990-01-01', 'phone': '012345678', 'address': 'Phnom Penh'}
+ANC_COMPULSORY = {'expected_delivery_date': '2026-12-01', 'height': '155', 'last_menstrual_period': '2026-03-01',
+                  'parity': '1', 'living_children': '1', 'gravida': '2'}
+
+
+def test_patient_error():
+    assert validation.patient_error(PATIENT) is None
+    assert validation.patient_error({**PATIENT, 'name': ''}) == 'Name is required.'
+    assert validation.patient_error({**PATIENT, 'phone': None}) == 'Phone is required.'
+    assert validation.patient_error({}) == 'Name is required.'
+
+
+def test_anc_compulsory_error():
+    assert validation.anc_compulsory_error(ANC_COMPULSORY) is None
+    assert validation.anc_compulsory_error({**ANC_COMPULSORY, 'height': ''}) == "Mother's height is required."
+    assert validation.anc_compulsory_error({**ANC_COMPULSORY, 'gravida': ''}) == 'Gravida is required.'
+
+
+def test_anc_optional_error():
+    assert validation.anc_optional_error({'weight': '55'}) is None
+    assert validation.anc_optional_error({'weight': '', 'comments': 'x'}) == 'Can not submit an empty form.'
+
+
+def test_ldr_and_pnc_accept_anything():
+    assert validation.ldr_error({}) is None
+    assert validation.pnc_error({}) is None
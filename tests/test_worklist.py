@@ -0,0 +1,109 @@
+import datetime
+
+from flaskr import summary
+from flaskr.models import ANC, Patient, RiskFlag, User, db
+
+
+def _login_admin(app):
+    with app.app_context():
+        admin = User(username='admin', password='-', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = admin_id
+    return client
+
+
+def test_risk_worklist_matches_whole_reasons(app):
+    client = _login_admin(app)
+    now = datetime.datetime(2026, 1, 1, 9)
+    with app.app_context():
+        patients = [Patient(name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='')
+                    for name in ('Severe Only', 'Mild Only')]
+        db.session.add_all(patients)
+        db.session.flush()
+        visits = [ANC(patient_id=patient.id, author_id=1, created=now, compulsory=False) for patient in patients]
+        db.session.add_all(visits)
+        db.session.flush()
+        db.session.add_all([
+            RiskFlag(anc_id=visits[0].id, patient_id=patients[0].id, visit_created=now,
+                     reasons='severe_hypertension,no_folic_acid'),
+            RiskFlag(anc_id=visits[1].id, patient_id=patients[1].id, visit_created=now, reasons='hypertension'),
+        ])
+        db.session.commit()
+
+    page = client.get('/worklist/risk?rule=hypertension').get_data(as_text=True)
+    assert 'Mild Only' in page and 'Severe Only' not in page
+    page = client.get('/worklist/risk?rule=severe_hypertension').get_data(as_text=True)
+    assert 'Severe Only' in page and 'Mild Only' not in page
+    page = client.get('/worklist/risk?rule=no_folic_acid').get_data(as_text=True)
+    assert 'Severe Only' in page and 'Mild Only' not in page
+
+
+def test_deliveries_use_the_latest_compulsory_visit(app):
+    client = _login_admin(app)
+    today = datetime.date.today()
+    with app.app_context():
+        ongoing, terminated = [
+            Patient(name=name, sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='')
+            for name in ('Still Pregnant', 'Ended Early')
+        ]
+        db.session.add_all([ongoing, terminated])
+        db.session.flush()
+        for patient, terminate in ((ongoing, False), (terminated, True)):
+            for weeks_ago, due_in, flag in ((8, 3, False), (2, 5, terminate)):
+                db.session.add(ANC(patient_id=patient.id, author_id=1, compulsory=True, terminate=flag,
+                                   created=datetime.datetime.now() - datetime.timedelta(weeks=weeks_ago),
+                                   expected_delivery_date=today + datetime.timedelta(days=due_in)))
+        db.session.flush()
+        summary.refresh_many([ongoing.id, terminated.id])
+        db.session.commit()
+
+    page = client.get('/worklist/deliveries').get_data(as_text=True)
+    assert page.count('Still Pregnant') == 1
+    assert str(today + datetime.timedelta(days=5)) in page
+    assert 'Ended Early' not in page
+
+
+def test_deliveries_follow_the_summary_pointer(app):
+    client = _login_admin(app)
+    today = datetime.date.today()
+    with app.app_context():
+        patient = Patient(name='Sok', sex='female', date_of_birth=datetime.date(1990, 1, 1), phone='', address='')
+        db.session.add(patient)
+        db.session.flush()
+        first = ANC(patient_id=patient.id, author_id=1, compulsory=True,
+                    created=datetime.datetime.now() - datetime.timedelta(weeks=8),
+                    expected_delivery_date=today + datetime.timedelta(days=3))
+        db.session.add(first)
+        summary.record_added(first)
+        db.session.commit()
+        assert summary.get_summary(patient.id).latest_compulsory_anc_id == first.id
+
+        # A later main entry moves the due date past the default window.
+        second = ANC(patient_id=patient.id, author_id=1, compulsory=True,
+                     created=datetime.datetime.now() - datetime.timedelta(weeks=1),
+                     expected_delivery_date=today + datetime.timedelta(days=60))
+        db.session.add(second)
+        summary.record_added(second)
+        db.session.commit()
+        assert summary.get_summary(patient.id).latest_compulsory_anc_id == second.id
+
+    assert 'Sok' not in client.get('/worklist/deliveries').get_data(as_text=True)
+    assert 'Sok' in client.get('/worklist/deliveries?days=60').get_data(as_text=True)
+    # Clamped to 90 days rather than scanning every future due date.
+    with app.app_context():
+        db.session.execute(db.update(ANC).where(ANC.id == second.id)
+                           .values(expected_delivery_date=today + datetime.timedelta(days=120)))
+        db.session.commit()
+    assert 'Sok' not in client.get('/worklist/deliveries?days=365').get_data(as_text=True)
+
+
+def test_worklist_windows_are_clamped(app):
+    client = _login_admin(app)
+    assert 'name="days" value="1"' in client.get('/worklist/deliveries?days=0').get_data(as_text=True)
+    assert 'name="days" value="90"' in client.get('/worklist/deliveries?days=100000').get_data(as_text=True)
+    assert 'name="weeks" value="1"' in client.get('/worklist/overdue?weeks=-3').get_data(as_text=True)
+    assert 'name="weeks" value="52"' in client.get('/worklist/overdue?weeks=100000').get_data(as_text=True)